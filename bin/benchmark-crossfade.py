@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+#: Description: Measures how many in-between frames a second the fixed
+#: point crossfade (snapcamera.interpolate) makes, against floating point
+#: numpy and ImageMagick's convert -morph (as bin/makevideo.sh used).
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import numpy
+from PIL import Image
+from snapcamera import interpolate, runner
+
+
+def make_frames(size, pairs):
+    """Random raw RGB frames of size."""
+    random = numpy.random.default_rng(0)
+    return [random.integers(0, 256, size=(size[1], size[0], 3),
+                            dtype=numpy.uint8).tobytes()
+            for _ in range(pairs + 1)]
+
+
+def fixed_point(frames, count):
+    start = time.monotonic()
+    made = sum(1 for _ in interpolate.crossfade(frames, count))
+    return made - len(frames), time.monotonic() - start
+
+
+def floating_point(frames, count):
+    start = time.monotonic()
+    made = 0
+    for previous, next_frame in zip(frames, frames[1:]):
+        a = numpy.frombuffer(previous, dtype=numpy.uint8).astype(numpy.float32)
+        b = numpy.frombuffer(next_frame, dtype=numpy.uint8).astype(
+            numpy.float32)
+        for i in range(count):
+            t = (i + 1) / (count + 1)
+            ((1 - t) * a + t * b).round().astype(numpy.uint8).tobytes()
+            made += 1
+    return made, time.monotonic() - start
+
+
+def imagemagick(frames, count, size):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        names = []
+        for i, frame in enumerate(frames):
+            names.append(os.path.join(tmp_dir, "{:05}.jpg".format(i)))
+            Image.frombytes('RGB', size, frame).save(names[-1])
+        start = time.monotonic()
+        runner.call(['convert'] + names + ['-morph', str(count),
+                                           os.path.join(tmp_dir, 'm%05d.jpg')])
+        seconds = time.monotonic() - start
+    return (len(frames) - 1) * count, seconds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--size', default='800x600')
+    parser.add_argument('-p', '--pairs', type=int, default=5,
+                        help='Pairs of frames to fade between.')
+    parser.add_argument('-m', '--morph', type=int,
+                        default=interpolate.INTERPOLATE_FRAMES)
+    args = parser.parse_args()
+    size = tuple(int(n) for n in args.size.split('x'))
+    frames = make_frames(size, args.pairs)
+
+    results = [("fixed", fixed_point(frames, args.morph)),
+               ("float", floating_point(frames, args.morph))]
+    if shutil.which('convert') is not None:
+        results.append(("convert", imagemagick(frames, args.morph, size)))
+    else:
+        print("convert (ImageMagick) isn't installed, skipping it.")
+    for name, (made, seconds) in results:
+        print("{:>8}: {} frames in {:.2f}s ({:.1f} frames/s)".format(
+            name, made, seconds, made / seconds))
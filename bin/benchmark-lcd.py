@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+#: Description: Counts the LCD commands and bytes sent during a typical
+#: session, writing every field directly (the old way) against going
+#: through the shadow display (snapcamera.display), drawn by the caller or
+#: by the render thread.
+import time
+import argparse
+from snapcamera.display import FakeLCD, ShadowDisplay
+
+
+class DirectDisplay(object):
+    """Moves the cursor and writes the whole field every time."""
+    def __init__(self, lcd):
+        self.lcd = lcd
+
+    def write(self, col, row, text):
+        self.lcd.set_cursor(col, row)
+        self.lcd.write(text)
+
+    def write_custom_bitmap(self, col, row, index):
+        self.lcd.set_cursor(col, row)
+        self.lcd.write_custom_bitmap(index)
+
+
+def session(display, pictures, interval=0):
+    """The updates Camera makes while taking pictures (one every interval
+    seconds) in camera mode and then flicking through effects.
+    """
+    display.write(0, 0, "t:0000 ")
+    display.write(8, 0, " r:9999")
+    display.write(0, 1, "camera  ")
+    display.write(8, 1, "dly 00".rjust(8))
+    for i in range(pictures):
+        display.write_custom_bitmap(7, 0, 0)  # busy
+        display.write(7, 0, " ")  # not busy
+        display.write(0, 0, "t:{:04} ".format(i + 1))
+        display.write(8, 0, "r:{:04}".format(9999 - i).rjust(8))
+        time.sleep(interval)
+    display.write(0, 1, "effects ")
+    for effect in ('none', 'negative', 'solarise', 'posterize', 'sketch'):
+        display.write(8, 1, effect.rjust(8)[:8])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--pictures', type=int, default=100)
+    parser.add_argument('-i', '--interval', type=float, default=0.02,
+                        help="Seconds between pictures.")
+    args = parser.parse_args()
+
+    for name in ("direct", "shadow", "thread"):
+        lcd = FakeLCD()
+        if name == "direct":
+            display = DirectDisplay(lcd)
+        else:
+            display = ShadowDisplay(lcd)
+        if name == "thread":
+            display.start()
+        session(display, args.pictures, args.interval)
+        if name == "thread":
+            display.stop()
+        print("{:>6}: {} commands, {} bytes".format(name, lcd.commands,
+                                                    lcd.bytes))
@@ -0,0 +1,60 @@
+#!/usr/bin/python3
+#: Description: Compares shutter lag of spawning raspistill for every picture
+#: against triggering a warm raspistill process (snapcamera.capture).
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+from snapcamera.capture import WarmStillCapture
+
+
+def spawn_per_shot(output_dir, shots):
+    """Today's path: one raspistill (with default settle) per picture."""
+    times = []
+    for i in range(shots):
+        filename = os.path.join(output_dir, "spawn{:04}.jpg".format(i))
+        start = time.monotonic()
+        subprocess.call(["raspistill --output {}".format(filename)],
+                        shell=True)
+        times.append(time.monotonic() - start)
+    return times
+
+
+def warm(output_dir, shots):
+    capture_dir = os.path.join(output_dir, "capture")
+    os.makedirs(capture_dir, exist_ok=True)
+    warm_capture = WarmStillCapture(capture_dir=capture_dir)
+    times = []
+    try:
+        # the first picture includes camera start up, don't count it
+        if warm_capture.capture(os.path.join(output_dir, "warmup.jpg")) != 0:
+            sys.exit("warm capture failed")
+        for i in range(shots):
+            filename = os.path.join(output_dir, "warm{:04}.jpg".format(i))
+            start = time.monotonic()
+            if warm_capture.capture(filename) != 0:
+                sys.exit("warm capture failed")
+            times.append(time.monotonic() - start)
+    finally:
+        warm_capture.stop()
+    return times
+
+
+def report(name, times):
+    times = sorted(times)
+    print("{:>6}: n={} min={:.0f}ms median={:.0f}ms max={:.0f}ms".format(
+        name, len(times), times[0] * 1000, times[len(times) // 2] * 1000,
+        times[-1] * 1000))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--shots', type=int, default=10,
+                        help="Number of pictures per method.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        report("spawn", spawn_per_shot(output_dir, args.shots))
+        report("warm", warm(output_dir, args.shots))
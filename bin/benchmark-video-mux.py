@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+#: Description: Compares recording an h264 file and converting it to mp4
+#: afterwards against muxing the H.264 into an mp4 while recording
+#: (snapcamera.mux). Reports bytes written and time until the mp4 exists.
+import os
+import time
+import argparse
+import resource
+import tempfile
+from snapcamera import mux, runner
+from snapcamera.backend import (
+    CaptureSettings,
+    FakeBackend,
+    VIDEO_FRAMERATE,
+    get_backend,
+)
+
+SETTINGS = CaptureSettings(effect='none', auto_white_balance='auto',
+                           preview=False)
+
+
+def blocks_written():
+    """Blocks written by us and our (finished) children."""
+    return sum(resource.getrusage(who).ru_oublock for who in (
+        resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN))
+
+
+def two_pass(backend, output_dir, length, convert):
+    h264 = os.path.join(output_dir, "two-pass.h264")
+    mp4 = os.path.join(output_dir, "two-pass.mp4")
+    blocks = blocks_written()
+    start = time.monotonic()
+    backend.video(h264, length, SETTINGS)
+    recorded = time.monotonic()
+    written = os.path.getsize(h264)
+    if convert == 'MP4Box':
+        runner.call(['MP4Box', '-quiet', '-add', h264, mp4])
+    else:
+        runner.call([mux.VIDEO_MUXER, '-loglevel', 'error', '-y',
+                     '-f', 'h264', '-i', h264, '-c', 'copy', mp4])
+    runner.remove_file(h264)
+    available = time.monotonic()
+    written += os.path.getsize(mp4)
+    return (written, blocks_written() - blocks, recorded - start,
+            available - start)
+
+
+def streaming(backend, output_dir, length):
+    mp4 = os.path.join(output_dir, "streaming.mp4")
+    blocks = blocks_written()
+    start = time.monotonic()
+    muxer = mux.StreamingMuxer(mp4, VIDEO_FRAMERATE)
+    backend.video_to(muxer.input, length, SETTINGS)
+    recorded = time.monotonic()
+    muxer.close()
+    available = time.monotonic()
+    return (os.path.getsize(mp4), blocks_written() - blocks,
+            recorded - start, available - start)
+
+
+def report(name, result):
+    written, blocks, recorded, available = result
+    print("{:>9}: wrote {:.1f}MB ({} blocks) recorded in {:.2f}s "
+          "mp4 available after {:.2f}s".format(
+              name, written / 1e6, blocks, recorded, available))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-l', '--length', type=int, default=60000,
+                        help="Video length in milliseconds.")
+    parser.add_argument('-b', '--backend', default='fake',
+                        help="Capture backend (default: fake).")
+    parser.add_argument('--realtime', action='store_true',
+                        help="Make the fake backend record in real time.")
+    parser.add_argument('--convert', choices=('MP4Box', 'ffmpeg'),
+                        default='MP4Box',
+                        help="Second pass for the two pass method.")
+    args = parser.parse_args()
+
+    if args.backend == 'fake':
+        backend = FakeBackend(realtime=args.realtime)
+    else:
+        backend = get_backend(args.backend)
+    with tempfile.TemporaryDirectory(dir=os.getcwd()) as output_dir:
+        report("two pass", two_pass(backend, output_dir, args.length,
+                                    args.convert))
+        report("streaming", streaming(backend, output_dir, args.length))
+    backend.close()
@@ -0,0 +1,55 @@
+#!/usr/bin/python3
+#: Description: Creates a video from timelapse frames (by default *.jpg in
+#: the current directory). Frames are resized in parallel and streamed into
+#: the encoder, no copies are made (see snapcamera.assemble).
+import sys
+import glob
+import argparse
+from snapcamera import assemble, interpolate
+
+
+def size(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('frames', nargs='*',
+                        help='Frames, in order (default: *.jpg).')
+    parser.add_argument('-t', '--timelapse', type=int, metavar='NUMBER',
+                        help='Use the frames of timelapse NUMBER from the '
+                             'images directory.')
+    parser.add_argument('-o', '--output', default='output.mp4')
+    parser.add_argument('-s', '--size', type=size,
+                        default=assemble.ASSEMBLE_SIZE,
+                        help='Frames are scaled to fit in WIDTHxHEIGHT '
+                             '(default: {}x{}).'.format(
+                                 *assemble.ASSEMBLE_SIZE))
+    parser.add_argument('-r', '--fps', type=int,
+                        default=assemble.ASSEMBLE_FRAMERATE,
+                        help='Frames played per second, not counting the '
+                             'in-between ones (default: {}).'.format(
+                                 assemble.ASSEMBLE_FRAMERATE))
+    parser.add_argument('-m', '--morph', type=int,
+                        help='Crossfaded frames between each pair of frames '
+                             '(default: as many as fit in {} frames per '
+                             'second, 0 for none).'.format(
+                                 assemble.ASSEMBLE_MAX_FRAMERATE))
+    parser.add_argument('-p', '--processes', type=int,
+                        help='Processes decoding frames (default: one per '
+                             'core).')
+    args = parser.parse_args()
+    if args.morph is None:
+        args.morph = assemble.morph_frames(args.fps)
+    if args.morph > 0 and not interpolate.available():
+        print("ERROR (makevideo): --morph needs numpy")
+        sys.exit(1)
+
+    if args.timelapse is not None:
+        frames = assemble.timelapse_frames(args.timelapse)
+    else:
+        frames = args.frames or sorted(glob.glob('*.jpg'))
+    result = assemble.assemble(frames, args.output, args.size, args.fps,
+                               args.processes, interpolate_frames=args.morph)
+    sys.exit(0 if result.status == 0 and result.frames > 0 else 1)
@@ -0,0 +1,28 @@
+#!/usr/bin/python3
+#: Description: Stacks timelapse frames (by default *.jpg in the current
+#: directory) into one picture: mean, max (star trails) or an approximate
+#: median. Memory use doesn't depend on the number of frames (see
+#: snapcamera.stack).
+import sys
+import glob
+import argparse
+from snapcamera import assemble, stack
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('frames', nargs='*',
+                        help='Frames to stack (default: *.jpg).')
+    parser.add_argument('-t', '--timelapse', type=int, metavar='NUMBER',
+                        help='Use the frames of timelapse NUMBER from the '
+                             'images directory.')
+    parser.add_argument('-m', '--mode', choices=stack.STACK_MODES,
+                        default='mean')
+    parser.add_argument('-o', '--output', default='stack.jpg')
+    args = parser.parse_args()
+
+    if args.timelapse is not None:
+        frames = assemble.timelapse_frames(args.timelapse)
+    else:
+        frames = args.frames or sorted(glob.glob('*.jpg'))
+    sys.exit(stack.stack_files(frames, args.mode, args.output))
@@ -11,6 +11,7 @@ try:
         SEND_LAST_IMAGE_TO,
         RECORD_VIDEO_FOR,
         SEND_LAST_VIDEO_TO,
+        SEND_LAST_PREVIEW_TO,
         HALT_AT,
         REBOOT_AT,
         BACKLIGHT,
@@ -19,6 +20,8 @@ try:
         MCAST_GRP,
         MCAST_PORT,
         STREAM,
+        APPLY_OVERLAY,
+        SHOW_IMAGE,
     )
 except ImportError:
     # Fallback on the original command if the snapcamera module is not
@@ -27,6 +30,7 @@ except ImportError:
     SEND_LAST_IMAGE_TO = "send last image to "
     RECORD_VIDEO_FOR = "record video for "
     SEND_LAST_VIDEO_TO = "send last video to "
+    SEND_LAST_PREVIEW_TO = "send last preview to "
     HALT_AT = "halt at "
     REBOOT_AT = "reboot at "
     BACKLIGHT = "backlight "  # on/off
@@ -35,6 +39,8 @@ except ImportError:
     MCAST_GRP = '224.1.1.1'
     MCAST_PORT = 5007
     STREAM = 'stream to '
+    APPLY_OVERLAY = "apply overlay "
+    SHOW_IMAGE = "show image "
 
 
 TRIGGER_DELAY = 0.1  # seconds -- so that camera's can sync taking the photo
@@ -67,6 +73,17 @@ class ImageTCPRequestHandler(TCPRequestHandler):
         super().handle(file_name)
 
 
+class PreviewTCPRequestHandler(TCPRequestHandler):
+    def handle(self):
+        camera_number = int(self.request.recv(16).decode('utf-8').strip())
+        image_number = int(self.request.recv(16).decode('utf-8').strip())
+        print("Receiving from camera {}: preview{}".format(camera_number,
+                                                           image_number))
+        file_name = "camera{:02}-preview{:04}.jpg".format(camera_number,
+                                                          image_number)
+        super().handle(file_name)
+
+
 class VideoTCPRequestHandler(TCPRequestHandler):
     def handle(self):
         camera_number = int(self.request.recv(16).decode('utf-8').strip())
@@ -123,6 +140,10 @@ def getimages(args):
     get_media(args, ImageTCPRequestHandler, SEND_LAST_IMAGE_TO)
 
 
+def getpreviews(args):
+    get_media(args, PreviewTCPRequestHandler, SEND_LAST_PREVIEW_TO)
+
+
 def getvideos(args):
     get_media(args, VideoTCPRequestHandler, SEND_LAST_VIDEO_TO)
 
@@ -181,6 +202,18 @@ def stream(args):
     send_multicast(steam_cmd)
 
 
+def apply_overlay(args):
+    images = args.images if args.images else "-"
+    send_multicast(build_command(
+        "{}{} to {}".format(APPLY_OVERLAY, args.overlay, images),
+        cameras=args.cameras))
+
+
+def show_image(args):
+    send_multicast(build_command(SHOW_IMAGE + str(args.image_number),
+                                 cameras=args.cameras))
+
+
 def get_my_ip():
     return _run_cmd("hostname --all-ip-addresses")[:-1].strip()
 
@@ -192,10 +225,11 @@ def _run_cmd(cmd):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("command",
-                        choices=['image', 'getimages', 'video', 'getvideos',
+                        choices=['image', 'getimages', 'getpreviews',
+                                 'video', 'getvideos',
                                  'backlight-on', 'backlight-off',
                                  'halt', 'reboot',
-                                 'stream'],
+                                 'stream', 'apply-overlay', 'show-image'],
                         help="The command to run.")
     parser.add_argument('-c', '--cameras',
                         help="List of cameras to run the command on OR The "
@@ -213,11 +247,21 @@ if __name__ == "__main__":
                                  PORT_OFFSET_DEFAULT),
                         type=int,
                         default=PORT_OFFSET_DEFAULT)
+    parser.add_argument('-o', '--overlay',
+                        help="Overlay to apply with apply-overlay (a file "
+                             "name in the overlays directory).")
+    parser.add_argument('-i', '--images',
+                        help="Images to apply the overlay to, for example "
+                             "12-40 (default: all of them).")
+    parser.add_argument('-n', '--image-number',
+                        help="Image to show with show-image.",
+                        type=int)
     args = parser.parse_args()
 
     commands = {
         'image': image,
         'getimages': getimages,
+        'getpreviews': getpreviews,
         'video': video,
         'getvideos': getvideos,
         'backlight-on': backlight_on,
@@ -225,6 +269,8 @@ if __name__ == "__main__":
         'halt': halt,
         'reboot': reboot,
         'stream': stream,
+        'apply-overlay': apply_overlay,
+        'show-image': show_image,
     }
 
     commands[args.command](args)
@@ -1,5 +1,8 @@
 #!/usr/bin/python3
 import snapcamera
+import snapcamera.backend
+import snapcamera.modes
+import snapcamera.mode_option
 import argparse
 import pifacecad
 
@@ -7,24 +10,50 @@ import pifacecad
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--clear', help='Clears the LCD.', action='store_true')
-    parser.add_argument('--mode', help='Mode to start in.', choices=[
-        'camera',
-        'effects',
-        'overlay',
-        'timelapse',
-        'ir',
-        'network',
-        'viewer'])
+    parser.add_argument('--mode',
+                        help='Mode to start in: {} or one added by another '
+                             'package.'.format(
+                                 ", ".join(snapcamera.modes.names())))
+    parser.add_argument('--backend',
+                        help='How to drive the camera (default: {}).'.format(
+                            snapcamera.backend.CAPTURE_BACKEND),
+                        choices=sorted(snapcamera.backend.BACKENDS))
+    parser.add_argument('--no-splash', action='store_true',
+                        help="Don't show the splash screen.")
+    parser.add_argument('--live-stack',
+                        choices=snapcamera.mode_option.STACK_MODES,
+                        help='Stack timelapse pictures as they are taken '
+                             '(saved as image<number>-<mode>stack.jpg).')
+    parser.add_argument('--apply-overlay', metavar='OVERLAY',
+                        help='Puts OVERLAY (from the overlays directory) on '
+                             'pictures that have already been taken, then '
+                             'exits.')
+    parser.add_argument('--images', metavar='FIRST-LAST', default='-',
+                        help='Pictures to use with --apply-overlay, for '
+                             'example 12-40 (default: all of them).')
+    parser.add_argument('--processes', type=int,
+                        help='Processes to use with --apply-overlay '
+                             '(default: one per core).')
     args = parser.parse_args()
-    if args.clear:
+    if args.mode:
+        try:
+            snapcamera.modes.mode_info(args.mode)
+        except snapcamera.modes.ModeError as e:
+            parser.error(str(e))
+    if args.apply_overlay:
+        import snapcamera.batch  # loads numpy, only needed here
+        first, last = snapcamera.batch.parse_range(args.images)
+        snapcamera.batch.apply_overlay(args.apply_overlay, first, last,
+                                       args.processes)
+    elif args.clear:
         cad = pifacecad.PiFaceCAD(init_board=False)
         cad.lcd.display_off()
         cad.lcd.clear()
         cad.lcd.backlight_off()
     elif args.mode:
-        #---------------------------------------------------------------
-        # MAKE SURE YOU UPDATE snapcampera/camera.py WHEN YOU CHANGE THE MODES
-        snapcamera.start_camera(args.mode)
-        #---------------------------------------------------------------
+        snapcamera.start_camera(args.mode, args.backend,
+                                not args.no_splash, args.live_stack)
     else:
-        snapcamera.start_camera()
+        snapcamera.start_camera(backend=args.backend,
+                                splash=not args.no_splash,
+                                live_stack=args.live_stack)
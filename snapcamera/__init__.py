@@ -1,18 +1,39 @@
 import os
 import time
 import threading
-import pifacecad
-from pifacecad.lcd import LCD_WIDTH
-from snapcamera.camera import Camera
+from snapcamera.events import (
+    SHUTTER_PRIORITY,
+    OPTION_PRIORITY,
+    MODE_PRIORITY,
+    SWITCH_DEBOUNCE,
+)
 import snapcamera.version
 
 
+SPLASH_TIME = 3  # seconds the splash screen is up for (at least)
+
+
+def dispatch(action, priority, wait_for_idle=True):
+    """Returns a switch handler which posts action to the camera's event
+    dispatcher instead of running it on the listener's thread.
+    """
+    def handler(event):
+        camera.events.post(action.__name__, action, (event,),
+                           priority=priority,
+                           source="switch{}".format(event.pin_num),
+                           debounce=SWITCH_DEBOUNCE,
+                           wait_for_idle=wait_for_idle)
+    return handler
+
+
 def previous_mode(event):
     global camera
     camera.current_mode['option'].exit()
     camera.current_mode_index = \
-        (camera.current_mode_index - 1) % len(camera.modes)
+        camera.modes.step(camera.current_mode_index, -1)
     camera.current_mode['option'].enter()
+    camera.update_warm_capture()
+    camera.update_display_remaining()
     camera.update_display_mode()
 
 
@@ -20,8 +41,10 @@ def next_mode(event):
     global camera
     camera.current_mode['option'].exit()
     camera.current_mode_index = \
-        (camera.current_mode_index + 1) % len(camera.modes)
+        camera.modes.step(camera.current_mode_index, 1)
     camera.current_mode['option'].enter()
+    camera.update_warm_capture()
+    camera.update_display_remaining()
     camera.update_display_mode()
 
 
@@ -53,19 +76,41 @@ def option3(event):
 
 
 def take_picture(event):
+    """Queues a picture (or video) and returns straight away. Stops a
+    timelapse that is being taken.
+    """
     global camera
+    if camera.timelapse is not None:
+        camera.stop_timelapse()
+        return
+    mode = camera.current_mode
+    if mode['name'] == 'video':
+        camera.capture_queue.put(shoot, (mode,), name='video', coalesce=True)
+    else:
+        camera.capture_queue.put(shoot, (mode,))
+
+
+def shoot(mode=None):
+    """Takes a picture (or video) in mode, the mode the camera was in
+    when the shutter was pressed (default: the current mode). Runs on the
+    capture queue's worker thread. Mode changes wait until the capture
+    queue is empty, so the camera is still set up for mode.
+    """
+    global camera
+    if mode is None:
+        mode = camera.current_mode
 
     # do the pre_picture, if it returns false, don't take the picture
-    gogogo = camera.current_mode['option'].pre_picture()
+    gogogo = mode['option'].pre_picture()
     if gogogo is not None and gogogo is False:
         return
 
-    if camera.current_mode['name'] == 'video':
-        l = camera.current_mode['option'].length
+    if mode['name'] == 'video':
+        l = mode['option'].length
         camera.record_video(l)
     else:
         camera.take_picture()
-    camera.current_mode['option'].post_picture()
+    mode['option'].post_picture()
 
 
 def exit(event):
@@ -73,27 +118,59 @@ def exit(event):
     should_i_exit.wait()
 
 
-def splash_screen(cad):
+def show_splash_screen(cad):
     cad.lcd.write("Snap Camera {}\n"
                   "       by PiFace".format(snapcamera.version.__version__))
     cad.lcd.display_on()
-    time.sleep(3)
-    cad.lcd.display_off()
-    cad.lcd.clear()
 
 
-def start_camera(start_mode='camera'):
+def seconds_since_power_on():
+    """Returns how long the Pi has been on, or None if we can't tell."""
+    try:
+        return time.clock_gettime(time.CLOCK_BOOTTIME)
+    except (AttributeError, OSError):
+        return None
+
+
+def print_ready(started, camera_ready, mode_ready, ready):
+    """Prints the time to first shot ready (and where it went)."""
+    message = "Ready for the first shot {:.2f}s after starting " \
+              "(camera {:.2f}s, mode {:.2f}s, warm-up {:.2f}s)".format(
+                  ready - started, camera_ready - started,
+                  mode_ready - camera_ready, ready - mode_ready)
+    uptime = seconds_since_power_on()
+    if uptime is not None:
+        message += ", {:.1f}s after power-on".format(uptime)
+    print(message + ".")
+
+
+def start_camera(start_mode='camera', backend=None, splash=True,
+                 live_stack=None):
+    started = time.monotonic()
+    # imported here so that the rest of the package (and its tests and
+    # benchmarks) can be used without the PiFace board's library
+    import pifacecad
+    from snapcamera.camera import Camera
     cad = pifacecad.PiFaceCAD()
 
     switchlistener = pifacecad.SwitchEventListener(chip=cad)
-    switchlistener.register(0, pifacecad.IODIR_ON, next_mode)
-    switchlistener.register(1, pifacecad.IODIR_ON, option1)
-    switchlistener.register(2, pifacecad.IODIR_ON, option2)
-    switchlistener.register(3, pifacecad.IODIR_ON, option3)
+    # mode and option changes wait until nothing is being captured
+    switchlistener.register(0, pifacecad.IODIR_ON,
+                            dispatch(next_mode, MODE_PRIORITY))
+    switchlistener.register(1, pifacecad.IODIR_ON,
+                            dispatch(option1, OPTION_PRIORITY))
+    switchlistener.register(2, pifacecad.IODIR_ON,
+                            dispatch(option2, OPTION_PRIORITY))
+    switchlistener.register(3, pifacecad.IODIR_ON,
+                            dispatch(option3, OPTION_PRIORITY))
     # switchlistener.register(4, pifacecad.IODIR_ON, exit)
-    switchlistener.register(5, pifacecad.IODIR_ON, take_picture)
-    switchlistener.register(6, pifacecad.IODIR_ON, previous_option)
-    switchlistener.register(7, pifacecad.IODIR_ON, next_option)
+    switchlistener.register(5, pifacecad.IODIR_ON,
+                            dispatch(take_picture, SHUTTER_PRIORITY,
+                                     wait_for_idle=False))
+    switchlistener.register(6, pifacecad.IODIR_ON,
+                            dispatch(previous_option, OPTION_PRIORITY))
+    switchlistener.register(7, pifacecad.IODIR_ON,
+                            dispatch(next_option, OPTION_PRIORITY))
 
     cad.lcd.display_off()
     cad.lcd.blink_off()
@@ -101,19 +178,35 @@ def start_camera(start_mode='camera'):
     cad.lcd.clear()
     cad.lcd.backlight_on()
 
-    splash_screen(cad)
+    # everything below happens while the splash screen is up, the camera
+    # draws nothing until it is taken down
+    if splash:
+        show_splash_screen(cad)
+    splash_shown = time.monotonic()
 
     global camera
-    camera = Camera(cad, start_mode)
-    camera.current_mode['option'].enter()
+    camera = Camera(cad, start_mode, backend)
+    camera.live_stack_mode = live_stack
+    camera_ready = time.monotonic()
+    camera.current_mode['option'].enter()  # network mode starts listening
+    mode_ready = time.monotonic()
+    camera.update_warm_capture()
     camera.update_display()
-    cad.lcd.display_on()
+    camera.resume_timelapse()
 
     global should_i_exit
     should_i_exit = threading.Barrier(2)
     switchlistener.activate()
+    print_ready(started, camera_ready, mode_ready, time.monotonic())
+
+    if splash:
+        time.sleep(max(0, SPLASH_TIME - (time.monotonic() - splash_shown)))
+    camera.display.resume()  # redraws all of the LCD, over the splash
+    camera.display.command('display_on')
+
     should_i_exit.wait()
     switchlistener.deactivate()
+    camera.close()
     cad.lcd.clear()
     cad.lcd.backlight_off()
     print("Good-bye!")
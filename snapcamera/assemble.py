@@ -0,0 +1,218 @@
+"""Makes a video from timelapse frames.
+
+Frames are decoded (in JPEG draft mode, so libjpeg does most of the
+scaling) and resized by a pool of processes, then written in order as raw
+RGB straight into the encoder's stdin. Nothing is copied to the card and
+at most `window` frames are in memory at once, however many frames there
+are.
+"""
+import os
+import re
+import time
+import itertools
+import collections
+import multiprocessing
+import concurrent.futures
+import subprocess
+from snapcamera import runner, interpolate
+from snapcamera.mux import VIDEO_MUXER, muxer_available
+from snapcamera.mode_option import IMAGE_DIR
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+ASSEMBLE_SIZE = (800, 800)  # frames are scaled to fit in this
+ASSEMBLE_FRAMERATE = 50  # timelapse frames per second of video
+ASSEMBLE_MAX_FRAMERATE = 60  # in-between frames are only added up to this
+ASSEMBLE_WINDOW_PER_PROCESS = 2  # frames decoded ahead, per process
+ASSEMBLE_CODEC = ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '20',
+                  '-pix_fmt', 'yuv420p']
+ASSEMBLE_PROGRESS_FRAMES = 500  # print progress this often
+TIMELAPSE_FRAME = re.compile(r'image([0-9]{4})_([0-9]{4})\.jpg$')
+
+
+def available():
+    """True if videos can be made (PIL and the encoder are installed)."""
+    return Image is not None and muxer_available()
+
+
+class AssemblyResult(collections.namedtuple(
+        'AssemblyResult', ['frames', 'failed', 'seconds', 'status'])):
+    @property
+    def frames_per_second(self):
+        return self.frames / self.seconds if self.seconds > 0 else 0
+
+
+def timelapse_frames(image_number, image_dir=IMAGE_DIR):
+    """Returns the paths of the frames of timelapse (or burst) image_number,
+    in order.
+    """
+    frames = []
+    for filename in os.listdir(image_dir):
+        match = TIMELAPSE_FRAME.match(filename)
+        if match is not None and int(match.group(1)) == image_number:
+            frames.append(filename)
+    return [os.path.join(image_dir, f) for f in sorted(frames)]
+
+
+def frame_size(path, box=ASSEMBLE_SIZE):
+    """Returns the size of the video: the first frame scaled to fit in box,
+    rounded down to even numbers (for yuv420p).
+    """
+    with Image.open(path) as picture:
+        width, height = picture.size
+    scale = min(box[0] / width, box[1] / height)
+    return (max(2, int(width * scale) // 2 * 2),
+            max(2, int(height * scale) // 2 * 2))
+
+
+def load_frame(path, size):
+    """Returns the frame at path as raw RGB bytes, scaled to fit size and
+    centred on black, or None if it can't be read.
+    """
+    try:
+        with Image.open(path) as picture:
+            picture.draft('RGB', size)
+            picture = picture.convert('RGB')
+    except (OSError, ValueError) as e:
+        print("ERROR (assemble {}):".format(path), e)
+        return None
+    if picture.size != size:
+        scale = min(size[0] / picture.width, size[1] / picture.height)
+        scaled = (max(1, round(picture.width * scale)),
+                  max(1, round(picture.height * scale)))
+        picture = picture.resize(scaled, Image.BILINEAR)
+        if scaled != size:
+            frame = Image.new('RGB', size)
+            frame.paste(picture, ((size[0] - scaled[0]) // 2,
+                                  (size[1] - scaled[1]) // 2))
+            picture = frame
+    return picture.tobytes()
+
+
+def decoded_frames(paths, size, processes=None, window=None):
+    """Yields each frame in paths as raw RGB bytes (None for frames that
+    couldn't be read), in order. Frames are decoded by a pool of processes,
+    at most window frames ahead of the one being yielded.
+    """
+    processes = min(processes or os.cpu_count() or 1, max(1, len(paths)))
+    window = window or processes * ASSEMBLE_WINDOW_PER_PROCESS
+    paths = iter(paths)
+    # don't fork: we're usually called from a threaded program
+    context = multiprocessing.get_context('forkserver')
+    with concurrent.futures.ProcessPoolExecutor(
+            processes, mp_context=context) as pool:
+        in_flight = collections.deque(
+            pool.submit(load_frame, path, size)
+            for path in itertools.islice(paths, window))
+        while len(in_flight) > 0:
+            frame = in_flight.popleft().result()
+            path = next(paths, None)
+            if path is not None:
+                in_flight.append(pool.submit(load_frame, path, size))
+            yield frame
+
+
+class FrameEncoder(object):
+    """Runs the encoder reading raw RGB frames of size from its stdin.
+    Call :meth:`write` with each frame and :meth:`close` when done.
+    """
+    def __init__(self, filename, size, framerate=ASSEMBLE_FRAMERATE,
+                 codec=ASSEMBLE_CODEC):
+        self.filename = filename
+        self.command = [VIDEO_MUXER, '-loglevel', 'error', '-y',
+                        '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+                        '-s', '{}x{}'.format(*size),
+                        '-framerate', str(framerate),
+                        '-i', '-'] + codec + [filename]
+        self.started, self.start = time.time(), time.monotonic()
+        self.process = subprocess.Popen(self.command,
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.DEVNULL,
+                                        stderr=subprocess.PIPE)
+
+    def write(self, frame):
+        self.process.stdin.write(frame)
+
+    def close(self):
+        """Finishes the video. Returns the encoder's exit status."""
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass  # the encoder has already gone
+        stderr = self.process.stderr.read()
+        self.process.wait()
+        runner.record(self.command, self.started,
+                      time.monotonic() - self.start, self.process.returncode,
+                      stderr)
+        if self.process.returncode != 0:
+            print("ERROR ({}):".format(VIDEO_MUXER),
+                  stderr.decode('utf-8', 'replace').strip())
+        return self.process.returncode
+
+
+def morph_frames(framerate, max_framerate=ASSEMBLE_MAX_FRAMERATE):
+    """Returns the number of in-between frames that can be added when
+    playing framerate frames per second without the video going over
+    max_framerate.
+    """
+    return max(0, max_framerate // framerate - 1)
+
+
+def assemble(paths, filename, box=ASSEMBLE_SIZE,
+             framerate=ASSEMBLE_FRAMERATE, processes=None, window=None,
+             interpolate_frames=0):
+    """Makes the video filename from the frames in paths (in order), each
+    scaled to fit in box. Returns an :class:`AssemblyResult` (frames
+    counts the frames read, not the in-between ones).
+
+    :param processes: Size of the decoding pool (default: number of cores).
+    :param window: Most frames decoded ahead of the encoder (default:
+        ASSEMBLE_WINDOW_PER_PROCESS per process).
+    :param framerate: Frames of paths played per second, the video itself
+        runs at framerate * (interpolate_frames + 1) frames per second.
+    :param interpolate_frames: Crossfaded frames added between each pair
+        (see :mod:`snapcamera.interpolate`).
+    """
+    start = time.monotonic()
+    if len(paths) == 0:
+        print("ERROR (assemble): no frames")
+        return AssemblyResult(0, 0, 0, 1)
+    size = frame_size(paths[0], box)
+    encoder = FrameEncoder(filename, size,
+                           framerate * (interpolate_frames + 1))
+    counts = {'frames': 0, 'failed': 0}
+
+    def read_frames():
+        for frame in decoded_frames(paths, size, processes, window):
+            if frame is None:
+                counts['failed'] += 1
+                continue
+            counts['frames'] += 1
+            if counts['frames'] % ASSEMBLE_PROGRESS_FRAMES == 0:
+                print("Assemble {}: {} of {} frames ({:.1f} "
+                      "frames/s).".format(filename, counts['frames'],
+                                          len(paths), counts['frames'] /
+                                          (time.monotonic() - start)))
+            yield frame
+
+    frames = read_frames()
+    if interpolate_frames > 0:
+        frames = interpolate.crossfade(frames, interpolate_frames)
+    try:
+        for frame in frames:
+            encoder.write(frame)
+    except BrokenPipeError:
+        pass  # the encoder failed, close() says why
+    finally:
+        status = encoder.close()
+
+    result = AssemblyResult(counts['frames'], counts['failed'],
+                            time.monotonic() - start, status)
+    print("Assemble {}: {} frames at {}x{}, {} failed in {:.1f}s ({:.1f} "
+          "frames/s).".format(filename, result.frames, size[0], size[1],
+                              result.failed, result.seconds,
+                              result.frames_per_second))
+    return result
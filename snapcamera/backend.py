@@ -0,0 +1,531 @@
+"""Capture backends: the things that actually drive the camera.
+
+The camera asks its backend for stills, timelapses, videos, streams and
+bursts. Which backend is used is set by CAPTURE_BACKEND (or
+``snap-camera --backend``):
+
+cli
+    The Raspberry Pi command line tools (raspistill, raspivid). A warm
+    raspistill process is kept running for stills (see
+    :mod:`snapcamera.capture`).
+picamera
+    The picamera library, in-process. The camera stays open between
+    pictures so there is no process start up or settle time at all.
+fake
+    No camera. Writes deterministic synthetic JPEG and H.264 files (see
+    :mod:`snapcamera.synthetic`) so the rest of the application can be run
+    and benchmarked anywhere.
+"""
+import os
+import time
+import socket
+import threading
+import collections
+from snapcamera import runner
+from snapcamera import synthetic
+from snapcamera.capture import WarmStillCapture
+
+
+CAPTURE_BACKEND = 'cli'
+VIDEO_FRAMERATE = 30
+VIDEO_RESOLUTION = (1920, 1080)
+STREAM_FRAMERATE = 20
+STREAM_RESOLUTION = (480, 320)
+STREAM_LENGTH = 999999  # milliseconds
+FAKE_IMAGE_SIZE = int(2.4 * 1024 * 1024)
+FAKE_VIDEO_BITRATE = 17000000  # bits per second, about what raspivid does
+STILL_RESOLUTION = synthetic.STILL_RESOLUTION  # the camera's full resolution
+# roughly how big a still is at each JPEG quality, compared to the camera's
+# default (85): a first guess, typical of libjpeg on photographs, until the
+# storage estimator has measured both (see StorageEstimator.quality_size)
+JPEG_QUALITY_SIZES = {None: 1.0, 85: 1.0, 70: 0.62, 50: 0.42}
+
+# picamera spells some of the raspistill effects differently
+PICAMERA_EFFECTS = {
+    'solarise': 'solarize',
+    'posterize': 'posterise',
+    'watercolour': 'watercolor',
+    'colourswap': 'colorswap',
+    'colourpoint': 'colorpoint',
+    'colourbalance': 'colorbalance',
+}
+
+
+# quality and resolution are for stills, None is the camera's default
+CaptureSettings = collections.namedtuple(
+    'CaptureSettings', ['effect', 'auto_white_balance', 'preview',
+                        'quality', 'resolution'], defaults=(None, None))
+
+
+class CaptureBackendError(Exception):
+    pass
+
+
+class CaptureBackend(object):
+    """A way of taking pictures. Subclass this and override the capture
+    methods. They return 0 on success, like :func:`subprocess.call`, except
+    burst which returns (frames written, frames per second).
+    """
+    name = None
+
+    def start(self, settings):
+        """Get ready to take stills quickly (the camera is about to be used
+        in a still mode).
+        """
+        pass
+
+    def stop(self):
+        """We are leaving still modes; stop any preview and release whatever
+        start() was holding on to.
+        """
+        pass
+
+    def close(self):
+        """Release the camera (the program is exiting)."""
+        self.stop()
+
+    def still(self, filename, settings):
+        raise NotImplementedError()
+
+    def timelapse(self, filename_pattern, period, interval, settings):
+        """Takes a picture every interval for period (milliseconds). The
+        frame number (from 1) is put in filename_pattern with %.
+        """
+        raise NotImplementedError()
+
+    def video(self, filename, length, settings):
+        """Records length milliseconds of H.264 to filename."""
+        raise NotImplementedError()
+
+    def video_to(self, output, length, settings):
+        """Records length milliseconds of H.264 to output, a binary file
+        object with a file descriptor (usually a pipe to a muxer).
+        """
+        raise NotImplementedError()
+
+    def stream(self, dest_ip, port, settings):
+        """Sends H.264 to dest_ip:port over TCP."""
+        raise NotImplementedError()
+
+    def burst(self, filename_for, frames, settings):
+        """Takes frames pictures as quickly as possible, saving frame i to
+        filename_for(i).
+        """
+        raise NotImplementedError()
+
+
+def still_size_fraction(settings, storage=None):
+    """Roughly how big a still taken with settings is compared to one at
+    the default quality and full resolution.
+
+    :param storage: A :class:`snapcamera.storage.StorageEstimator` whose
+        measured sizes are used instead of JPEG_QUALITY_SIZES once it has
+        some.
+    """
+    fraction = None
+    if storage is not None:
+        fraction = storage.quality_size(settings.quality)
+    if fraction is None:
+        fraction = JPEG_QUALITY_SIZES.get(settings.quality, 1.0)
+    return fraction * still_resolution_fraction(settings)
+
+
+def still_resolution_fraction(settings):
+    """The pixels in a still taken with settings compared to one at full
+    resolution.
+    """
+    if settings.resolution is None:
+        return 1.0
+    return (settings.resolution[0] * settings.resolution[1] /
+            (STILL_RESOLUTION[0] * STILL_RESOLUTION[1]))
+
+
+def timelapse_frames(period, interval):
+    """The number of frames in a timelapse."""
+    if interval <= 0:
+        return 1
+    return max(1, int(period / interval))
+
+
+class CLIBackend(CaptureBackend):
+    """raspistill and raspivid."""
+    name = 'cli'
+
+    def __init__(self):
+        self.warm_capture = WarmStillCapture()
+        self.keep_warm = False
+
+    def start(self, settings):
+        self.keep_warm = True
+        self.warm_capture.start(self.build_still_options(settings))
+
+    def stop(self):
+        self.keep_warm = False
+        self.warm_capture.stop()
+
+    def build_still_options(self, settings):
+        options = ['--nopreview'] if not settings.preview else []
+        options += ['--imxfx', settings.effect]
+        options += ['--awb', settings.auto_white_balance]
+        if settings.quality is not None:
+            options += ['--quality', str(settings.quality)]
+        if settings.resolution is not None:
+            options += ['--width', str(settings.resolution[0]),
+                        '--height', str(settings.resolution[1])]
+        return options
+
+    def build_still_command(self, filename, settings):
+        # timeout defaults to 5 with preview. Allows the camera to settle
+        return ['raspistill', '--output', filename] + \
+            self.build_still_options(settings)
+
+    def build_timelapse_command(self, filename_pattern, period, interval,
+                                settings):
+        return ['raspistill',
+                '--timeout', str(period),
+                '--timelapse', str(interval),
+                '--output', filename_pattern] + \
+            self.build_still_options(settings)
+
+    def build_video_command(self, filename, length, settings):
+        command = ['raspivid',
+                   '--timeout', str(length),
+                   '--output', filename,
+                   '--exposure', 'fixedfps',
+                   '--awb', settings.auto_white_balance,
+                   '--framerate', str(VIDEO_FRAMERATE)]
+        # command += ['--width', '1080', '--height', '720']
+        # command += ['--bitrate', '10000000']  # 10 Mbps
+        if not settings.preview:
+            command.append('--nopreview')
+        return command
+
+    def build_stream_command(self):
+        return ['raspivid', '-fps', str(STREAM_FRAMERATE),
+                '--width', str(STREAM_RESOLUTION[0]),
+                '--height', str(STREAM_RESOLUTION[1]),
+                '-t', str(STREAM_LENGTH), '-o', '-']
+
+    def build_burst_command(self, settings):
+        """raspivid writing MJPEG (one JPEG per frame) to stdout."""
+        # imported here so that burst mode is only loaded when it's used
+        # (see snapcamera.modes)
+        from snapcamera import burst
+        command = ['raspivid', '--codec', 'MJPEG', '--timeout', '0',
+                   '--width', str(burst.BURST_WIDTH),
+                   '--height', str(burst.BURST_HEIGHT),
+                   '--framerate', str(burst.BURST_FRAMERATE),
+                   '--bitrate', str(burst.BURST_BITRATE),
+                   '--awb', settings.auto_white_balance,
+                   '--imxfx', settings.effect,
+                   '--output', '-']
+        if not settings.preview:
+            command.append('--nopreview')
+        return command
+
+    def still(self, filename, settings):
+        if self.keep_warm:
+            return self.warm_capture.capture(
+                filename, self.build_still_options(settings))
+        return runner.call(self.build_still_command(filename, settings))
+
+    def timelapse(self, filename_pattern, period, interval, settings):
+        return self._with_camera(runner.call, self.build_timelapse_command(
+            filename_pattern, period, interval, settings))
+
+    def video(self, filename, length, settings):
+        return self._with_camera(
+            runner.call, self.build_video_command(filename, length, settings))
+
+    def video_to(self, output, length, settings):
+        # raspivid writes straight into output, we don't copy anything
+        return self._with_camera(
+            runner.call, self.build_video_command('-', length, settings),
+            stdout=output)
+
+    def stream(self, dest_ip, port, settings):
+        return self._with_camera(runner.call_pipeline, [
+            self.build_stream_command(), ['nc', dest_ip, str(port)]])
+
+    def burst(self, filename_for, frames, settings):
+        from snapcamera.burst import BurstCapture
+        capture = BurstCapture(self.build_burst_command(settings), frames)
+        fps = self._with_camera(capture.run, filename_for)
+        return capture.frames_written, fps
+
+    def _with_camera(self, function, *args, **kwargs):
+        """Runs function with the warm process stopped (only one program
+        can have the camera open) and restarts it afterwards.
+        """
+        self.warm_capture.stop()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            if self.keep_warm:
+                self.warm_capture.start()
+
+
+class PiCameraBackend(CaptureBackend):
+    """The picamera library. The camera is opened once and kept open."""
+    name = 'picamera'
+
+    def __init__(self):
+        # imported here so that picamera is only loaded when this backend
+        # is used
+        try:
+            import picamera
+        except ImportError:
+            raise CaptureBackendError("picamera is not installed")
+        self.picamera = picamera
+        self.camera = None
+        self.lock = threading.Lock()
+
+    def _open(self, settings, resolution=None, framerate=None):
+        if self.camera is None:
+            self.camera = self.picamera.PiCamera()
+        if self.camera.recording:
+            return
+        resolution = resolution or settings.resolution or \
+            self.camera.MAX_RESOLUTION
+        if self.camera.resolution != resolution:
+            self.camera.resolution = resolution
+        if framerate is not None and self.camera.framerate != framerate:
+            self.camera.framerate = framerate
+        self.camera.image_effect = PICAMERA_EFFECTS.get(settings.effect,
+                                                        settings.effect)
+        self.camera.awb_mode = settings.auto_white_balance
+        if settings.preview and self.camera.preview is None:
+            self.camera.start_preview()
+        elif not settings.preview and self.camera.preview is not None:
+            self.camera.stop_preview()
+
+    def start(self, settings):
+        with self.lock:
+            self._open(settings)
+
+    def stop(self):
+        with self.lock:
+            if self.camera is not None and self.camera.preview is not None:
+                self.camera.stop_preview()
+
+    def close(self):
+        with self.lock:
+            if self.camera is not None:
+                self.camera.close()
+                self.camera = None
+
+    def _call(self, name, function, *args):
+        """Runs function holding the camera lock, recording it like an
+        external program. Returns 0 on success.
+        """
+        started, start = time.time(), time.monotonic()
+        with self.lock:
+            try:
+                function(*args)
+            except (self.picamera.PiCameraError, ValueError,
+                    OSError) as e:
+                runner.record(['picamera', name], started,
+                              time.monotonic() - start, 1,
+                              str(e).encode('utf-8'))
+                print("ERROR (picamera {}):".format(name), e)
+                return 1
+        runner.record(['picamera', name], started, time.monotonic() - start,
+                      0)
+        return 0
+
+    def still(self, filename, settings):
+        def capture():
+            self._open(settings)
+            if settings.quality is not None:
+                self.camera.capture(filename, quality=settings.quality)
+            else:
+                self.camera.capture(filename)
+        return self._call('still', capture)
+
+    def timelapse(self, filename_pattern, period, interval, settings):
+        def capture():
+            self._open(settings)
+            start = time.monotonic()
+            for frame in range(timelapse_frames(period, interval)):
+                delay = start + frame * interval / 1000 - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                self.camera.capture(filename_pattern % (frame + 1))
+        return self._call('timelapse', capture)
+
+    def video(self, filename, length, settings):
+        return self.video_to(filename, length, settings)
+
+    def video_to(self, output, length, settings):
+        # picamera takes a file name or a file object
+        def record():
+            self._open(settings, VIDEO_RESOLUTION, VIDEO_FRAMERATE)
+            self.camera.start_recording(output, format='h264')
+            try:
+                self.camera.wait_recording(length / 1000)
+            finally:
+                self.camera.stop_recording()
+        return self._call('video', record)
+
+    def stream(self, dest_ip, port, settings):
+        def record():
+            self._open(settings, STREAM_RESOLUTION, STREAM_FRAMERATE)
+            connection = socket.create_connection((dest_ip, port))
+            stream = connection.makefile('wb')
+            try:
+                self.camera.start_recording(stream, format='h264')
+                try:
+                    self.camera.wait_recording(STREAM_LENGTH / 1000)
+                finally:
+                    self.camera.stop_recording()
+            finally:
+                stream.close()
+                connection.close()
+        return self._call('stream', record)
+
+    def burst(self, filename_for, frames, settings):
+        from snapcamera.burst import (
+            BURST_WIDTH,
+            BURST_HEIGHT,
+            BURST_FRAMERATE,
+        )
+        times = []
+
+        def filenames():
+            for i in range(frames):
+                yield filename_for(i)
+                times.append(time.monotonic())
+
+        def capture():
+            self._open(settings, (BURST_WIDTH, BURST_HEIGHT),
+                       BURST_FRAMERATE)
+            self.camera.capture_sequence(filenames(), use_video_port=True)
+
+        self._call('burst', capture)
+        if len(times) < 2:
+            return len(times), None
+        return len(times), (len(times) - 1) / (times[-1] - times[0])
+
+
+class FakeBackend(CaptureBackend):
+    """Writes synthetic files instead of using a camera.
+
+    :param realtime: Take as long as a real camera would for timelapses,
+        videos and bursts (otherwise return as soon as the files are
+        written).
+    :param still_latency: Seconds to wait before writing each still.
+    """
+    name = 'fake'
+
+    def __init__(self, realtime=False, still_latency=0,
+                 image_size=FAKE_IMAGE_SIZE):
+        self.realtime = realtime
+        self.still_latency = still_latency
+        self.image_size = image_size
+        self.frame = 0
+
+    def _write_jpeg(self, filename, resolution=STILL_RESOLUTION,
+                    size_fraction=1):
+        self.frame += 1
+        with open(filename, 'wb') as image:
+            image.write(synthetic.jpeg_bytes(
+                self.frame, int(self.image_size * size_fraction),
+                resolution))
+
+    def _sleep(self, seconds):
+        if self.realtime and seconds > 0:
+            time.sleep(seconds)
+
+    def _call(self, name, function, *args):
+        started, start = time.time(), time.monotonic()
+        try:
+            function(*args)
+        except (OSError, ValueError) as e:
+            runner.record(['fake', name], started, time.monotonic() - start,
+                          1, str(e).encode('utf-8'))
+            print("ERROR (fake {}):".format(name), e)
+            return 1
+        runner.record(['fake', name], started, time.monotonic() - start, 0)
+        return 0
+
+    def still(self, filename, settings):
+        if self.still_latency > 0:
+            time.sleep(self.still_latency)
+        return self._call('still', self._write_jpeg, filename,
+                          settings.resolution or STILL_RESOLUTION,
+                          still_size_fraction(settings))
+
+    def timelapse(self, filename_pattern, period, interval, settings):
+        def capture():
+            for frame in range(timelapse_frames(period, interval)):
+                if frame > 0:
+                    self._sleep(interval / 1000)
+                self._write_jpeg(filename_pattern % (frame + 1))
+        return self._call('timelapse', capture)
+
+    def _write_h264(self, output, length, framerate):
+        frames = int(length / 1000 * framerate)
+        for data in synthetic.h264_frames(frames, self.frame,
+                                          bitrate=FAKE_VIDEO_BITRATE,
+                                          framerate=framerate):
+            output.write(data)
+            self._sleep(1 / framerate)
+        self.frame += frames
+
+    def video(self, filename, length, settings):
+        def record():
+            with open(filename, 'wb') as output:
+                self._write_h264(output, length, VIDEO_FRAMERATE)
+        return self._call('video', record)
+
+    def video_to(self, output, length, settings):
+        return self._call('video', self._write_h264, output, length,
+                          VIDEO_FRAMERATE)
+
+    def stream(self, dest_ip, port, settings):
+        def record():
+            connection = socket.create_connection((dest_ip, port))
+            try:
+                self._write_h264(connection.makefile('wb'), STREAM_LENGTH,
+                                 STREAM_FRAMERATE)
+            finally:
+                connection.close()
+        return self._call('stream', record)
+
+    def burst(self, filename_for, frames, settings):
+        from snapcamera.burst import (
+            BURST_WIDTH,
+            BURST_HEIGHT,
+            BURST_FRAMERATE,
+        )
+        start = time.monotonic()
+
+        def capture():
+            for i in range(frames):
+                if i > 0:
+                    self._sleep(1 / BURST_FRAMERATE)
+                self._write_jpeg(filename_for(i), (BURST_WIDTH, BURST_HEIGHT))
+        status = self._call('burst', capture)
+        if status != 0 or frames < 2:
+            return (frames if status == 0 else 0), None
+        return frames, (frames - 1) / max(time.monotonic() - start, 1e-6)
+
+
+BACKENDS = {
+    CLIBackend.name: CLIBackend,
+    PiCameraBackend.name: PiCameraBackend,
+    FakeBackend.name: FakeBackend,
+}
+
+
+def get_backend(name=None):
+    """Returns a new backend called name (default CAPTURE_BACKEND, or the
+    SNAP_CAMERA_BACKEND environment variable if it is set).
+    """
+    if name is None:
+        name = os.environ.get('SNAP_CAMERA_BACKEND', CAPTURE_BACKEND)
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise CaptureBackendError("unknown capture backend: {}".format(name))
+    return backend_class()
@@ -0,0 +1,112 @@
+"""Applies an overlay to pictures that have already been taken.
+
+The pictures are shared between a pool of processes (one per core by
+default), each with its own :class:`snapcamera.overlay.Compositor` so the
+overlay is only decoded once per process. Pictures whose output is newer
+than both the picture and the overlay are skipped.
+"""
+import os
+import re
+import time
+import collections
+import multiprocessing
+import concurrent.futures
+from snapcamera.mode_option import IMAGE_DIR, OVERLAY_DIR
+from snapcamera.overlay import Compositor, overlay_image_name
+
+
+BATCH_CHUNK_SIZE = 4  # pictures sent to a worker at a time
+# pictures and timelapse/burst frames, not pictures with overlays
+ORIGINAL_IMAGE = re.compile(r'image([0-9]{4})(_[0-9]{4})?\.jpg$')
+
+_compositor = None
+
+
+class BatchResult(collections.namedtuple(
+        'BatchResult', ['done', 'skipped', 'failed', 'seconds'])):
+    @property
+    def images_per_second(self):
+        return self.done / self.seconds if self.seconds > 0 else 0
+
+
+def parse_range(text):
+    """Parses '12-40', '12-', '-40' or '12' into (first, last). Missing ends
+    are None.
+    """
+    if '-' not in text:
+        return int(text), int(text)
+    first, last = text.split('-', 1)
+    return (int(first) if first else None, int(last) if last else None)
+
+
+def original_images(first=None, last=None, image_dir=IMAGE_DIR):
+    """Returns the pictures (not ones with overlays) numbered from first to
+    last inclusive, in order.
+    """
+    images = []
+    for filename in os.listdir(image_dir):
+        match = ORIGINAL_IMAGE.match(filename)
+        if match is None:
+            continue
+        number = int(match.group(1))
+        if (first is None or number >= first) and \
+                (last is None or number <= last):
+            images.append(filename)
+    return sorted(images)
+
+
+def is_up_to_date(output, sources):
+    try:
+        output_mtime = os.stat(output).st_mtime_ns
+    except OSError:
+        return False
+    return all(os.stat(source).st_mtime_ns <= output_mtime
+               for source in sources)
+
+
+def apply_overlay(overlay, first=None, last=None, processes=None,
+                  image_dir=IMAGE_DIR, overlay_dir=OVERLAY_DIR):
+    """Puts overlay (a file name in overlay_dir) on the pictures numbered
+    first to last. Returns a :class:`BatchResult`.
+
+    :param processes: Size of the process pool (default: number of cores).
+    """
+    start = time.monotonic()
+    overlay_file = os.path.join(overlay_dir, overlay)
+    jobs = []
+    skipped = 0
+    for image in original_images(first, last, image_dir):
+        image_file = os.path.join(image_dir, image)
+        output_file = os.path.join(image_dir,
+                                   overlay_image_name(image, overlay))
+        if is_up_to_date(output_file, (image_file, overlay_file)):
+            skipped += 1
+        else:
+            jobs.append((overlay_file, image_file, output_file))
+
+    failed = 0
+    if len(jobs) > 0:
+        processes = min(processes or os.cpu_count() or 1, len(jobs))
+        # don't fork: we're usually called from a threaded program
+        context = multiprocessing.get_context('forkserver')
+        with concurrent.futures.ProcessPoolExecutor(
+                processes, mp_context=context) as pool:
+            for status in pool.map(_composite, jobs,
+                                   chunksize=BATCH_CHUNK_SIZE):
+                failed += 1 if status != 0 else 0
+
+    result = BatchResult(len(jobs) - failed, skipped, failed,
+                         time.monotonic() - start)
+    print("Overlay {}: {} done, {} up to date, {} failed in {:.1f}s "
+          "({:.1f} images/s).".format(overlay, result.done, result.skipped,
+                                      result.failed, result.seconds,
+                                      result.images_per_second))
+    return result
+
+
+def _composite(job):
+    # runs in the pool, keep one compositor (and its cache) per process
+    global _compositor
+    if _compositor is None:
+        _compositor = Compositor()
+    return _compositor.composite(*job)
@@ -0,0 +1,151 @@
+"""Burst mode: take a number of pictures as fast as the camera can.
+
+raspistill has to go through the still port for every frame, which limits a
+timelapse to a frame every second or so. Instead we run raspivid with the
+MJPEG encoder so the video port hands us a stream of complete JPEGs (at the
+video frame rate), split the stream into frames and write them out on a
+separate thread through a bounded buffer. If the card can't keep up the
+buffer fills, raspivid blocks on its output and drops frames, and the frame
+rate we report goes down.
+"""
+import time
+import queue
+import threading
+import subprocess
+from snapcamera import runner
+from snapcamera.mode_option import ModeOption
+
+
+BURST_FRAMES = (5, 10, 20, 50, 100)
+BURST_WIDTH = 1920
+BURST_HEIGHT = 1080
+BURST_FRAMERATE = 30
+BURST_BITRATE = 25000000
+BURST_BUFFER_FRAMES = 8
+BURST_READ_SIZE = 64 * 1024
+JPEG_END = b'\xff\xd9'
+
+
+class BurstModeOption(ModeOption):
+    keep_camera_warm = False
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.frames_index = 1
+        self.fps = None
+
+    @property
+    def frames(self):
+        return BURST_FRAMES[self.frames_index]
+
+    def update_display_option_text(self):
+        if self.fps is not None:
+            text = "{:.1f}fps".format(self.fps)
+        else:
+            text = "n{}".format(self.frames)
+        super().update_display_option_text(text)
+
+    def update_camera(self):
+        self.camera.burst_frames = self.frames
+
+    def enter(self):
+        self.update_camera()
+
+    def exit(self):
+        self.camera.burst_frames = None
+
+    def next(self):
+        self.frames_index = (self.frames_index + 1) % len(BURST_FRAMES)
+        self.fps = None
+        self.update_camera()
+        self.update_display_option_text()
+
+    def previous(self):
+        self.frames_index = (self.frames_index - 1) % len(BURST_FRAMES)
+        self.fps = None
+        self.update_camera()
+        self.update_display_option_text()
+
+    def post_picture(self):
+        # show how fast we were until the next button press
+        self.fps = self.camera.burst_fps
+        self.update_display_option_text()
+        self.fps = None
+
+
+class BurstCapture(object):
+    """Reads a stream of JPEGs from command's stdout and writes the first
+    `frames` of them to the file names given by filename_for(frame_index).
+
+    :param command: argv of a program writing concatenated JPEGs to stdout.
+    :param frames: How many frames to keep.
+    :param buffer_frames: How many frames can be waiting to be written.
+    """
+    def __init__(self, command, frames, buffer_frames=BURST_BUFFER_FRAMES):
+        self.command = command
+        self.frames = frames
+        self.buffer = queue.Queue(maxsize=buffer_frames)
+        self.frames_written = 0
+        self.write_error = None
+
+    def run(self, filename_for):
+        """Captures the burst. Returns the frame rate achieved (frames per
+        second from the first frame to the last one written), or None if
+        fewer than two frames were captured.
+        """
+        writer = threading.Thread(target=self._write_frames,
+                                  args=(filename_for,))
+        writer.start()
+        started, start = time.time(), time.monotonic()
+        process = subprocess.Popen(self.command, stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL)
+        first_frame_at = None
+        frames_read = 0
+        data = b''
+        try:
+            while frames_read < self.frames and self.write_error is None:
+                chunk = process.stdout.read1(BURST_READ_SIZE)
+                if not chunk:
+                    break  # the camera program has stopped
+                # only search the new data (the end marker may straddle
+                # the two chunks)
+                search_from = max(0, len(data) - 1)
+                data += chunk
+                end = data.find(JPEG_END, search_from)
+                while end >= 0 and frames_read < self.frames:
+                    if first_frame_at is None:
+                        first_frame_at = time.monotonic()
+                    self.buffer.put(data[:end + len(JPEG_END)])
+                    frames_read += 1
+                    data = data[end + len(JPEG_END):]
+                    end = data.find(JPEG_END)
+        finally:
+            process.terminate()
+            process.wait()
+            self.buffer.put(None)
+            writer.join()
+            runner.record(self.command, started, time.monotonic() - start,
+                          0 if self.frames_written == self.frames else 1)
+
+        if self.write_error is not None:
+            print("ERROR (burst):", self.write_error)
+        if self.frames_written < 2:
+            return None
+        return (self.frames_written - 1) / \
+            (self.last_frame_at - first_frame_at)
+
+    def _write_frames(self, filename_for):
+        while True:
+            frame = self.buffer.get()
+            if frame is None:
+                return
+            if self.write_error is not None:
+                continue  # drain the buffer so the reader never blocks
+            try:
+                with open(filename_for(self.frames_written), 'wb') as f:
+                    f.write(frame)
+            except OSError as e:
+                self.write_error = e
+                continue
+            self.frames_written += 1
+            self.last_frame_at = time.monotonic()
@@ -1,49 +1,74 @@
 import os
 import stat
-import subprocess
+import threading
 import pifacecad
 from pifacecad.lcd import LCD_WIDTH
 from snapcamera.mode_option import (
     IMAGE_DIR,
     VIDEO_DIR,
     OVERLAY_DIR,
-    CameraModeOption,
-    VideoModeOption,
-)
-from snapcamera.effects import (
+    CAPTURE_TMP_DIR,
+    THUMBNAIL_DIR,
+    TIMELAPSE_DIR,
+    TIMELAPSE_STATE_FILE,
     CAMERA_EFFECTS,
-    EffectsModeOption,
-    OverlayModeOption,
-)
-from snapcamera.timelapse import (
-    TimelapseModeOption,
 )
-from snapcamera.ir import (
-    IRModeOption,
+from snapcamera.modes import ModeList
+from snapcamera import runner
+from snapcamera import mux
+from snapcamera.backend import (
+    CaptureSettings,
+    VIDEO_FRAMERATE,
+    get_backend,
+    still_resolution_fraction,
+    still_size_fraction,
+    timelapse_frames,
 )
-from snapcamera.viewer import (
-    ViewerModeOption,
+from snapcamera.media_index import (
+    MediaIndex,
     image_index,
     video_index,
 )
-from snapcamera.network import (
-    NetworkTriggerModeOption,
-)
+from snapcamera.storage import StorageEstimator
+from snapcamera.capture_queue import CaptureQueue
+from snapcamera.postprocess import VideoJobQueue
+from snapcamera import thumbnails
+from snapcamera.display import ShadowDisplay
+from snapcamera.events import EventDispatcher
 
 
-AVERAGE_IMAGE_SIZE = 2.4 * 1024 * 1024  # 2.4M is from `ls -l`
 EGG_TIMER_BITMAP = pifacecad.LCDBitmap(
     [0x1f, 0x11, 0xa, 0x4, 0xa, 0x11, 0x1f, 0x0])  # no sand
     #[0x1f, 0x11, 0xa, 0x4, 0xa, 0x1d, 0x1f, 0x0])  # sand
 EGG_TIMER_BITMAP_INDEX = 0
+VIDEO_JOBS_STATUS_CHAR = 'c'  # converting videos in the background
+POSTPROCESS_CLOSE_TIMEOUT = 30  # seconds to finish overlays etc. at exit
+POSTPROCESS_QUEUE_DEPTH = 20
+
+
+def duration_text(seconds):
+    """A duration in at most 6 characters for the LCD, for example: 45s,
+    12m30s, 5h07m, 3d12h, 250d.
+    """
+    seconds = int(seconds)
+    if seconds < 60:
+        return "{}s".format(seconds)
+    if seconds < 60 * 60:
+        return "{}m{:02}s".format(seconds // 60, seconds % 60)
+    if seconds < 100 * 60 * 60:
+        return "{}h{:02}m".format(seconds // 3600, seconds // 60 % 60)
+    if seconds < 100 * 24 * 60 * 60:
+        return "{}d{:02}h".format(seconds // 86400, seconds // 3600 % 24)
+    return "{}d".format(min(99999, seconds // 86400))
 
 
 class Camera(object):
     """A camera for the Raspberry Pi which uses PiFace CAD and the RapspiCam.
     """
-    def __init__(self, cad, start_mode='camera'):
+    def __init__(self, cad, start_mode='camera', backend=None):
         # make the image and overlay dirs
-        for directory in (IMAGE_DIR, VIDEO_DIR, OVERLAY_DIR):
+        for directory in (IMAGE_DIR, VIDEO_DIR, OVERLAY_DIR, CAPTURE_TMP_DIR,
+                          THUMBNAIL_DIR, TIMELAPSE_DIR):
             if not os.path.exists(directory):
                 os.makedirs(directory, exist_ok=True)
                 # rwx for everyone
@@ -52,43 +77,85 @@ class Camera(object):
                          stat.S_IRGRP | stat.S_IWUSR | stat.S_IXGRP |
                          stat.S_IROTH | stat.S_IWUSR | stat.S_IXOTH)
 
-        # this is a bit hacky
-        #---------------------------------------------------------------
-        # MAKE SURE YOU UPDATE THIS SECTION WHEN YOU CHANGE THE MODES
-        possible_modes = ('camera', 'effects', 'overlay', 'timelapse', 'video',
-                          'ir', 'network', 'viewer')
-        self.current_mode_index = possible_modes.index(start_mode)
-
-        self.modes = (
-            {'name': 'camera', 'option': CameraModeOption(self)},
-            {'name': 'effects', 'option': EffectsModeOption(self)},
-            {'name': 'overlay', 'option': OverlayModeOption(self)},
-            {'name': 'timelapse', 'option': TimelapseModeOption(self)},
-            {'name': 'video', 'option': VideoModeOption(self)},
-            {'name': 'IR', 'option': IRModeOption(self)},
-            {'name': 'network', 'option': NetworkTriggerModeOption(self)},
-            {'name': 'viewer', 'option': ViewerModeOption(self)},
-        )
-        #---------------------------------------------------------------
+        # the modes use these so make them first
+        self.images = MediaIndex(IMAGE_DIR, "image", image_index)
+        self.videos = MediaIndex(VIDEO_DIR, "video", video_index)
+        self.storage = StorageEstimator(IMAGE_DIR)
+        self.storage.seed([IMAGE_DIR+f for f in self.images[-20:]])
+        self.storage.start()
+
+        # modes are made the first time they're entered (see
+        # snapcamera.modes)
+        self.modes = ModeList(self)
+        self.current_mode_index = self.modes.index(start_mode)
         self.cad = cad
+        # only sends the characters that change, from its own thread (see
+        # snapcamera.display). Nothing is drawn until start_camera resumes
+        # it, so the splash screen stays up while we start.
+        self.display = ShadowDisplay(cad.lcd)
+        self.display.pause()
+        self.display.start()
 
         # camera options
         self.preview_on = True
         self.timeout = 0
         self.timelapse_interval = None
+        self.timelapse = None  # the TimelapseRun being taken
+        self.live_stack_mode = None  # stack timelapses as they're taken
+        self.live_stack = None
+        self.burst_frames = None
+        self.burst_fps = None
         self.effect = CAMERA_EFFECTS[0]
         self.auto_white_balance = 'fluorescent'
 
-        self.cad.lcd.store_custom_bitmap(EGG_TIMER_BITMAP_INDEX,
-                                         EGG_TIMER_BITMAP)
+        # what actually drives the camera (see snapcamera.backend)
+        self.backend = get_backend(backend)
+
+        self.display.command('store_custom_bitmap', EGG_TIMER_BITMAP_INDEX,
+                             EGG_TIMER_BITMAP)
+
+        # everything that uses the camera goes through here
+        self.capture_queue = CaptureQueue(
+            on_depth_change=self.print_status_queue)
+        self.capture_queue.start()
+
+        # work on pictures that have been taken (overlays), off the
+        # capture thread so it doesn't hold up the next picture
+        self.postprocess_queue = CaptureQueue(
+            max_pending=POSTPROCESS_QUEUE_DEPTH)
+        self.postprocess_queue.start()
+        self.thumbnails = thumbnails.ThumbnailCache()
+        self.thumbnails_pending = []  # timelapse frames, see make_thumbnails
+        self.thumbnails_pending_lock = threading.Lock()
+
+        # switches, IR and network commands are handled here, one at a time
+        self.events = EventDispatcher(
+            is_idle=lambda: not self.capture_queue.is_busy)
+        self.events.start()
+
+        # video conversion, resumes unfinished jobs from last time
+        self.video_job_failed = False  # keep showing the error
+        self.video_jobs = VideoJobQueue(self.convert_h264_to_mp4,
+                                        on_done=self.video_converted,
+                                        on_change=self.video_jobs_changed)
+        self.video_jobs.start()
 
     @property
     def pictures_taken(self):
-        return len(os.listdir(IMAGE_DIR))
+        return len(self.images)
 
     @property
     def pictures_remaining(self):
-        return int(freespace(IMAGE_DIR) / AVERAGE_IMAGE_SIZE)
+        if self.current_mode['name'] == 'video':
+            # videos are recorded as bytes per second
+            return self.storage.remaining(self.storage_key,
+                                          units=self.timeout / 1000)
+        return self.storage.remaining(self.storage_key)
+
+    @property
+    def storage_key(self):
+        """What we're doing, for the storage statistics."""
+        return (self.current_mode['name'], self.effect)
 
     @property
     def current_mode(self):
@@ -96,20 +163,7 @@ class Camera(object):
 
     @property
     def last_image_number(self):
-        images = filter(lambda filename: "image" in filename,
-                        os.listdir(IMAGE_DIR))
-        try:
-            last_image = sorted(images)[-1]
-        except IndexError:
-            image_number = 0
-        else:
-            image_number = image_index(last_image)
-            # last_image = last_image.strip(".jpgpng")
-            # if '_' in last_image:
-            #     last_image = last_image[:-5]  # get rid of the _0000
-            # image_number = int(last_image[-4:])
-        finally:
-            return image_number
+        return self.images.last_number
 
     @property
     def next_image_number(self):
@@ -117,121 +171,351 @@ class Camera(object):
 
     @property
     def last_video_number(self):
-        videos = filter(lambda filename: "video" in filename,
-                        os.listdir(VIDEO_DIR))
-        try:
-            last_video = sorted(videos)[-1]
-        except IndexError:
-            video_number = 0
-        else:
-            video_number = video_index(last_video)
-        finally:
-            return video_number
+        return self.videos.last_number
 
     @property
     def next_video_number(self):
         return self.last_video_number + 1
 
-    def build_camera_command(self):
-        command = 'raspistill'
-        if self.timelapse_interval is not None:
-            command += ' --timeout {timelapse_period} '\
-                ' --timelapse {timelapse_interval}'\
-                ' --output {filename}'.format(
-                    timelapse_period=self.timeout,
-                    timelapse_interval=self.timelapse_interval,
-                    filename=IMAGE_DIR+'image{:04}_%04d.jpg'.format(
-                        self.next_image_number),
-                )
-        else:
-            # removed timeout for normal images
-            # timeout defaults to 5 with preview. Allows the camera to settle
-            # command += ' --timeout {timeout} --output {filename}'.format(
-            command += ' --output {filename}'.format(
-                # timeout=self.timeout,
-                filename=IMAGE_DIR+"image{:04}.jpg".format(
-                    self.next_image_number),
-            )
-        command += " --nopreview" if not self.preview_on else ""
-        command += " --imxfx {}".format(self.effect)
-        command += ' --awb {}'.format(self.auto_white_balance)
-        return command
-
-    def build_video_command(self, length, filename=None):
-        if filename is None:
-            filename = "{video_dir}video{number:04}.h264".format(
-                video_dir=VIDEO_DIR,
-                number=self.next_video_number)
-        command = 'raspivid'
-        command += ' --timeout {timeout} --output {filename}'
-        command += ' --exposure {exposure} --awb {awb}'
-        command += ' --framerate {framerate}'
-        # command += ' --width {width} --height {height}'
-        # command += ' --bitrate {bitrate} --framerate {framerate}'
-        command = command.format(
-            timeout=length,
-            filename=filename,
-            exposure='fixedfps',
-            awb=self.auto_white_balance,
-            framerate=30,
-            # width=1080,
-            # height=720,
-            # bitrate=10000000,  # 10 Mbps
-            # framerate=24,
-        )
-        command += ' --nopreview' if not self.preview_on else ""
-        return command
+    @property
+    def settings(self):
+        """The camera options, for the capture backend."""
+        return CaptureSettings(effect=self.effect,
+                               auto_white_balance=self.auto_white_balance,
+                               preview=self.preview_on)
 
     def take_picture(self):
         """Captures a picture with the camera."""
-        command = self.build_camera_command()
-        self.run_camera_command(command)
+        if self.burst_frames is not None:
+            self.take_burst()
+        elif self.timelapse_interval is not None:
+            self.take_timelapse()
+        else:
+            self.take_still()
+
+    def take_still(self):
+        """Captures a single picture. Fast if the backend has been started
+        (see update_warm_capture).
+        """
+        self.print_status_busy()
+        image_name = "image{:04}.jpg".format(self.next_image_number)
+        status = self.backend.still(IMAGE_DIR+image_name, self.settings)
+        if status == 0:
+            self.images.add(image_name)
+            self.storage.record_file(self.storage_key, IMAGE_DIR+image_name)
+            self.storage.record_quality(
+                self.settings.quality, IMAGE_DIR+image_name,
+                scale=still_resolution_fraction(self.settings))
+            self.make_thumbnails([image_name])
+            self.print_status_not_busy()
+        else:
+            self.print_status_error()
+        self.update_display_taken()
+        self.update_display_remaining()
+
+    def take_timelapse(self):
+        """Captures a picture every timelapse_interval for timeout
+        milliseconds, named image<number>_<frame>.jpg. The quality is
+        lowered if that's what it takes to fit them on the card.
+        """
+        # imported here so that timelapse mode is only loaded when it's
+        # used (see snapcamera.modes)
+        from snapcamera.timelapse import TimelapseRun, plan_timelapse
+        self.storage.refresh()
+        plan = plan_timelapse(
+            self.storage, ('timelapse', self.effect),
+            timelapse_frames(self.timeout, self.timelapse_interval),
+            self.settings)
+        print(plan.describe())
+        self.run_timelapse(TimelapseRun(
+            self.next_image_number, plan.frames, self.timelapse_interval,
+            plan.settings, stack=self.live_stack_mode))
+
+    def run_timelapse(self, run):
+        """Takes the rest of a timelapse (see snapcamera.timelapse). Runs
+        on the capture queue's worker thread.
+        """
+        self.timelapse = run
+        if run.stack is not None:
+            self.live_stack = self.start_live_stack(run)
+        self.print_status_busy()
+        self.update_display_mode()
+        try:
+            status = run.run(
+                lambda image_name: self.backend.still(IMAGE_DIR+image_name,
+                                                      run.settings),
+                on_frame=self.timelapse_frame_taken)
+        finally:
+            self.timelapse = None
+            if self.live_stack is not None:
+                self.live_stack.finish()
+                self.live_stack = None
+        self.capture_finished(status)
+        self.update_display_mode()
+
+    def start_live_stack(self, run):
+        """Returns a LiveStack for run (see snapcamera.stack), or None if
+        numpy isn't installed.
+        """
+        # imported here so that numpy is only loaded when it's needed
+        from snapcamera import stack
+        if not stack.available():
+            print("ERROR (stack): numpy isn't installed")
+            return None
+        live_stack = stack.LiveStack(run.image_number, run.stack,
+                                     self.postprocess_queue,
+                                     on_save=self.images.add)
+        if run.frames_written > 0:
+            # resumed, stack the frames that have already been taken
+            live_stack.add(run.image_name(frame)
+                           for frame in range(1, run.frames_written + 1))
+        return live_stack
+
+    def replan_timelapse(self, run):
+        """Lowers the quality of the rest of run if it won't fit at the
+        quality it is being taken at.
+        """
+        from snapcamera.timelapse import plan_timelapse
+        plan = plan_timelapse(self.storage, ('timelapse', run.settings.effect),
+                              run.remaining, run.settings)
+        if still_size_fraction(plan.settings, self.storage) < \
+                still_size_fraction(run.settings, self.storage):
+            print("Timelapse image{:04} is running out of space.".format(
+                run.image_number), plan.describe())
+            run.settings = plan.settings
+            self.update_display_mode()
+
+    def timelapse_frame_taken(self, image_name, status):
+        from snapcamera.timelapse import TIMELAPSE_REPLAN_FRAMES
+        run = self.timelapse
+        if status == 0:
+            self.images.add(image_name)
+            # recorded as if at full quality, so that planning the next
+            # timelapse doesn't count this one's lower quality twice
+            self.storage.record_file(
+                ('timelapse', run.settings.effect), IMAGE_DIR+image_name,
+                scale=still_size_fraction(run.settings, self.storage))
+            self.storage.record_quality(
+                run.settings.quality, IMAGE_DIR+image_name,
+                scale=still_resolution_fraction(run.settings))
+            self.make_thumbnails([image_name], coalesce=True)
+            if self.live_stack is not None:
+                self.live_stack.add([image_name])
+            if run.frames_written % TIMELAPSE_REPLAN_FRAMES == 0:
+                self.replan_timelapse(run)
+        else:
+            self.print_status_error()
+        self.update_display_taken()
+        self.update_display_remaining()
+        if self.current_mode['name'] == 'timelapse':
+            self.update_display_options()
+
+    def stop_timelapse(self, keep_state=False):
+        """Stops the timelapse being taken (after the current frame)."""
+        run = self.timelapse
+        if run is not None:
+            run.stop(keep_state)
+
+    def resume_timelapse(self):
+        """Carries on with a timelapse that was stopped by the camera
+        stopping (power cut, reboot).
+        """
+        if not os.path.exists(TIMELAPSE_STATE_FILE):
+            return
+        from snapcamera.timelapse import TimelapseRun
+        run = TimelapseRun.load()
+        if run is None:
+            return
+        print("Resuming timelapse image{:04} at frame {} ({} to go).".format(
+            run.image_number, run.frames_written + 1, run.remaining))
+        self.replan_timelapse(run)
+        self.capture_queue.put(self.run_timelapse, (run,), name='timelapse')
+
+    def take_burst(self):
+        """Captures burst_frames pictures as fast as possible. They are named
+        like timelapse images: image<number>_<frame>.jpg.
+        """
+        self.print_status_busy()
+        image_number = self.next_image_number
+        image_names = ["image{:04}_{:04}.jpg".format(image_number, i + 1)
+                       for i in range(self.burst_frames)]
+        frames_written, self.burst_fps = self.backend.burst(
+            lambda i: IMAGE_DIR+image_names[i], self.burst_frames,
+            self.settings)
+        for image_name in image_names[:frames_written]:
+            self.images.add(image_name)
+            self.storage.record_file(self.storage_key, IMAGE_DIR+image_name)
+        self.make_thumbnails(image_names[:frames_written])
+        if frames_written == self.burst_frames:
+            self.print_status_not_busy()
+        else:
+            self.print_status_error()
+        print("Burst: {} of {} frames at {} fps.".format(
+            frames_written, self.burst_frames, self.burst_fps))
+        self.update_display_taken()
+        self.update_display_remaining()
+
+    def make_thumbnails(self, image_names, coalesce=False):
+        """Makes small copies of new pictures in the background (see
+        snapcamera.thumbnails).
+
+        :param coalesce: Add the pictures to the job that is already
+            waiting, if there is one, instead of queueing a job for them.
+            A timelapse frame at a time would fill the queue otherwise.
+        """
+        if not thumbnails.available() or len(image_names) == 0:
+            return
+        if not coalesce:
+            self.postprocess_queue.put(self.thumbnails.generate_all,
+                                       (list(image_names),),
+                                       name="thumbnails")
+            return
+        with self.thumbnails_pending_lock:
+            self.thumbnails_pending.extend(image_names)
+        # if the queue is full they are made by the next job instead
+        self.postprocess_queue.put(self.make_pending_thumbnails,
+                                   name="timelapse_thumbnails",
+                                   coalesce=True)
+
+    def make_pending_thumbnails(self):
+        with self.thumbnails_pending_lock:
+            image_names = self.thumbnails_pending
+            self.thumbnails_pending = []
+        self.thumbnails.generate_all(image_names)
+
+    def update_warm_capture(self):
+        """Gets the backend ready for fast stills, or releases it, depending
+        on the current mode. Call this after changing mode or camera options.
+        """
+        if self.current_mode['option'].keep_camera_warm:
+            self.backend.start(self.settings)
+        else:
+            self.backend.stop()
+
+    def close(self):
+        """Releases the camera."""
+        self.events.stop()
+        self.stop_timelapse(keep_state=True)  # carries on next time
+        self.capture_queue.stop()
+        self.postprocess_queue.join(POSTPROCESS_CLOSE_TIMEOUT)
+        self.postprocess_queue.stop()
+        self.video_jobs.stop()
+        self.backend.close()
+        self.storage.stop()
+        self.display.stop()
 
     def record_video(self, length):
-        """Captures video with the camera. Length is in miliseconds."""
-        filename = "{video_dir}video{number:04}.h264".format(
+        """Captures video with the camera. Length is in miliseconds.
+
+        If the muxer is installed the H.264 is piped straight into it and
+        the mp4 is written in one pass. Otherwise the h264 file is
+        converted to mp4 in the background.
+        """
+        if not mux.muxer_available():
+            self.record_video_h264(length)
+            return
+        filename = "{video_dir}video{number:04}.mp4".format(
             video_dir=VIDEO_DIR,
             number=self.next_video_number)
-        self.run_camera_command(self.build_video_command(length, filename))
-        self.convert_h264_to_mp4(filename)
+        self.print_status_busy()
+        muxer = mux.StreamingMuxer(filename, VIDEO_FRAMERATE)
+        status = self.backend.video_to(muxer.input, length, self.settings)
+        status |= muxer.close()
+        if status == 0:
+            self.videos.add(os.path.basename(filename))
+            if length > 0:
+                self.storage.record_file(('video', self.effect), filename,
+                                         scale=length / 1000)
+        else:
+            self.videos.refresh(force=True)
+        self.capture_finished(status)
 
-    def convert_h264_to_mp4(self, h264filename):
+    def record_video_h264(self, length):
+        """Records an h264 file and converts it to mp4 in the background."""
+        filename = "{video_dir}video{number:04}.h264".format(
+            video_dir=VIDEO_DIR,
+            number=self.next_video_number)
         self.print_status_busy()
-        command = "MP4Box -add {h264file} {mp4file}"
-        command = command.format(h264file=h264filename,
-                                 mp4file=h264filename.replace("h264", "mp4"))
-        status = subprocess.call([command], shell=True)
-        status |= self.remove_file(h264filename)
+        status = self.backend.video(filename, length, self.settings)
+        self.capture_finished(status)
+        self.video_jobs.submit(filename, length, self.effect)
+
+    def stream(self, dest_ip, port):
+        """Sends H.264 to dest_ip:port over TCP (runs on the capture
+        queue's worker thread).
+        """
+        self.print_status_busy()
+        status = self.backend.stream(dest_ip, port, self.settings)
+        self.capture_finished(status)
+
+    def convert_h264_to_mp4(self, job):
+        """Converts a recorded video to mp4 (runs on a video job worker)."""
+        if os.path.exists(job.mp4filename):
+            # left by a conversion that was interrupted, MP4Box -add would
+            # add another track to it
+            self.remove_file(job.mp4filename)
+        status = runner.call(
+            ['MP4Box', '-add', job.h264filename, job.mp4filename])
         if status == 0:
-            self.print_status_not_busy()
+            # keep the original if the conversion failed
+            status = self.remove_file(job.h264filename)
+        return status
+
+    def video_converted(self, job):
+        """Called when a background video conversion has finished."""
+        if job.status == 0:
+            self.videos.remove(os.path.basename(job.h264filename))
+            self.videos.add(os.path.basename(job.mp4filename))
+            if job.length:
+                self.storage.record_file(('video', job.effect or self.effect),
+                                         job.mp4filename,
+                                         scale=job.length / 1000)
         else:
+            self.videos.refresh(force=True)
+            self.video_job_failed = True
             self.print_status_error()
         self.update_display_taken()
         self.update_display_remaining()
 
+    def video_jobs_changed(self):
+        # a failed conversion shows 'E' until the next capture
+        if not self.capture_queue.is_busy and not self.video_job_failed:
+            self.print_status_not_busy()
+
     def remove_file(self, filename):
-        command = "rm {}".format(filename)
-        status = subprocess.call([command], shell=True)
-        return status
+        return runner.remove_file(filename)
 
-    def run_camera_command(self, command):
-        self.print_status_busy()
+    def capture_finished(self, status):
+        """Shows the result of a timelapse or video and updates the display.
+        """
         # print("KCH-CHSSHHH!")
-        status = subprocess.call([command], shell=True)
         if status == 0:
             self.print_status_not_busy()
         else:
             self.print_status_error()
+        # something else has been writing to the card
+        self.storage.refresh()
         self.update_display_taken()
         self.update_display_remaining()
 
     def print_status_busy(self):
+        self.video_job_failed = False
         # self.print_status_char('#')
-        self.cad.lcd.set_cursor(7, 0)
-        self.cad.lcd.write_custom_bitmap(EGG_TIMER_BITMAP_INDEX)
+        if self.capture_queue.depth > 0:
+            self.print_status_queue(self.capture_queue.depth)
+            return
+        self.display.write_custom_bitmap(7, 0, EGG_TIMER_BITMAP_INDEX)
+
+    def print_status_queue(self, depth):
+        """Shows how many captures are waiting (instead of the egg timer)."""
+        if depth > 0:
+            self.print_status_char(str(min(depth, 9)))
 
     def print_status_not_busy(self):
-        self.print_status_char(' ')
+        if self.video_jobs.is_busy:
+            self.print_status_char(VIDEO_JOBS_STATUS_CHAR)
+        else:
+            self.print_status_char(' ')
 
     def print_status_error(self):
         self.print_status_char('E')
@@ -241,8 +525,7 @@ class Camera(object):
 
     def print_status_char(self, character):
         # show that we're taking
-        self.cad.lcd.set_cursor(7, 0)
-        self.cad.lcd.write(character)
+        self.display.write(7, 0, character)
 
     def update_display(self):
         self.update_display_taken()
@@ -254,32 +537,35 @@ class Camera(object):
         width = 7
         taken_text = "t:{:04}".format(self.pictures_taken)
         taken_text = taken_text.ljust(width)[:width]
-        self.cad.lcd.set_cursor(0, 0)
-        self.cad.lcd.write(taken_text)
+        self.display.write(0, 0, taken_text)
 
     def update_display_remaining(self):
-        """Updates the remaining section of the display."""
+        """Updates the remaining section of the display. In timelapse mode
+        it shows how long the card will last at the timelapse interval.
+        """
         width = 8
-        remaining_text = "r:{:04}".format(self.pictures_remaining)
+        if self.timelapse_interval:
+            remaining_text = "r:" + duration_text(
+                self.storage.time_remaining(self.storage_key,
+                                            self.timelapse_interval) / 1000)
+        else:
+            remaining_text = "r:{:04}".format(self.pictures_remaining)
         remaining_text = remaining_text.rjust(width)[:width]
-        self.cad.lcd.set_cursor(LCD_WIDTH-width, 0)
-        self.cad.lcd.write(remaining_text)
+        self.display.write(LCD_WIDTH-width, 0, remaining_text)
 
     def update_display_mode(self):
-        """Updates the mode section of the display."""
+        """Updates the mode section of the display. While a timelapse is
+        taken at a lower quality to make it fit, it shows the quality.
+        """
         width = 8
         mode_name = self.current_mode['name']
+        if self.timelapse is not None:
+            mode_name = self.timelapse.quality_text() or mode_name
         mode_name = mode_name.ljust(width)[:width]
-        self.cad.lcd.set_cursor(0, 1)
-        self.cad.lcd.write(mode_name)
+        self.display.write(0, 1, mode_name)
         self.update_display_options()
 
     def update_display_options(self):
         """Updates the options section of the display."""
         self.current_mode['option'].update_display_option_text()
 
-
-def freespace(path):
-    """Returns the number of bytes available at the given path."""
-    stats = os.statvfs(path)
-    return stats.f_bsize * stats.f_bavail  # block size * blocks available
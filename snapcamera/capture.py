@@ -0,0 +1,128 @@
+"""Keeps a single raspistill process running between pictures so that we
+don't pay for process start up, camera initialisation and the preview settle
+time on every press of the shutter button.
+
+raspistill is started in keypress mode (``--keypress --timeout 0``). Every
+newline written to its stdin triggers one exposure which is written to
+``CAPTURE_TMP_DIR`` (raspistill writes to ``<name>~`` and renames the file
+when it is complete). We wait for the finished file and then move it to where
+the camera wants it.
+"""
+import os
+import time
+import threading
+import subprocess
+from snapcamera import runner
+from snapcamera.mode_option import CAPTURE_TMP_DIR
+
+
+WARM_FILENAME = "warm%04d.jpg"
+WARM_CAPTURE_TIMEOUT = 10  # seconds, includes camera start up
+WARM_POLL_INTERVAL = 0.005  # seconds
+
+
+class WarmCaptureError(Exception):
+    pass
+
+
+class WarmStillCapture(object):
+    """A long running raspistill process which takes a picture whenever we
+    ask it to.
+
+    :param options: Extra raspistill arguments (effect, awb, preview).
+    :param capture_dir: Where raspistill writes its frames before they are
+        moved into place. Must be on the same file system as the destination.
+    """
+    def __init__(self, options=None, capture_dir=CAPTURE_TMP_DIR):
+        self.options = tuple(options) if options is not None else tuple()
+        self.capture_dir = capture_dir
+        self.process = None
+        self.frame = 0
+        self.lock = threading.Lock()
+
+    @property
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def build_command(self):
+        # frames are numbered from 1, raspistill starts at 0 unless told
+        command = ['raspistill', '--keypress', '--timeout', '0',
+                   '--framestart', '1',
+                   '--output', os.path.join(self.capture_dir, WARM_FILENAME)]
+        command.extend(self.options)
+        return command
+
+    def start(self, options=None):
+        """Starts raspistill (if it isn't already running with the same
+        options). Returns straight away, the camera initialises in the
+        background.
+        """
+        with self.lock:
+            if options is not None and tuple(options) != self.options:
+                self._stop()
+                self.options = tuple(options)
+            if self.is_running:
+                return
+            # frames from the last process are stale
+            for filename in os.listdir(self.capture_dir):
+                os.remove(os.path.join(self.capture_dir, filename))
+            self.frame = 0
+            self.process = subprocess.Popen(self.build_command(),
+                                            stdin=subprocess.PIPE,
+                                            stdout=subprocess.DEVNULL)
+
+    def stop(self):
+        """Stops raspistill, releasing the camera for other programs."""
+        with self.lock:
+            self._stop()
+
+    def _stop(self):
+        if not self.is_running:
+            self.process = None
+            return
+        try:
+            self.process.stdin.write(b"x\n")
+            self.process.stdin.flush()
+            self.process.wait(timeout=WARM_CAPTURE_TIMEOUT)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+    def capture(self, filename, options=None):
+        """Takes a picture and saves it to filename. Starts raspistill if
+        it's not running (the first picture will be slower). Returns 0 on
+        success, like :func:`subprocess.call`.
+        """
+        self.start(options)
+        with self.lock:
+            started, start = time.time(), time.monotonic()
+            self.frame += 1
+            frame_file = os.path.join(self.capture_dir,
+                                      WARM_FILENAME % self.frame)
+            try:
+                self.process.stdin.write(b"\n")
+                self.process.stdin.flush()
+                self._wait_for(frame_file)
+                os.rename(frame_file, filename)
+            except (OSError, WarmCaptureError) as e:
+                runner.record(['raspistill', '--keypress'], started,
+                              time.monotonic() - start, 1,
+                              str(e).encode('utf-8'))
+                print("ERROR (warm capture):", e)
+                self._stop()
+                return 1
+            runner.record(['raspistill', '--keypress'], started,
+                          time.monotonic() - start, 0)
+        return 0
+
+    def _wait_for(self, frame_file):
+        deadline = time.monotonic() + WARM_CAPTURE_TIMEOUT
+        while not os.path.exists(frame_file):
+            if self.process.poll() is not None:
+                raise WarmCaptureError(
+                    "raspistill exited ({})".format(self.process.returncode))
+            if time.monotonic() > deadline:
+                raise WarmCaptureError(
+                    "timed out waiting for {}".format(frame_file))
+            time.sleep(WARM_POLL_INTERVAL)
@@ -0,0 +1,180 @@
+"""A queue of capture requests served by one worker thread.
+
+Button, IR and network handlers put requests on the queue and return
+straight away. The worker runs them one at a time, in order, so two
+captures never use the camera at the same time.
+
+Queueing policy:
+
+- Pictures are serialised: every press is queued, up to
+  CAPTURE_QUEUE_DEPTH pending requests. Presses beyond that are dropped
+  (and counted).
+- Requests put with ``coalesce=True`` (videos) are merged with an identical
+  request that is already pending, so holding the button doesn't queue up
+  minutes of video.
+
+How long each request waited and ran is kept in the history::
+
+    >>> camera.capture_queue.summary()
+    {'picture': {'requests': 5, 'wait': 0.41, 'run': 0.12}, ...}
+"""
+import time
+import threading
+import collections
+
+
+CAPTURE_QUEUE_DEPTH = 3  # pending requests, not counting the running one
+CAPTURE_HISTORY_LENGTH = 50
+
+
+class CaptureRequest(object):
+    """A request to run action(*args) on the capture worker."""
+    def __init__(self, action, args=tuple(), name="picture"):
+        self.action = action
+        self.args = args
+        self.name = name
+        self.queued_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.done = threading.Event()
+
+    @property
+    def wait_time(self):
+        """Seconds spent in the queue."""
+        if self.started_at is None:
+            return None
+        return self.started_at - self.queued_at
+
+    @property
+    def execution_time(self):
+        """Seconds spent running."""
+        if self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+
+class CaptureQueue(object):
+    """Runs capture requests on a dedicated worker thread.
+
+    :param on_depth_change: Called with the number of pending requests
+        whenever it changes (from whichever thread changed it).
+    """
+    def __init__(self, on_depth_change=None, max_pending=CAPTURE_QUEUE_DEPTH):
+        self.on_depth_change = on_depth_change
+        self.max_pending = max_pending
+        self.pending = collections.deque()
+        self.current = None
+        self.condition = threading.Condition()
+        self.history = collections.deque(maxlen=CAPTURE_HISTORY_LENGTH)
+        self.dropped = 0
+        self._running = False
+        self._thread = None
+
+    @property
+    def depth(self):
+        """Number of pending requests (not counting the running one)."""
+        return len(self.pending)
+
+    @property
+    def is_busy(self):
+        return self.current is not None or len(self.pending) > 0
+
+    def start(self):
+        with self.condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._work)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Finishes the running request, drops the pending ones."""
+        with self.condition:
+            self._running = False
+            self.pending.clear()
+            self.condition.notify_all()
+        if self._thread is not None and \
+                self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def put(self, action, args=tuple(), name="picture", coalesce=False):
+        """Queues action(*args) and returns the request straight away.
+        Returns None if the request was dropped because the queue is full.
+        """
+        with self.condition:
+            if coalesce:
+                for request in self.pending:
+                    if request.name == name:
+                        return request
+            if len(self.pending) >= self.max_pending:
+                self.dropped += 1
+                print("Capture queue full, dropped {}.".format(name))
+                return None
+            request = CaptureRequest(action, args, name)
+            self.pending.append(request)
+            depth = len(self.pending)
+            self.condition.notify()
+        self._depth_changed(depth)
+        return request
+
+    def summary(self):
+        """Returns the number of requests and their mean wait and run
+        times (in seconds) by name.
+        """
+        with self.condition:
+            requests = list(self.history)
+        names = {}
+        for request in requests:
+            name = names.setdefault(
+                request.name, {'requests': 0, 'wait': 0, 'run': 0})
+            name['requests'] += 1
+            name['wait'] += request.wait_time
+            name['run'] += request.execution_time
+        for name in names.values():
+            name['wait'] /= name['requests']
+            name['run'] /= name['requests']
+        return names
+
+    def join(self, timeout=None):
+        """Waits until there is nothing left to do. Returns False on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while self.is_busy:
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                self.condition.wait(remaining)
+        return True
+
+    def _work(self):
+        while True:
+            with self.condition:
+                while self._running and len(self.pending) == 0:
+                    self.condition.wait()
+                if not self._running:
+                    return
+                request = self.current = self.pending.popleft()
+                depth = len(self.pending)
+            self._depth_changed(depth)
+            request.started_at = time.monotonic()
+            try:
+                request.action(*request.args)
+            except Exception as e:
+                request.error = e
+                print("ERROR (capture {}):".format(request.name), e)
+            request.finished_at = time.monotonic()
+            with self.condition:
+                self.history.append(request)
+                self.current = None
+                self.condition.notify_all()
+            request.done.set()
+
+    def _depth_changed(self, depth):
+        if self.on_depth_change is not None:
+            self.on_depth_change(depth)
@@ -0,0 +1,81 @@
+"""Pages of thumbnails for browsing lots of pictures at once.
+
+Each picture is decoded small (its thumbnail copy), shrunk to fit its cell
+by averaging blocks of pixels with numpy and copied into the page. Pictures
+that don't have a thumbnail yet are drawn as a PLACEHOLDER rather than
+decoding the full size JPEG.
+"""
+import math
+try:
+    import numpy
+    from PIL import Image
+except ImportError:
+    numpy = Image = None
+
+
+GRID_COLUMNS = 4
+GRID_ROWS = 3
+GRID_GAP = 2  # pixels between cells
+GRID_PLACEHOLDER_COLOUR = (48, 48, 48)
+PLACEHOLDER = object()  # a picture whose thumbnail isn't ready yet
+
+
+def shrink(pixels, size):
+    """Returns pixels (a height x width x 3 array) shrunk to fit size by
+    averaging square blocks. Never makes pictures bigger.
+    """
+    height, width = pixels.shape[:2]
+    factor = max(1, math.ceil(max(width / size[0], height / size[1])))
+    if factor == 1:
+        return pixels
+    height, width = height // factor, width // factor
+    blocks = pixels[:height * factor, :width * factor].reshape(
+        height, factor, width, factor, 3)
+    return blocks.mean(axis=(1, 3), dtype=numpy.uint32).astype(numpy.uint8)
+
+
+class ContactSheet(object):
+    """Lays out pictures in a grid of columns x rows on a page of size
+    (width, height).
+    """
+    def __init__(self, size, columns=GRID_COLUMNS, rows=GRID_ROWS,
+                 gap=GRID_GAP):
+        self.size = size
+        self.columns = columns
+        self.rows = rows
+        self.gap = gap
+        self.cell_size = ((size[0] - gap * (columns - 1)) // columns,
+                          (size[1] - gap * (rows - 1)) // rows)
+
+    @property
+    def per_page(self):
+        return self.columns * self.rows
+
+    def cell_origin(self, i):
+        column, row = i % self.columns, i // self.columns
+        return (column * (self.cell_size[0] + self.gap),
+                row * (self.cell_size[1] + self.gap))
+
+    def render(self, pictures):
+        """Returns a page (a PIL image) of pictures, a list of PIL images
+        (None leaves the cell empty, PLACEHOLDER fills it with grey).
+        """
+        page = numpy.zeros((self.size[1], self.size[0], 3), dtype=numpy.uint8)
+        for i, picture in enumerate(pictures[:self.per_page]):
+            if picture is None:
+                continue
+            if picture is PLACEHOLDER:
+                x, y = self.cell_origin(i)
+                page[y:y + self.cell_size[1], x:x + self.cell_size[0]] = \
+                    GRID_PLACEHOLDER_COLOUR
+                continue
+            picture.draft('RGB', self.cell_size)
+            cell = shrink(numpy.asarray(picture.convert('RGB')),
+                          self.cell_size)
+            height, width = cell.shape[:2]
+            # centre it in the cell
+            x, y = self.cell_origin(i)
+            x += (self.cell_size[0] - width) // 2
+            y += (self.cell_size[1] - height) // 2
+            page[y:y + height, x:x + width] = cell
+        return Image.fromarray(page)
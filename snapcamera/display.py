@@ -0,0 +1,296 @@
+"""A shadow of the LCD so that we only send the characters that change,
+drawn by a single render thread.
+
+Everything that draws on the LCD writes into :class:`ShadowDisplay`, which
+remembers what is on the glass. When asked to draw it compares the two and
+sends only the runs of characters that differ, moving the cursor only when
+the next run doesn't start where the last one finished. Every command and
+data byte sent is counted so the savings can be measured (see
+:class:`FakeLCD`).
+"""
+import time
+import threading
+try:
+    from pifacecad.lcd import LCD_WIDTH
+except ImportError:
+    LCD_WIDTH = 16  # pifacecad isn't needed to draw on a FakeLCD
+
+
+LCD_HEIGHT = 2
+# sending one unchanged character costs the same as moving the cursor
+# past it, so runs this close together are sent as one
+MAX_RUN_GAP = 1
+DISPLAY_MAX_FPS = 20  # most times a second the render thread draws
+
+
+class ShadowDisplay(object):
+    """What we want on the LCD and what is on it.
+
+    Cells hold a character or, for custom bitmaps, the bitmap's index.
+
+    Once started, everything is drawn by one render thread: callers only
+    change the shadow and return, and the render thread draws the latest
+    state at most max_fps times a second (so a burst of updates is drawn
+    once). Before it is started (or after it is stopped) each update is
+    drawn straight away by the caller.
+
+    While paused (see :meth:`pause`) nothing is drawn, so that whatever is
+    on the LCD (the splash screen) stays there while the camera starts.
+
+    :param lcd: A pifacecad LCD (or :class:`FakeLCD`).
+    """
+    def __init__(self, lcd, width=LCD_WIDTH, height=LCD_HEIGHT,
+                 max_fps=DISPLAY_MAX_FPS):
+        self.lcd = lcd
+        self.width = width
+        self.height = height
+        self.min_interval = 1 / max_fps
+        self.condition = threading.Condition()
+        self.wanted = [[' '] * width for _ in range(height)]
+        self.commands = []  # other LCD calls, in order, waiting to be sent
+        self.dirty = False
+        self.rendering = False
+        self.paused = False
+        self.last_render = 0
+        self._running = False
+        self._thread = None
+        # only touched while holding draw_lock
+        self.draw_lock = threading.Lock()
+        self.shown = None  # unknown until we clear it or draw everything
+        self.cursor = None
+        self.commands_sent = 0
+        self.bytes_sent = 0
+        self.updates = 0
+        self.renders = 0
+        self.invalidate()
+
+    @property
+    def text(self):
+        """What we want on the LCD, as lines (bitmaps are shown as '#')."""
+        with self.condition:
+            return "\n".join(
+                "".join(c if isinstance(c, str) else '#' for c in line)
+                for line in self.wanted)
+
+    def start(self):
+        """Starts the render thread."""
+        with self.condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._render)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Draws anything outstanding and stops the render thread."""
+        with self.condition:
+            self._running = False
+            self.condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        self._thread = None
+
+    def pause(self):
+        """Stops drawing until :meth:`resume`. Updates still change the
+        shadow.
+        """
+        with self.condition:
+            self.paused = True
+
+    def resume(self):
+        """Draws everything that changed while paused."""
+        with self.condition:
+            self.paused = False
+            if not self.dirty:
+                return
+            if self._running:
+                self.condition.notify_all()
+            else:
+                self.flush()
+
+    def join(self, timeout=None):
+        """Waits until the LCD shows the latest state (or we're paused).
+        Returns False on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while self._running and not self.paused and \
+                    (self.dirty or self.rendering):
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                self.condition.wait(remaining)
+        return True
+
+    def write(self, col, row, text):
+        """Puts text at col, row (clipped to the edge of the LCD)."""
+        with self.condition:
+            for i, character in enumerate(text[:max(0, self.width - col)]):
+                self.wanted[row][col + i] = character
+            self._changed()
+
+    def write_custom_bitmap(self, col, row, index):
+        with self.condition:
+            self.wanted[row][col] = index
+            self._changed()
+
+    def clear(self):
+        """Clears the LCD (one command) and the shadow."""
+        with self.condition:
+            self.wanted = [[' '] * self.width for _ in range(self.height)]
+            self.commands.append(('clear', ()))
+            self._changed()
+
+    def command(self, name, *args):
+        """Calls lcd.name(*args) (for example backlight_on) in order with
+        the drawing.
+        """
+        with self.condition:
+            self.commands.append((name, args))
+            self._changed()
+
+    def invalidate(self):
+        """Forgets what is on the LCD (call this after writing to it
+        directly). The next flush redraws everything.
+        """
+        with self.draw_lock:
+            self.shown = [[None] * self.width for _ in range(self.height)]
+            self.cursor = None
+
+    def flush(self):
+        """Sends the differences between what we want and what is shown."""
+        with self.condition:
+            wanted = [list(line) for line in self.wanted]
+            commands, self.commands = self.commands, []
+            self.dirty = False
+        with self.draw_lock:
+            for name, args in commands:
+                self._send_command(name, args)
+            for row in range(self.height):
+                for start, end in self._changed_runs(wanted, row):
+                    self._send(wanted, row, start, end)
+            self.renders += 1
+
+    def _changed(self):
+        # called holding the condition
+        self.updates += 1
+        self.dirty = True
+        if self.paused:
+            return
+        if self._running:
+            self.condition.notify_all()
+        else:
+            self.flush()
+
+    def _render(self):
+        while True:
+            with self.condition:
+                while self._running and (self.paused or not self.dirty):
+                    self.condition.wait()
+                if not self.dirty:
+                    return
+                wait = self.last_render + self.min_interval - time.monotonic()
+                if wait > 0 and self._running:
+                    # more updates can arrive meanwhile, they're drawn too
+                    self.condition.wait(wait)
+                    continue
+                self.rendering = True
+            try:
+                self.flush()
+            except Exception as e:
+                print("ERROR (display):", e)
+                self.invalidate()
+            with self.condition:
+                self.rendering = False
+                self.last_render = time.monotonic()
+                self.condition.notify_all()
+
+    def _send_command(self, name, args):
+        getattr(self.lcd, name)(*args)
+        self.commands_sent += 1
+        if name == 'clear':
+            self.shown = [[' '] * self.width for _ in range(self.height)]
+            self.cursor = (0, 0)
+        else:
+            self.cursor = None  # some commands move the address counter
+
+    def _changed_runs(self, wanted, row):
+        wanted, shown = wanted[row], self.shown[row]
+        runs = []
+        for col in range(self.width):
+            if wanted[col] == shown[col]:
+                continue
+            if len(runs) > 0 and col - runs[-1][1] <= MAX_RUN_GAP:
+                runs[-1][1] = col + 1
+            else:
+                runs.append([col, col + 1])
+        return runs
+
+    def _send(self, wanted, row, start, end):
+        if self.cursor is not None and self.cursor[1] == row and \
+                0 < start - self.cursor[0] <= MAX_RUN_GAP:
+            start = self.cursor[0]  # cheaper to rewrite what's in between
+        if self.cursor != (start, row):
+            self.lcd.set_cursor(start, row)
+            self.commands_sent += 1
+        text = ""
+        for col in range(start, end):
+            cell = wanted[row][col]
+            if isinstance(cell, str):
+                text += cell
+                continue
+            if len(text) > 0:
+                self.lcd.write(text)
+                text = ""
+            self.lcd.write_custom_bitmap(cell)
+        if len(text) > 0:
+            self.lcd.write(text)
+        self.bytes_sent += end - start
+        self.shown[row][start:end] = wanted[row][start:end]
+        self.cursor = (end, row) if end < self.width else None
+
+
+class FakeLCD(object):
+    """Stands in for pifacecad's LCD, counting what would be sent.
+
+    Each cursor move or other instruction is one command, each character
+    (or custom bitmap) written is one byte.
+    """
+    def __init__(self, width=LCD_WIDTH, height=LCD_HEIGHT):
+        self.width = width
+        self.height = height
+        self.commands = 0
+        self.bytes = 0
+        self.cells = [[' '] * width for _ in range(height)]
+        self.col = self.row = 0
+
+    def set_cursor(self, col, row):
+        self.commands += 1
+        self.col, self.row = col, row
+
+    def write(self, text):
+        for character in text:
+            self._put(character)
+
+    def write_custom_bitmap(self, index):
+        self._put(index)
+
+    def clear(self):
+        self.commands += 1
+        self.cells = [[' '] * self.width for _ in range(self.height)]
+        self.col = self.row = 0
+
+    def _put(self, cell):
+        self.bytes += 1
+        if self.col < self.width:
+            self.cells[self.row][self.col] = cell
+        self.col += 1
+
+    def __getattr__(self, name):
+        # backlight_on(), store_custom_bitmap() etc.
+        def command(*args, **kwargs):
+            self.commands += 1
+        return command
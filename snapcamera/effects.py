@@ -1,35 +1,8 @@
-import os
 from snapcamera.mode_option import ModeOption
 from snapcamera.mode_option import (
-    # IMAGE_DIR,
+    IMAGE_DIR,
     OVERLAY_DIR,
-)
-
-
-CAMERA_EFFECTS = (
-    'none',
-    'negative',
-    'solarise',
-    'posterize',
-    'whiteboard',
-    'blackboard',
-    'sketch',
-    'denoise',
-    'emboss',
-    'oilpaint',
-    'hatch',
-    'gpen',
-    'pastel',
-    'watercolour',
-    'film',
-    'blur',
-    'saturation',
-    'colourswap',
-    'washedout',
-    'posterise',
-    'colourpoint',
-    'colourbalance',
-    'cartoon',
+    CAMERA_EFFECTS,
 )
 
 
@@ -63,23 +36,30 @@ class EffectsModeOption(ModeOption):
         self.current_effect_index = \
             (self.current_effect_index + 1) % len(self.effects)
         self.update_camera()
+        self.camera.update_warm_capture()
         self.update_display_option_text()
 
     def previous(self):
         self.current_effect_index = \
             (self.current_effect_index - 1) % len(self.effects)
         self.update_camera()
+        self.camera.update_warm_capture()
         self.update_display_option_text()
 
 
 class OverlayModeOption(ModeOption):
     def __init__(self, *args):
         super().__init__(*args)
+        # imported here so that effects mode doesn't load numpy and PIL
+        # (see snapcamera.modes)
+        from snapcamera.overlay import Compositor, OverlayCatalog
+        self.compositor = Compositor()
+        self.catalog = OverlayCatalog()
         self.current_overlay_index = 0 if len(self.overlays) > 0 else None
 
     @property
     def overlays(self):
-        return sorted(os.listdir(OVERLAY_DIR))
+        return self.catalog.names
 
     @property
     def current_overlay(self):
@@ -92,6 +72,21 @@ class OverlayModeOption(ModeOption):
     def current_overlay(self, effect_name):
         self.current_overlay_index = self.overlays.index(effect_name)
 
+    def refresh_overlays(self):
+        """Picks up overlays that have been added or removed, keeping the
+        current one if it's still there.
+        """
+        current = self.current_overlay
+        if not self.catalog.refresh():
+            return
+        if current in self.overlays:
+            self.current_overlay = current
+        else:
+            self.current_overlay_index = 0 if len(self.overlays) > 0 else None
+
+    def enter(self):
+        self.refresh_overlays()
+
     def update_display_option_text(self):
         super().update_display_option_text(
             str(self.current_overlay).replace(".png", ""))
@@ -116,30 +111,36 @@ class OverlayModeOption(ModeOption):
         if not self.current_overlay:
             return
 
-        # show that we're taking
-        self.camera.print_status_busy()
-        super().update_display_option_text("working")
-
         original_image = "image{:04}.jpg".format(self.camera.last_image_number)
 
-        new_image = "image{:04}-{}.jpg".format(
-            self.camera.last_image_number,
-            self.current_overlay.replace(".png", ""))
+        from snapcamera.overlay import overlay_image_name
+        new_image = overlay_image_name(original_image, self.current_overlay)
 
-        command = "composite -geometry +500+500 -quality 100 "\
-            "{overlay} {original_image} {new_image}".format(
-                overlay=OVERLAY_DIR+self.current_overlay,
-                original_image=IMAGE_DIR+original_image,
-                new_image=IMAGE_DIR+new_image)
-        status = subprocess.call([command], shell=True)
+        # composite in the background so the next picture isn't held up
+        super().update_display_option_text("working")
+        self.camera.postprocess_queue.put(
+            self.composite,
+            (self.current_overlay, original_image, new_image,
+             self.camera.storage_key),
+            name="overlay")
+
+    def composite(self, overlay, original_image, new_image, storage_key):
+        status = self.compositor.composite(OVERLAY_DIR+overlay,
+                                           IMAGE_DIR+original_image,
+                                           IMAGE_DIR+new_image)
 
         # show that we've finished
         if status == 0:
-            self.camera.print_status_not_busy()
+            self.camera.images.add(new_image)
+            self.camera.storage.record_file(storage_key,
+                                            IMAGE_DIR+new_image,
+                                            same_shot=True)
+            self.camera.thumbnails.generate(new_image)
         else:
             self.camera.print_status_error()
 
-        self.update_display_option_text()
+        if self.camera.current_mode['option'] is self:
+            self.update_display_option_text()
 
         # we have an extra image, update taken/remaining
         self.camera.update_display_taken()
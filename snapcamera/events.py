@@ -0,0 +1,191 @@
+"""One thread that handles every input: switches, IR and network commands.
+
+Handlers used to run on whichever listener thread saw the input, all
+changing the camera at once. Now each input is posted to the
+:class:`EventDispatcher` and handled in turn, most important first (the
+shutter beats a mode change). Inputs from the same source that arrive
+within its debounce time are ignored.
+
+Events that change what the camera is doing (mode changes) can ask to
+wait until nothing is being captured, so the capture worker never sees
+half changed settings. Other events are handled meanwhile. If the camera
+is still busy after EVENT_IDLE_TIMEOUT they are dropped, so that presses
+made during a long video don't all happen at once when it finishes.
+
+Every event's input-to-action latency is recorded::
+
+    >>> camera.events.summary()
+    {'take_picture': {'events': 12, 'mean': 0.0004, 'max': 0.0011}, ...}
+"""
+import time
+import threading
+import collections
+
+
+SHUTTER_PRIORITY = 0
+COMMAND_PRIORITY = 1
+OPTION_PRIORITY = 2
+MODE_PRIORITY = 3
+
+SWITCH_DEBOUNCE = 0.05  # seconds
+IR_DEBOUNCE = 0.2  # remotes repeat while the button is held
+EVENT_HISTORY_LENGTH = 100
+EVENT_IDLE_POLL = 0.05  # seconds, how often to check events waiting for idle
+EVENT_IDLE_TIMEOUT = 2  # seconds an event waits for idle before it's dropped
+EVENT_SLOW_LATENCY = 0.1  # seconds, longer than this is printed
+
+
+class InputEvent(object):
+    """Something to do, action(*args), because of an input."""
+    def __init__(self, name, action, args, priority, wait_for_idle):
+        self.name = name
+        self.action = action
+        self.args = args
+        self.priority = priority
+        self.wait_for_idle = wait_for_idle
+        self.posted_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def latency(self):
+        """Seconds from the input to its action starting."""
+        if self.started_at is None:
+            return None
+        return self.started_at - self.posted_at
+
+    @property
+    def execution_time(self):
+        if self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+
+class EventDispatcher(object):
+    """Handles posted events one at a time on its own thread.
+
+    :param is_idle: Returns True when events posted with wait_for_idle can
+        be handled.
+    """
+    def __init__(self, is_idle=None):
+        self.is_idle = is_idle
+        self.pending = []
+        self.sequence = 0
+        self.last_input = {}  # source -> time of the last accepted input
+        self.debounced = 0
+        self.expired = 0  # dropped, the camera was busy for too long
+        self.history = collections.deque(maxlen=EVENT_HISTORY_LENGTH)
+        self.condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        with self.condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._work)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Finishes the running event, drops the pending ones."""
+        with self.condition:
+            self._running = False
+            self.pending = []
+            self.condition.notify_all()
+        if self._thread is not None and \
+                self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def post(self, name, action, args=tuple(), priority=OPTION_PRIORITY,
+             source=None, debounce=0, wait_for_idle=False):
+        """Queues action(*args) and returns the event straight away, or
+        None if it was ignored because source had another input less than
+        debounce seconds ago.
+        """
+        now = time.monotonic()
+        event = InputEvent(name, action, args, priority, wait_for_idle)
+        with self.condition:
+            if source is not None:
+                last = self.last_input.get(source)
+                if last is not None and now - last < debounce:
+                    self.debounced += 1
+                    return None
+                self.last_input[source] = now
+            self.sequence += 1
+            self.pending.append((priority, self.sequence, event))
+            self.pending.sort(key=lambda p: p[:2])
+            self.condition.notify()
+        return event
+
+    def summary(self):
+        """Returns the number of events and their mean and max latency (in
+        seconds) by name.
+        """
+        with self.condition:
+            events = list(self.history)
+        names = {}
+        for event in events:
+            name = names.setdefault(
+                event.name, {'events': 0, 'mean': 0, 'max': 0})
+            name['events'] += 1
+            name['mean'] += event.latency
+            name['max'] = max(name['max'], event.latency)
+        for name in names.values():
+            name['mean'] /= name['events']
+        return names
+
+    def _next(self):
+        # called holding the condition
+        idle = None
+        now = time.monotonic()
+        expired = []
+        chosen = None
+        for pending in self.pending:
+            event = pending[2]
+            if event.wait_for_idle:
+                if idle is None:
+                    idle = self.is_idle is None or self.is_idle()
+                if not idle:
+                    if now - event.posted_at > EVENT_IDLE_TIMEOUT:
+                        expired.append(pending)
+                    continue
+            chosen = pending
+            break
+        for pending in expired:
+            self.pending.remove(pending)
+            self.expired += 1
+            print("Event {}: dropped, the camera was busy.".format(
+                pending[2].name))
+        if chosen is None:
+            return None
+        self.pending.remove(chosen)
+        return chosen[2]
+
+    def _work(self):
+        while True:
+            with self.condition:
+                event = None
+                while self._running:
+                    event = self._next()
+                    if event is not None:
+                        break
+                    # something is waiting for the camera to be idle
+                    timeout = EVENT_IDLE_POLL if self.pending else None
+                    self.condition.wait(timeout)
+                if not self._running:
+                    return
+            event.started_at = time.monotonic()
+            try:
+                event.action(*event.args)
+            except Exception as e:
+                print("ERROR (event {}):".format(event.name), e)
+            event.finished_at = time.monotonic()
+            if event.latency > EVENT_SLOW_LATENCY:
+                print("Event {}: waited {:.0f}ms, took {:.0f}ms.".format(
+                    event.name, event.latency * 1000,
+                    event.execution_time * 1000))
+            with self.condition:
+                self.history.append(event)
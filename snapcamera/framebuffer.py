@@ -0,0 +1,205 @@
+"""Shows pictures on the framebuffer from inside Snap Camera.
+
+The framebuffer device is memory mapped and pictures are converted to its
+pixel format once, then copied straight in. Converted frames are kept in a
+small LRU and the pictures either side of the one on screen are converted
+in the background, so stepping through pictures doesn't wait for a JPEG
+to be decoded.
+
+The framebuffer can be any file (set SNAP_CAMERA_FRAMEBUFFER), which is
+handy for trying the viewer on a machine without a screen.
+"""
+import os
+import mmap
+import fcntl
+import struct
+import threading
+import collections
+try:
+    import numpy
+    from PIL import Image
+except ImportError:
+    numpy = Image = None
+
+
+FRAMEBUFFER_DEVICE = os.environ.get('SNAP_CAMERA_FRAMEBUFFER', '/dev/fb0')
+FRAMEBUFFER_SIZE = (480, 320)  # for files which aren't a real framebuffer
+FRAMEBUFFER_BITS_PER_PIXEL = 16
+VIEWER_CACHE_FRAMES = 8  # converted frames kept in memory
+VIEWER_PREFETCH = 1  # pictures either side of the current one
+FBIOGET_VSCREENINFO = 0x4600
+# the start of struct fb_var_screeninfo: xres, yres, xres_virtual,
+# yres_virtual, xoffset, yoffset, bits_per_pixel (it is 160 bytes long)
+FB_VAR_SCREENINFO = struct.Struct('7I')
+FB_VAR_SCREENINFO_SIZE = 160
+
+
+def available():
+    """True if pictures can be shown in-process (PIL and numpy)."""
+    return Image is not None
+
+
+class FramebufferError(Exception):
+    pass
+
+
+class Framebuffer(object):
+    """A memory mapped framebuffer.
+
+    :param path: The framebuffer device (or a file standing in for one).
+    :param size: (width, height), the visible size for /dev/fbN.
+    :param bits_per_pixel: 16 (RGB565), 24 or 32 (BGRX), read from the
+        device for /dev/fbN.
+    """
+    def __init__(self, path=FRAMEBUFFER_DEVICE, size=None,
+                 bits_per_pixel=None):
+        self.path = path
+        try:
+            self.fd = os.open(path, os.O_RDWR | os.O_CREAT)
+        except OSError as e:
+            raise FramebufferError(
+                "can't open {}: {}".format(path, e)) from e
+        try:
+            self.size, self.bits_per_pixel, self.stride, y_offset = \
+                self._geometry(size, bits_per_pixel)
+            if self.bits_per_pixel not in (16, 24, 32):
+                raise FramebufferError("{} bits per pixel isn't supported"
+                                       .format(self.bits_per_pixel))
+            # the screen shows the rows from y_offset on (a double buffered
+            # framebuffer is twice as tall as the screen)
+            self.offset = y_offset * self.stride
+            length = self.offset + self.stride * self.size[1]
+            if not path.startswith('/dev/') and \
+                    os.fstat(self.fd).st_size < length:
+                os.ftruncate(self.fd, length)
+            self.map = mmap.mmap(self.fd, length)
+        except (OSError, ValueError, FramebufferError) as e:
+            os.close(self.fd)
+            raise FramebufferError(
+                "can't map {}: {}".format(path, e)) from e
+
+    def _geometry(self, size, bits_per_pixel):
+        """Returns (width, height), bits per pixel, the bytes in a row and
+        the first row on screen.
+        """
+        sysfs = os.path.join('/sys/class/graphics', os.path.basename(self.path))
+        if not os.path.isdir(sysfs):
+            size = size or FRAMEBUFFER_SIZE
+            bits_per_pixel = bits_per_pixel or FRAMEBUFFER_BITS_PER_PIXEL
+            stride = size[0] * bits_per_pixel // 8
+            return size, bits_per_pixel, stride, 0
+        # virtual_size in sysfs is the whole buffer, not what's on screen
+        screen_info = bytearray(FB_VAR_SCREENINFO_SIZE)
+        fcntl.ioctl(self.fd, FBIOGET_VSCREENINFO, screen_info)
+        xres, yres, _, _, _, y_offset, device_bits = \
+            FB_VAR_SCREENINFO.unpack_from(screen_info)
+        size = size or (xres, yres)
+        bits_per_pixel = bits_per_pixel or device_bits
+        with open(os.path.join(sysfs, 'stride')) as f:
+            stride = int(f.read())
+        return size, bits_per_pixel, stride, y_offset
+
+    def close(self):
+        self.map.close()
+        os.close(self.fd)
+
+    def frame(self, picture):
+        """Returns picture (a PIL image) scaled to fit the screen, centred
+        on black, as bytes ready for :meth:`show`.
+        """
+        picture = picture.convert('RGB')
+        picture.thumbnail(self.size)
+        screen = Image.new('RGB', self.size)
+        screen.paste(picture, ((self.size[0] - picture.width) // 2,
+                               (self.size[1] - picture.height) // 2))
+        if self.bits_per_pixel == 16:
+            rgb = numpy.asarray(screen, dtype=numpy.uint16)
+            pixels = ((rgb[:, :, 0] >> 3) << 11 |
+                      (rgb[:, :, 1] >> 2) << 5 |
+                      rgb[:, :, 2] >> 3).astype('<u2')
+            rows = pixels.view(numpy.uint8).reshape(self.size[1], -1)
+        else:
+            raw = 'BGRX' if self.bits_per_pixel == 32 else 'BGR'
+            rows = numpy.frombuffer(screen.tobytes('raw', raw),
+                                    dtype=numpy.uint8).reshape(
+                                        self.size[1], -1)
+        if rows.shape[1] < self.stride:
+            rows = numpy.pad(rows, ((0, 0), (0, self.stride - rows.shape[1])))
+        return rows.tobytes()
+
+    def show(self, frame):
+        self.map[self.offset:self.offset + len(frame)] = frame
+
+    def clear(self):
+        self.show(bytes(len(self.map) - self.offset))
+
+
+class FrameCache(object):
+    """Converted frames of the pictures in a directory, least recently used
+    first, made on a background thread when they're prefetched.
+
+    :param load: Returns a PIL image for a picture name.
+    """
+    def __init__(self, framebuffer, load, size=VIEWER_CACHE_FRAMES):
+        self.framebuffer = framebuffer
+        self.load = load
+        self.size = size
+        self.frames = collections.OrderedDict()
+        self.wanted = collections.deque()
+        self.condition = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._work)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def get(self, name):
+        """Returns the frame for name, converting it now if it isn't
+        cached.
+        """
+        with self.condition:
+            if name in self.frames:
+                self.frames.move_to_end(name)
+                return self.frames[name]
+        return self._convert(name)
+
+    def prefetch(self, names):
+        """Converts names in the background (replacing earlier requests)."""
+        with self.condition:
+            self.wanted.clear()
+            self.wanted.extend(n for n in names if n not in self.frames)
+            self.condition.notify()
+
+    def forget(self, name):
+        with self.condition:
+            self.frames.pop(name, None)
+
+    def stop(self):
+        with self.condition:
+            self._running = False
+            self.condition.notify()
+        self._thread.join()
+
+    def _convert(self, name):
+        with self.load(name) as picture:
+            frame = self.framebuffer.frame(picture)
+        with self.condition:
+            self.frames[name] = frame
+            self.frames.move_to_end(name)
+            while len(self.frames) > self.size:
+                self.frames.popitem(last=False)
+        return frame
+
+    def _work(self):
+        while True:
+            with self.condition:
+                while self._running and len(self.wanted) == 0:
+                    self.condition.wait()
+                if not self._running:
+                    return
+                name = self.wanted.popleft()
+                if name in self.frames:
+                    continue
+            try:
+                self._convert(name)
+            except (OSError, ValueError) as e:
+                print("ERROR (viewer prefetch {}):".format(name), e)
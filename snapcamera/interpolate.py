@@ -0,0 +1,76 @@
+"""In-between frames for smoother timelapse videos.
+
+Replaces ImageMagick's ``convert -morph``: between each pair of frames we
+add `count` frames that fade from one to the next. The blend is done with
+numpy in fixed point (weights out of 256, 16 bit integers) rather than
+floats, and frames are streamed: only the two frames being faded between
+are held, however long the timelapse is.
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+INTERPOLATE_FRAMES = 10  # in-between frames, like convert -morph 10
+WEIGHT_BITS = 8  # weights are fixed point, out of 1 << WEIGHT_BITS
+WEIGHT_ONE = 1 << WEIGHT_BITS
+
+
+def available():
+    """True if frames can be interpolated (numpy is installed)."""
+    return numpy is not None
+
+
+def crossfade_weights(count):
+    """Returns the weight of the next frame in each of count in-between
+    frames (out of WEIGHT_ONE).
+    """
+    return [round((i + 1) * WEIGHT_ONE / (count + 1)) for i in range(count)]
+
+
+class Crossfader(object):
+    """Blends two frames of the same size (raw bytes, any number of
+    channels) in fixed point, reusing its buffers for every blend.
+    """
+    def __init__(self, frame_bytes):
+        self.previous = numpy.empty(frame_bytes, dtype=numpy.uint16)
+        self.next = numpy.empty(frame_bytes, dtype=numpy.uint16)
+        self.blend_buffer = numpy.empty(frame_bytes, dtype=numpy.uint16)
+        self.scratch = numpy.empty(frame_bytes, dtype=numpy.uint16)
+        self.output = numpy.empty(frame_bytes, dtype=numpy.uint8)
+
+    def push(self, frame):
+        """Makes the next frame the previous one and frame the next."""
+        self.previous, self.next = self.next, self.previous
+        self.next[:] = numpy.frombuffer(frame, dtype=numpy.uint8)
+
+    def blend(self, weight):
+        """Returns (previous * (WEIGHT_ONE - weight) + next * weight) /
+        WEIGHT_ONE, rounded, as bytes. 255 * WEIGHT_ONE fits in 16 bits.
+        """
+        blend, scratch = self.blend_buffer, self.scratch
+        numpy.multiply(self.previous, WEIGHT_ONE - weight, out=blend)
+        numpy.multiply(self.next, weight, out=scratch)
+        blend += scratch
+        blend += WEIGHT_ONE // 2
+        blend >>= WEIGHT_BITS
+        numpy.copyto(self.output, blend, casting='unsafe')
+        return self.output.tobytes()
+
+
+def crossfade(frames, count=INTERPOLATE_FRAMES):
+    """Yields each of frames (raw bytes, all the same size) with count
+    crossfaded frames in between each pair.
+    """
+    weights = crossfade_weights(count)
+    fader = None
+    for frame in frames:
+        if count > 0 and fader is None:
+            fader = Crossfader(len(frame))
+            fader.push(frame)
+        elif count > 0:
+            fader.push(frame)
+            for weight in weights:
+                yield fader.blend(weight)
+        yield frame
@@ -1,4 +1,5 @@
 import pifacecad
+from snapcamera.events import SHUTTER_PRIORITY, IR_DEBOUNCE
 from snapcamera.mode_option import ModeOption
 
 
@@ -25,4 +26,7 @@ class IRModeOption(ModeOption):
             self.ir_listener.deactivate()
 
     def take_picture(self, event):
-        self.camera.take_picture()
+        self.camera.events.post('ir_picture', self.camera.capture_queue.put,
+                                (self.camera.take_picture,),
+                                priority=SHUTTER_PRIORITY, source='ir',
+                                debounce=IR_DEBOUNCE)
@@ -0,0 +1,148 @@
+"""An in-memory, sorted index of the files in a media directory.
+
+Listing and sorting IMAGE_DIR on every button press gets slow once the card
+holds tens of thousands of timelapse frames. Instead we list the directory
+once, tell the index about every file the camera writes and only list the
+directory again if its mtime shows that something else has changed it (for
+example raspistill writing timelapse frames, or someone deleting files over
+ssh).
+"""
+import re
+import os
+import bisect
+import threading
+
+
+class MediaIndex(object):
+    """The files in a media directory, sorted by name.
+
+    :param directory: The directory to index.
+    :param prefix: Files whose names contain this are numbered media files
+        (for example "image").
+    :param number_of: Function returning the number of a media file name
+        (for example :func:`image_index`).
+    """
+    def __init__(self, directory, prefix, number_of):
+        self.directory = directory
+        self.prefix = prefix
+        self.number_of = number_of
+        self.lock = threading.RLock()
+        self.files = []
+        self.last_numbered = None
+        self.mtime = None
+        self.refresh()
+
+    def __len__(self):
+        with self.lock:
+            self.refresh()
+            return len(self.files)
+
+    def __getitem__(self, index):
+        with self.lock:
+            self.refresh()
+            return self.files[index]
+
+    def __iter__(self):
+        with self.lock:
+            self.refresh()
+            return iter(list(self.files))
+
+    def index(self, filename):
+        with self.lock:
+            self.refresh()
+            i = bisect.bisect_left(self.files, filename)
+            if i == len(self.files) or self.files[i] != filename:
+                raise ValueError("{} is not in the index".format(filename))
+            return i
+
+    @property
+    def last(self):
+        """The last file name (sorted) or None if there are no files."""
+        with self.lock:
+            self.refresh()
+            return self.files[-1] if len(self.files) > 0 else None
+
+    @property
+    def last_number(self):
+        """The number of the last numbered media file (0 if there are none).
+        """
+        with self.lock:
+            self.refresh()
+            if self.last_numbered is None:
+                return 0
+            return self.number_of(self.last_numbered)
+
+    def refresh(self, force=False):
+        """Lists the directory again if it has changed since we last looked
+        at it (costs one stat when nothing has changed).
+        """
+        with self.lock:
+            mtime = self._directory_mtime()
+            if not force and mtime == self.mtime:
+                return
+            self.files = sorted(
+                f for f in os.listdir(self.directory) if is_media_file(f))
+            self.last_numbered = None
+            for filename in reversed(self.files):
+                if self.prefix in filename:
+                    self.last_numbered = filename
+                    break
+            self.mtime = mtime
+
+    def add(self, filename):
+        """Tells the index that we have written filename (a name, not a path)
+        to the directory. Callers look up the next file number just before
+        writing, which refreshes the index, so taking the new mtime as our
+        own is safe.
+        """
+        with self.lock:
+            i = bisect.bisect_left(self.files, filename)
+            if i == len(self.files) or self.files[i] != filename:
+                self.files.insert(i, filename)  # usually appends
+            if self.prefix in filename and \
+                    (self.last_numbered is None or
+                     filename > self.last_numbered):
+                self.last_numbered = filename
+            self.mtime = self._directory_mtime()
+
+    def remove(self, filename):
+        """Tells the index that we have removed filename from the directory.
+        """
+        with self.lock:
+            i = bisect.bisect_left(self.files, filename)
+            if i < len(self.files) and self.files[i] == filename:
+                del self.files[i]
+            if filename == self.last_numbered:
+                self.last_numbered = None
+                for other in reversed(self.files[:i]):
+                    if self.prefix in other:
+                        self.last_numbered = other
+                        break
+            self.mtime = self._directory_mtime()
+
+    def _directory_mtime(self):
+        try:
+            return os.stat(self.directory).st_mtime_ns
+        except OSError:
+            return None
+
+
+def is_media_file(filename):
+    """Hidden files and raspistill's half written files ("name~") are not
+    media.
+    """
+    return not filename.startswith(".") and not filename.endswith("~")
+
+
+def image_index(image_string):
+    """Returns the index of the image given. For example: image0010.jpg -> 10
+    """
+    #return int(image_string.replace("image", "").replace(".jpg", ""))
+    return int(re.sub(r'image([0-9]{4}).*', r'\1', image_string))
+
+
+def video_index(video_string):
+    """Returns the index of the video given. For example: video0010.jpg -> 10
+    """
+    #return int(video_string.replace("video", "").replace(".jpg", ""))
+    return int(re.sub(r'video([0-9]{4}).*', r'\1', video_string))
@@ -6,8 +6,7 @@ import struct
 import socket
 import threading
 import subprocess
-import pifacecad
-from pifacecad.lcd import LCD_WIDTH
+from snapcamera.display import LCD_WIDTH
 
 
 # IMAGE_DIR = "{}/../{}".format(
@@ -17,12 +16,50 @@ from pifacecad.lcd import LCD_WIDTH
 IMAGE_DIR = "/home/pi/snap-camera/images/"
 VIDEO_DIR = "/home/pi/snap-camera/videos/"
 OVERLAY_DIR = "/home/pi/snap-camera/overlays/"
+CAPTURE_TMP_DIR = "/home/pi/snap-camera/.capture/"
+THUMBNAIL_DIR = "/home/pi/snap-camera/.thumbnails/"
+TIMELAPSE_DIR = "/home/pi/snap-camera/.timelapse/"
+# an unfinished timelapse (see snapcamera.timelapse)
+TIMELAPSE_STATE_FILE = TIMELAPSE_DIR + "run.json"
+
+# raspistill -ifx
+CAMERA_EFFECTS = (
+    'none',
+    'negative',
+    'solarise',
+    'posterize',
+    'whiteboard',
+    'blackboard',
+    'sketch',
+    'denoise',
+    'emboss',
+    'oilpaint',
+    'hatch',
+    'gpen',
+    'pastel',
+    'watercolour',
+    'film',
+    'blur',
+    'saturation',
+    'colourswap',
+    'washedout',
+    'posterise',
+    'colourpoint',
+    'colourbalance',
+    'cartoon',
+)
+
+# see snapcamera.stack
+STACK_MODES = ('mean', 'max', 'median')
 
 
 class ModeOption(object):
     """A mode option. Subclass this and change the methods to define what
     happens when the user presses PiFaceCAD buttons.
     """
+    # keep raspistill running while in this mode (see snapcamera.capture)
+    keep_camera_warm = True
+
     def __init__(self, camera):
         self.camera = camera
 
@@ -37,8 +74,8 @@ class ModeOption(object):
     def update_display_option_text(self, option_text=""):
         """This is what prints the option text."""
         width = 8
-        self.camera.cad.lcd.set_cursor(LCD_WIDTH-width, 1)
-        self.camera.cad.lcd.write(option_text.rjust(width)[:width])
+        self.camera.display.write(LCD_WIDTH-width, 1,
+                                  option_text.rjust(width)[:width])
 
     def update_camera(self):
         """Updates the camera state with the state of this mode."""
@@ -104,6 +141,8 @@ class CameraModeOption(ModeOption):
 
 
 class VideoModeOption(ModeOption):
+    keep_camera_warm = False
+
     def __init__(self, *args):
         super().__init__(*args)
         self.length = 5000
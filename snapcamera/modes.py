@@ -0,0 +1,171 @@
+"""The modes the camera can be in.
+
+Modes are registered by name with the import path of their ModeOption
+class ("package.module:Class"). A mode's module isn't imported, and its
+ModeOption isn't made, until the camera first enters it, so a camera that
+only ever runs in one mode doesn't pay for the others (the viewer and
+overlay modes import numpy, network mode reads its settings etc.).
+
+Other packages can add modes with :func:`register_mode` or with an entry
+point in the ``snapcamera.modes`` group, for example in their setup.py::
+
+    entry_points={
+        'snapcamera.modes': ['astro = snapastro.mode:AstroModeOption'],
+    }
+
+Entry points are only looked at when they could matter: when a mode that
+isn't registered is asked for, or when the camera steps past the last of the
+registered modes. Scanning the installed packages takes a while on a Pi and
+most cameras never get that far.
+
+Modes are visited in the order they were registered, built in modes first.
+"""
+import importlib
+import threading
+import collections
+try:
+    from importlib import metadata
+except ImportError:
+    metadata = None
+
+
+MODE_ENTRY_POINT_GROUP = 'snapcamera.modes'
+
+
+class ModeError(Exception):
+    pass
+
+
+ModeInfo = collections.namedtuple('ModeInfo', ['name', 'label', 'target'])
+
+_modes = collections.OrderedDict()  # name -> ModeInfo
+_entry_points_loaded = False
+
+
+def register_mode(name, target, label=None):
+    """Adds a mode (or replaces the one called name).
+
+    :param target: The ModeOption subclass, or its import path
+        ("package.module:Class") so that it is only imported when needed.
+    :param label: Shown on the LCD and in camera.current_mode['name']
+        (default: name).
+    """
+    _modes[name] = ModeInfo(name, label or name, target)
+
+
+def _load_entry_points():
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+    _entry_points_loaded = True
+    if metadata is None:
+        return
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, 'select'):
+        entry_points = entry_points.select(group=MODE_ENTRY_POINT_GROUP)
+    else:
+        entry_points = entry_points.get(MODE_ENTRY_POINT_GROUP, [])
+    for entry_point in entry_points:
+        if entry_point.name not in _modes:
+            register_mode(entry_point.name, entry_point.value)
+
+
+def names(entry_points=False):
+    """Returns the names of the modes, in order.
+
+    :param entry_points: Include the modes added by entry points (which
+        means scanning the installed packages for them).
+    """
+    if entry_points:
+        _load_entry_points()
+    return list(_modes)
+
+
+def mode_info(name):
+    if name not in _modes:
+        _load_entry_points()
+    try:
+        return _modes[name]
+    except KeyError:
+        raise ModeError("unknown mode: {}".format(name))
+
+
+def mode_class(name):
+    """Returns the ModeOption subclass for the mode called name, importing
+    it if it hasn't been already.
+    """
+    target = mode_info(name).target
+    if not isinstance(target, str):
+        return target
+    module_name, _, class_name = target.partition(':')
+    try:
+        return getattr(importlib.import_module(module_name), class_name)
+    except (ImportError, AttributeError) as e:
+        raise ModeError("can't load mode {} ({}): {}".format(
+            name, target, e)) from e
+
+
+class ModeList(object):
+    """The camera's modes, each one made the first time it is used.
+
+    Items are {'name': label, 'option': ModeOption}, as camera.modes has
+    always been.
+    """
+    def __init__(self, camera, mode_names=None):
+        self.camera = camera
+        # only the registered modes until we need the entry points
+        self.all_modes = mode_names is None
+        self.names = names() if mode_names is None else list(mode_names)
+        self.modes = {}  # name -> {'name': label, 'option': ModeOption}
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, i):
+        name = self.names[i]
+        with self.lock:
+            if name not in self.modes:
+                self.modes[name] = {'name': mode_info(name).label,
+                                    'option': mode_class(name)(self.camera)}
+            return self.modes[name]
+
+    def index(self, name):
+        with self.lock:
+            if name not in self.names:
+                self._add_entry_points()
+            try:
+                return self.names.index(name)
+            except ValueError:
+                raise ModeError("unknown mode: {}".format(name))
+
+    def step(self, index, step):
+        """Returns the index of the mode step modes on from index (back if
+        step is negative), wrapping around.
+        """
+        with self.lock:
+            if not 0 <= index + step < len(self.names):
+                self._add_entry_points()
+            return (index + step) % len(self.names)
+
+    def _add_entry_points(self):
+        if self.all_modes:
+            self.names.extend(name for name in names(entry_points=True)
+                              if name not in self.names)
+
+    @property
+    def loaded(self):
+        """The names of the modes that have been made so far."""
+        return [name for name in self.names if name in self.modes]
+
+
+# the built in modes
+register_mode('camera', 'snapcamera.mode_option:CameraModeOption')
+register_mode('effects', 'snapcamera.effects:EffectsModeOption')
+register_mode('overlay', 'snapcamera.effects:OverlayModeOption')
+register_mode('timelapse', 'snapcamera.timelapse:TimelapseModeOption')
+register_mode('burst', 'snapcamera.burst:BurstModeOption')
+register_mode('video', 'snapcamera.mode_option:VideoModeOption')
+register_mode('ir', 'snapcamera.ir:IRModeOption', label='IR')
+register_mode('network', 'snapcamera.network:NetworkTriggerModeOption')
+register_mode('viewer', 'snapcamera.viewer:ViewerModeOption')
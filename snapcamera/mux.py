@@ -0,0 +1,56 @@
+"""Muxes H.264 into an mp4 file while it is being recorded.
+
+The camera's H.264 goes straight into the muxer's stdin (a pipe) so the
+mp4 is written in one pass: no intermediate .h264 file is written to the
+card, read back and deleted, and the video is available as soon as
+recording stops.
+"""
+import time
+import shutil
+import subprocess
+from snapcamera import runner
+
+
+VIDEO_MUXER = 'ffmpeg'
+
+
+def muxer_available():
+    return shutil.which(VIDEO_MUXER) is not None
+
+
+class StreamingMuxer(object):
+    """Runs the muxer with its stdin open. Write H.264 (Annex B) to
+    :attr:`input` (or pass it as another program's stdout) and call
+    :meth:`close` when done.
+    """
+    def __init__(self, mp4filename, framerate):
+        self.mp4filename = mp4filename
+        self.command = [VIDEO_MUXER, '-loglevel', 'error', '-y',
+                        '-f', 'h264', '-framerate', str(framerate),
+                        '-i', '-',
+                        '-c', 'copy', mp4filename]
+        self.started, self.start = time.time(), time.monotonic()
+        self.process = subprocess.Popen(self.command,
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.DEVNULL,
+                                        stderr=subprocess.PIPE)
+
+    @property
+    def input(self):
+        return self.process.stdin
+
+    def close(self):
+        """Finishes the mp4 file. Returns the muxer's exit status."""
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass  # the muxer has already gone
+        stderr = self.process.stderr.read()
+        self.process.wait()
+        runner.record(self.command, self.started,
+                      time.monotonic() - self.start, self.process.returncode,
+                      stderr)
+        if self.process.returncode != 0:
+            print("ERROR ({}):".format(VIDEO_MUXER),
+                  stderr.decode('utf-8', 'replace').strip())
+        return self.process.returncode
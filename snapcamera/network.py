@@ -2,10 +2,15 @@ import threading
 import socket
 import struct
 import socketserver
-import subprocess
 import time
 import sched
+import shlex
 import os
+from snapcamera import runner
+from snapcamera.events import (
+    SHUTTER_PRIORITY,
+    COMMAND_PRIORITY,
+)
 from snapcamera.mode_option import (
     IMAGE_DIR,
     VIDEO_DIR,
@@ -17,6 +22,7 @@ MCAST_GRP = '224.1.1.1'
 MCAST_PORT = 5007
 SEND_LAST_IMAGE_TO = "send last image to "
 SEND_LAST_VIDEO_TO = "send last video to "
+SEND_LAST_PREVIEW_TO = "send last preview to "
 TAKE_IMAGE_AT = "take image at "
 RECORD_VIDEO_FOR = "record video for "  # <length> at <time>
 HALT_AT = "halt at "
@@ -25,11 +31,14 @@ BACKLIGHT = "backlight "  # on/off
 RUN_COMMNAD = "run command "
 USING_CAMERAS = " using cameras "
 STREAM = 'stream to '
+APPLY_OVERLAY = "apply overlay "  # <overlay> to <first>-<last>
+SHOW_IMAGE = "show image "  # <number>, in viewer mode
 
 CAM_NUM_FILE = "camera-number.txt"
 
 TRY_AGAIN_ATTEMPTS = 6
 TRY_AGAIN_TIME = 10  # seconds
+HALT_DISPLAY_TIMEOUT = 1  # seconds to wait for the message to be shown
 
 
 class ThreadedMulticastServer(
@@ -188,13 +197,19 @@ class NetworkCommandHandler(socketserver.BaseRequestHandler):
 
         elif SEND_LAST_IMAGE_TO in data:
             ip, port = data[len(SEND_LAST_IMAGE_TO):].split(":")
-            last_image = sorted(os.listdir(IMAGE_DIR))[-1]
-            self.send_image_to(ip, int(port), last_image)
+            self.post('send_image', self.send_last_media_to,
+                      (ip, int(port), self.camera.images, self.send_image_to))
+
+        elif SEND_LAST_PREVIEW_TO in data:
+            ip, port = data[len(SEND_LAST_PREVIEW_TO):].split(":")
+            self.post('send_preview', self.send_last_media_to,
+                      (ip, int(port), self.camera.images,
+                       self.send_preview_to))
 
         elif SEND_LAST_VIDEO_TO in data:
             ip, port = data[len(SEND_LAST_VIDEO_TO):].split(":")
-            last_video = sorted(os.listdir(VIDEO_DIR))[-1]
-            self.send_video_to(ip, int(port), last_video)
+            self.post('send_video', self.send_last_media_to,
+                      (ip, int(port), self.camera.videos, self.send_video_to))
 
         elif HALT_AT in data:
             halt_time = float(data[len(HALT_AT):])
@@ -206,32 +221,80 @@ class NetworkCommandHandler(socketserver.BaseRequestHandler):
 
         elif BACKLIGHT in data:
             backlight_state = data[len(BACKLIGHT):]
-            self.set_backlight(backlight_state == "on")
+            self.post('backlight', self.set_backlight,
+                      (backlight_state == "on",))
 
         elif RUN_COMMNAD in data:
             command = data[len(RUN_COMMNAD):]
-            self.run_command(command)
+            # it could take any amount of time, keep it off the dispatcher
+            self.post('run_command', self.camera.postprocess_queue.put,
+                      (self.run_command, (command,), 'run_command'))
 
         elif STREAM in data:
             data = data[len(STREAM):]
             dest_ip, port_offset = data.split(" from port ")
             self.stream(dest_ip, int(port_offset))
 
+        elif SHOW_IMAGE in data:
+            self.show_image(int(data[len(SHOW_IMAGE):]))
+
+        elif APPLY_OVERLAY in data:
+            overlay, image_range = data[len(APPLY_OVERLAY):].split(" to ")
+            # a whole batch, so run it on the post-processing queue
+            self.post('apply_overlay', self.camera.postprocess_queue.put,
+                      (self.apply_overlay, (overlay, image_range),
+                       'apply_overlay'))
+
+    def post(self, name, action, args=tuple()):
+        """Runs action(*args) on the camera's event dispatcher, in turn with
+        the switches and IR.
+        """
+        self.camera.events.post('network_' + name, action, args,
+                                priority=COMMAND_PRIORITY)
+
     def take_picture_at(self, picture_time):
         s = sched.scheduler(time.time, time.sleep)
-        s.enterabs(picture_time, 1, self.camera.take_picture, tuple())
+        s.enterabs(picture_time, 1, self.camera.events.post,
+                   ('network_picture', self.camera.capture_queue.put,
+                    (self.camera.take_picture,), SHUTTER_PRIORITY))
         s.run()
 
     def record_video_at(self, video_length, video_time):
         s = sched.scheduler(time.time, time.sleep)
-        s.enterabs(video_time, 1, self.camera.record_video, (video_length,))
+        s.enterabs(video_time, 1, self.camera.events.post,
+                   ('network_video', self.camera.capture_queue.put,
+                    (self.camera.record_video, (video_length,), 'video'),
+                    SHUTTER_PRIORITY))
         s.run()
 
+    def send_last_media_to(self, ip, port, media, send):
+        """Picks the last file in media (a MediaIndex) and sends it with
+        send(ip, port, name) on the post-processing queue, so that the
+        transfer doesn't hold up other inputs.
+        """
+        last = media.last
+        if last is not None:
+            self.camera.postprocess_queue.put(send, (ip, port, last),
+                                              name='send')
+
     def send_image_to(self, ip, port, image_name):
         print("sending image to {}:{}".format(ip, port))
         image_number = self.camera.last_image_number
         self.send_media_to(ip, port, image_name, image_number, IMAGE_DIR)
 
+    def send_preview_to(self, ip, port, image_name):
+        """Sends the preview sized copy of the image (or the image itself if
+        there isn't one).
+        """
+        print("sending preview to {}:{}".format(ip, port))
+        image_number = self.camera.last_image_number
+        preview = self.camera.thumbnails.path(image_name, 'preview')
+        if preview is None:
+            self.send_media_to(ip, port, image_name, image_number, IMAGE_DIR)
+        else:
+            self.send_media_to(ip, port, os.path.basename(preview),
+                               image_number, os.path.dirname(preview) + "/")
+
     def send_video_to(self, ip, port, video_name):
         print("sending video to {}:{}".format(ip, port))
         video_number = self.camera.last_video_number
@@ -251,42 +314,66 @@ class NetworkCommandHandler(socketserver.BaseRequestHandler):
 
     def halt_at(self, halt_time):
         s = sched.scheduler(time.time, time.sleep)
-        s.enterabs(halt_time, 1, self.halt, tuple())
+        s.enterabs(halt_time, 1, self.post, ('halt', self.halt))
         s.run()
 
     def reboot_at(self, reboot_time):
         s = sched.scheduler(time.time, time.sleep)
-        s.enterabs(reboot_time, 1, self.reboot, tuple())
+        s.enterabs(reboot_time, 1, self.post, ('reboot', self.reboot))
         s.run()
 
     def halt(self):
-        self.camera.cad.lcd.clear()
-        self.camera.cad.lcd.write("Going down for\nsystem halt.")
-        subprocess.call(['sudo', 'halt'])
+        self.camera.display.clear()
+        self.camera.display.write(0, 0, "Going down for")
+        self.camera.display.write(0, 1, "system halt.")
+        self.camera.display.join(HALT_DISPLAY_TIMEOUT)
+        runner.call(['sudo', 'halt'])
 
     def reboot(self):
-        self.camera.cad.lcd.clear()
-        self.camera.cad.lcd.write("The system will\nreboot.")
-        subprocess.call(['sudo', 'reboot'])
+        self.camera.display.clear()
+        self.camera.display.write(0, 0, "The system will")
+        self.camera.display.write(0, 1, "reboot.")
+        self.camera.display.join(HALT_DISPLAY_TIMEOUT)
+        runner.call(['sudo', 'reboot'])
 
     def set_backlight(self, backlight_state):
         if backlight_state:
-            self.camera.cad.lcd.backlight_on()
+            self.camera.display.command('backlight_on')
         else:
-            self.camera.cad.lcd.backlight_off()
+            self.camera.display.command('backlight_off')
 
     def run_command(self, command):
-        s = sched.scheduler(time.time, time.sleep)
-        s.enterabs(start_time, 1, subprocess.call, (command.split(" ")))
-        s.run()
+        """Runs on the post-processing queue."""
+        try:
+            argv = shlex.split(command)
+        except ValueError as e:
+            print("ERROR (run command):", e)
+            return
+        if argv:
+            runner.call(argv)
 
     def stream(self, dest_ip, port_offset):
         port = port_offset + self.camera.current_mode['option'].number
-        steam_cmd = "raspivid -fps 20 --width 480 --height 320 -t 999999 "\
-                    "-o - | nc {dest_ip} {port}".format(
-                        dest_ip=dest_ip,
-                        port=port)
-        subprocess.call([steam_cmd], shell=True)
+        # the camera is only used from the capture queue
+        self.post('stream', self.camera.capture_queue.put,
+                  (self.camera.stream, (dest_ip, port), 'stream'))
+
+    def show_image(self, number):
+        def show():
+            if self.camera.current_mode['name'] == 'viewer':
+                self.camera.current_mode['option'].jump_to_image(number)
+        self.post('show_image', show)
+
+    def apply_overlay(self, overlay, image_range):
+        """Runs on the post-processing queue."""
+        # imported here so that network mode doesn't load numpy until it
+        # is needed
+        from snapcamera import batch
+        first, last = batch.parse_range(image_range)
+        self.camera.print_status_busy()
+        result = batch.apply_overlay(overlay, first, last)
+        self.camera.images.refresh(force=True)
+        self.camera.capture_finished(1 if result.failed > 0 else 0)
 
 
 def get_my_ip():
@@ -294,4 +381,4 @@ def get_my_ip():
 
 
 def run_cmd(cmd):
-    return subprocess.check_output(cmd, shell=True).decode('utf-8')
+    return runner.check_output(cmd.split()).decode('utf-8')
@@ -0,0 +1,236 @@
+"""Composites overlays onto pictures in-process.
+
+Each overlay PNG is decoded once and kept with its alpha premultiplied, so
+putting it on a picture is one vectorised blend over the overlay's
+rectangle::
+
+    out = overlay * alpha + picture * (1 - alpha)
+
+Only that rectangle of the picture is touched before it is encoded again.
+If PIL or numpy aren't installed we fall back to ImageMagick's composite.
+
+:class:`OverlayCatalog` keeps the list of overlays (with their sizes and a
+small decoded preview) so that cycling through them doesn't touch the
+card.
+"""
+import os
+import time
+import threading
+import collections
+from snapcamera import runner
+from snapcamera.media_index import is_media_file
+from snapcamera.mode_option import OVERLAY_DIR
+try:
+    import numpy
+    from PIL import Image
+except ImportError:
+    numpy = Image = None
+
+
+OVERLAY_POSITION = (500, 500)  # top left corner of the overlay (x, y)
+OVERLAY_QUALITY = 90  # JPEG quality of pictures with an overlay
+OVERLAY_SUBSAMPLING = '4:2:0'  # chroma subsampling ('4:4:4' is sharper)
+OVERLAY_CACHE_SIZE = 4  # decoded overlays kept in memory
+OVERLAY_PREVIEW_SIZE = (160, 120)  # largest preview kept in the catalog
+
+
+def overlay_image_name(image_name, overlay):
+    """The name of image_name with overlay on it. For example:
+    image0010.jpg, frame.png -> image0010-frame.jpg
+    """
+    return "{}-{}.jpg".format(image_name.replace(".jpg", ""),
+                              overlay.replace(".png", ""))
+
+
+def available():
+    """True if overlays are composited in-process."""
+    return Image is not None
+
+
+class DecodedOverlay(object):
+    """An overlay ready to blend: colour premultiplied by alpha and
+    255 - alpha, both as uint16 arrays.
+    """
+    def __init__(self, filename):
+        self.mtime = os.stat(filename).st_mtime_ns
+        with Image.open(filename) as overlay:
+            rgba = numpy.asarray(overlay.convert('RGBA'), dtype=numpy.uint16)
+        alpha = rgba[:, :, 3:]
+        self.premultiplied = rgba[:, :, :3] * alpha
+        self.inverse_alpha = 255 - alpha
+        self.size = (rgba.shape[1], rgba.shape[0])
+
+    def blend(self, region):
+        """Returns the overlay (or the top left part of it that fits)
+        blended onto region, a uint8 RGB array.
+        """
+        height, width = region.shape[:2]
+        blended = (self.premultiplied[:height, :width] +
+                   region * self.inverse_alpha[:height, :width] +
+                   127) // 255
+        return blended.astype(numpy.uint8)
+
+
+class Compositor(object):
+    """Puts overlays on pictures.
+
+    :param position: Where the top left corner of the overlay goes.
+    :param quality: JPEG quality of the output.
+    :param subsampling: JPEG chroma subsampling of the output.
+    :param cache_size: How many decoded overlays to keep.
+    """
+    def __init__(self, position=OVERLAY_POSITION, quality=OVERLAY_QUALITY,
+                 subsampling=OVERLAY_SUBSAMPLING,
+                 cache_size=OVERLAY_CACHE_SIZE):
+        self.position = position
+        self.quality = quality
+        self.subsampling = subsampling
+        self.cache_size = cache_size
+        self.cache = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def overlay(self, filename):
+        """Returns the decoded overlay, decoding it if it isn't cached or
+        has changed on disk.
+        """
+        mtime = os.stat(filename).st_mtime_ns
+        with self.lock:
+            decoded = self.cache.get(filename)
+            if decoded is not None and decoded.mtime == mtime:
+                self.cache.move_to_end(filename)
+                return decoded
+        decoded = DecodedOverlay(filename)
+        with self.lock:
+            self.cache[filename] = decoded
+            self.cache.move_to_end(filename)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return decoded
+
+    def composite(self, overlay_filename, image_filename, output_filename):
+        """Writes image with the overlay on it to output. Returns 0 on
+        success, like :func:`runner.call`.
+        """
+        if not available():
+            return self.composite_command(overlay_filename, image_filename,
+                                          output_filename)
+        started, start = time.time(), time.monotonic()
+        try:
+            overlay = self.overlay(overlay_filename)
+            with Image.open(image_filename) as image:
+                image.load()
+                exif = image.info.get('exif')
+                if image.mode != 'RGB':
+                    image = image.convert('RGB')
+                left, top = self.position
+                right = min(left + overlay.size[0], image.width)
+                bottom = min(top + overlay.size[1], image.height)
+                if right > left and bottom > top:
+                    box = (left, top, right, bottom)
+                    region = numpy.asarray(image.crop(box))
+                    image.paste(Image.fromarray(overlay.blend(region)), box)
+                options = {'quality': self.quality,
+                           'subsampling': self.subsampling}
+                if exif:
+                    options['exif'] = exif
+                image.save(output_filename, 'JPEG', **options)
+        except (OSError, ValueError) as e:
+            runner.record(['overlay', overlay_filename], started,
+                          time.monotonic() - start, 1, str(e).encode('utf-8'))
+            print("ERROR (overlay):", e)
+            return 1
+        runner.record(['overlay', overlay_filename], started,
+                      time.monotonic() - start, 0)
+        return 0
+
+    def composite_command(self, overlay_filename, image_filename,
+                          output_filename):
+        return runner.call(['composite',
+                            '-geometry', '+{}+{}'.format(*self.position),
+                            '-quality', str(self.quality),
+                            '-sampling-factor', self.subsampling,
+                            overlay_filename,
+                            image_filename,
+                            output_filename])
+
+
+class OverlayInfo(object):
+    """What the catalog knows about one overlay. size and preview (a small
+    RGBA PIL image) are None without PIL or if the file can't be read.
+    """
+    def __init__(self, directory, name, preview_size=OVERLAY_PREVIEW_SIZE):
+        self.name = name
+        filename = os.path.join(directory, name)
+        self.mtime = os.stat(filename).st_mtime_ns
+        self.size = self.preview = None
+        if Image is None:
+            return
+        try:
+            with Image.open(filename) as overlay:
+                self.size = overlay.size
+                preview = overlay.convert('RGBA')
+                preview.thumbnail(preview_size)
+                self.preview = preview
+        except (OSError, ValueError) as e:
+            print("ERROR (overlay {}):".format(name), e)
+
+
+class OverlayCatalog(object):
+    """The overlays in a directory, sorted by name.
+
+    Nothing touches the directory until :meth:`refresh` is called, which
+    costs one stat when nothing has changed. Overlays whose mtime hasn't
+    changed aren't read again.
+    """
+    def __init__(self, directory=OVERLAY_DIR,
+                 preview_size=OVERLAY_PREVIEW_SIZE):
+        self.directory = directory
+        self.preview_size = preview_size
+        self.lock = threading.Lock()
+        self.overlays = []
+        self.names = []
+        self.mtime = None
+        self.refresh()
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, index):
+        return self.overlays[index]
+
+    def index(self, name):
+        return self.names.index(name)
+
+    def refresh(self, force=False):
+        """Reads the directory again if it has changed. Returns True if the
+        catalog changed.
+        """
+        with self.lock:
+            try:
+                mtime = os.stat(self.directory).st_mtime_ns
+            except OSError:
+                mtime = None
+            if not force and mtime == self.mtime:
+                return False
+            known = {info.name: info for info in self.overlays}
+            overlays = []
+            changed = False
+            for name in sorted(os.listdir(self.directory)):
+                if not is_media_file(name):
+                    continue
+                try:
+                    file_mtime = os.stat(
+                        os.path.join(self.directory, name)).st_mtime_ns
+                    info = known.get(name)
+                    if info is None or info.mtime != file_mtime:
+                        info = OverlayInfo(self.directory, name,
+                                           self.preview_size)
+                        changed = True
+                except OSError:
+                    continue  # removed while we were looking
+                overlays.append(info)
+            changed = changed or len(overlays) != len(self.overlays)
+            self.overlays = overlays
+            self.names = [info.name for info in overlays]
+            self.mtime = mtime
+            return changed
@@ -0,0 +1,164 @@
+"""Converts recorded videos (h264 to mp4) in the background so that the
+camera can record again straight away.
+
+Jobs are saved to a state file whenever they change so that conversions
+which were interrupted (power cut, reboot) are picked up again the next
+time the camera starts.
+"""
+import os
+import json
+import threading
+import collections
+from snapcamera.mode_option import VIDEO_DIR
+
+
+VIDEO_JOBS_FILE = VIDEO_DIR + ".jobs.json"
+VIDEO_CONVERSION_WORKERS = 1  # MP4Box competes with the camera for CPU
+VIDEO_MAX_PENDING = 4  # recording waits if there are more than this
+
+
+class VideoJob(object):
+    """Convert h264filename to mp4 (and remove the h264 file).
+
+    :param length: Milliseconds, for the storage statistics.
+    :param effect: The effect the video was recorded with, also for the
+        storage statistics.
+    """
+    def __init__(self, h264filename, length=None, effect=None):
+        self.h264filename = h264filename
+        self.mp4filename = h264filename.replace("h264", "mp4")
+        self.length = length
+        self.effect = effect
+        self.status = None
+
+    def to_dict(self):
+        return {'h264filename': self.h264filename, 'length': self.length,
+                'effect': self.effect}
+
+    @classmethod
+    def from_dict(cls, job_dict):
+        return cls(job_dict['h264filename'], job_dict.get('length'),
+                   job_dict.get('effect'))
+
+
+class VideoJobQueue(object):
+    """Runs video conversion jobs on a pool of worker threads.
+
+    :param convert: Function taking a :class:`VideoJob` and returning 0 on
+        success (like :func:`subprocess.call`).
+    :param on_done: Called with the job once it has finished.
+    :param on_change: Called with no arguments whenever the number of
+        unfinished jobs changes.
+    """
+    def __init__(self, convert, on_done=None, on_change=None,
+                 workers=VIDEO_CONVERSION_WORKERS,
+                 max_pending=VIDEO_MAX_PENDING,
+                 state_file=VIDEO_JOBS_FILE):
+        self.convert = convert
+        self.on_done = on_done
+        self.on_change = on_change
+        self.workers = workers
+        self.max_pending = max_pending
+        self.state_file = state_file
+        self.pending = collections.deque()
+        self.running = []
+        self.failed = 0
+        self.condition = threading.Condition()
+        self._running = False
+        self._threads = []
+
+    @property
+    def is_busy(self):
+        return len(self.pending) + len(self.running) > 0
+
+    def start(self):
+        """Resumes any unfinished jobs and starts the workers."""
+        with self.condition:
+            if self._running:
+                return
+            self._running = True
+            # jobs submitted before start are in the state file already
+            submitted = set(job.h264filename for job in self.pending)
+            for job in self._load():
+                if job.h264filename not in submitted and \
+                        os.path.exists(job.h264filename):
+                    self.pending.append(job)
+            self._save()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        self._changed()
+
+    def stop(self):
+        """Stops the workers once their current job is finished. Pending
+        jobs stay in the state file and are resumed by the next start.
+        """
+        with self.condition:
+            self._running = False
+            self.condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def submit(self, h264filename, length=None, effect=None):
+        """Adds a conversion job. Blocks while there are already
+        max_pending jobs waiting.
+        """
+        with self.condition:
+            while len(self.pending) >= self.max_pending and self._running:
+                self.condition.wait()
+            self.pending.append(VideoJob(h264filename, length, effect))
+            self._save()
+            self.condition.notify_all()
+        self._changed()
+
+    def _work(self):
+        while True:
+            with self.condition:
+                while self._running and len(self.pending) == 0:
+                    self.condition.wait()
+                if not self._running:
+                    return
+                job = self.pending.popleft()
+                self.running.append(job)
+                # a slot is free for submit
+                self.condition.notify_all()
+            try:
+                job.status = self.convert(job)
+            except Exception as e:
+                print("ERROR (video conversion):", e)
+                job.status = 1
+            with self.condition:
+                self.running.remove(job)
+                if job.status != 0:
+                    self.failed += 1
+                self._save()
+            if self.on_done is not None:
+                self.on_done(job)
+            self._changed()
+
+    def _load(self):
+        try:
+            with open(self.state_file, 'r') as state_file:
+                return [VideoJob.from_dict(d) for d in json.load(state_file)]
+        except (IOError, ValueError, KeyError):
+            return []
+
+    def _save(self):
+        """Writes the unfinished jobs to the state file (call with the
+        condition held).
+        """
+        jobs = [job.to_dict() for job in self.running + list(self.pending)]
+        tmp_file = self.state_file + "~"
+        try:
+            with open(tmp_file, 'w') as state_file:
+                json.dump(jobs, state_file)
+            os.rename(tmp_file, self.state_file)
+        except IOError as e:
+            print("ERROR (video jobs):", e)
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change()
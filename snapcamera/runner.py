@@ -0,0 +1,159 @@
+"""Runs external programs without a shell and remembers how long they took.
+
+Every call is recorded (program, wall time, exit status, the end of stderr)
+in a ring buffer so we can see where capture time goes::
+
+    >>> from snapcamera import runner
+    >>> runner.call(['MP4Box', '-add', 'video0001.h264', 'video0001.mp4'])
+    0
+    >>> runner.summary()
+    {'MP4Box': {'calls': 1, 'failures': 0, 'seconds': 2.31}}
+
+File operations are done in-process (and recorded the same way) rather
+than by spawning rm.
+"""
+import os
+import time
+import threading
+import subprocess
+import collections
+
+
+RUN_HISTORY_LENGTH = 200
+STDERR_KEEP = 512  # bytes of stderr kept per call
+
+
+CommandRecord = collections.namedtuple(
+    'CommandRecord', ['argv', 'started', 'seconds', 'returncode', 'stderr'])
+
+_history = collections.deque(maxlen=RUN_HISTORY_LENGTH)
+_history_lock = threading.Lock()
+
+
+def record(argv, started, seconds, returncode, stderr=b''):
+    """Adds a call to the history. started is a time.time(), seconds is the
+    wall time the call took.
+    """
+    stderr = (stderr or b'')[-STDERR_KEEP:].decode('utf-8', 'replace')
+    with _history_lock:
+        _history.append(
+            CommandRecord(list(argv), started, seconds, returncode, stderr))
+
+
+def history(program=None):
+    """Returns the recorded calls (oldest first), optionally only those of
+    one program.
+    """
+    with _history_lock:
+        records = list(_history)
+    if program is not None:
+        records = [r for r in records if r.argv[0] == program]
+    return records
+
+
+def summary():
+    """Returns the number of calls, failures and total seconds per program.
+    """
+    programs = {}
+    for r in history():
+        program = programs.setdefault(
+            r.argv[0], {'calls': 0, 'failures': 0, 'seconds': 0})
+        program['calls'] += 1
+        program['failures'] += 1 if r.returncode != 0 else 0
+        program['seconds'] += r.seconds
+    return programs
+
+
+def call(argv, timeout=None, capture_stderr=True, **kwargs):
+    """Runs argv (a list, no shell) and returns its exit status.
+
+    :param capture_stderr: Keep the end of stderr in the history. Set it
+        to False for programs that leave a child running in the background
+        (fbi -autodown), which would hold the pipe open and so keep us
+        waiting until the child exits.
+    """
+    started, start = time.time(), time.monotonic()
+    stderr_to = subprocess.PIPE if capture_stderr else subprocess.DEVNULL
+    try:
+        process = subprocess.Popen(argv, stderr=stderr_to, **kwargs)
+    except OSError as e:
+        record(argv, started, time.monotonic() - start, 127,
+               str(e).encode('utf-8'))
+        print("ERROR ({}):".format(argv[0]), e)
+        return 127
+    try:
+        _, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        _, stderr = process.communicate()
+    record(argv, started, time.monotonic() - start, process.returncode,
+           stderr)
+    if process.returncode != 0 and stderr:
+        print("ERROR ({}):".format(argv[0]),
+              stderr.decode('utf-8', 'replace').strip())
+    return process.returncode
+
+
+def check_output(argv, **kwargs):
+    """Runs argv and returns its stdout. Raises CalledProcessError if it
+    fails (like :func:`subprocess.check_output`).
+    """
+    started, start = time.time(), time.monotonic()
+    process = subprocess.Popen(argv, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, **kwargs)
+    stdout, stderr = process.communicate()
+    record(argv, started, time.monotonic() - start, process.returncode,
+           stderr)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, argv, stdout)
+    return stdout
+
+
+def call_pipeline(argvs):
+    """Runs the programs with each one's stdout connected to the next one's
+    stdin (like a shell pipe). Returns the exit status of the last one.
+    """
+    started, start = time.time(), time.monotonic()
+    processes = []
+    stdin = None
+    for i, argv in enumerate(argvs):
+        stdout = subprocess.PIPE if i < len(argvs) - 1 else None
+        process = subprocess.Popen(argv, stdin=stdin, stdout=stdout,
+                                   stderr=subprocess.PIPE)
+        if stdin is not None:
+            stdin.close()  # so the previous program gets SIGPIPE
+        stdin = process.stdout
+        processes.append(process)
+    # read every stderr at once, so a program that writes a lot to it
+    # doesn't stop (and hold up the pipe) while we wait for another one
+    stderrs = [b''] * len(processes)
+
+    def read_stderr(i):
+        stderrs[i] = processes[i].stderr.read()
+        processes[i].stderr.close()
+
+    readers = [threading.Thread(target=read_stderr, args=(i,))
+               for i in range(len(processes))]
+    for reader in readers:
+        reader.start()
+    # the last program finishes first (or stops the others by exiting)
+    for i in reversed(range(len(processes))):
+        readers[i].join()
+        processes[i].wait()
+        record(argvs[i], started, time.monotonic() - start,
+               processes[i].returncode, stderrs[i])
+    return processes[-1].returncode
+
+
+def remove_file(filename):
+    """Removes filename (in-process). Returns 0 on success."""
+    started, start = time.time(), time.monotonic()
+    try:
+        os.remove(filename)
+    except OSError as e:
+        record(['rm', filename], started, time.monotonic() - start, 1,
+               str(e).encode('utf-8'))
+        print("ERROR (rm):", e)
+        return 1
+    record(['rm', filename], started, time.monotonic() - start, 0)
+    return 0
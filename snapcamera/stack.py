@@ -0,0 +1,250 @@
+"""Stacks timelapse frames into one picture, for star trails (max) or less
+noise (mean, median).
+
+Frames are added one at a time to a single array made for the first frame,
+so memory use is the same for ten frames or ten thousand:
+
+mean
+    Sums into 32 bit integers and divides at the end.
+max
+    Keeps the brightest value of each pixel (lighten).
+median
+    An approximate median: each pixel's estimate (in fixed point, 1/16ths
+    of a level) moves towards every new frame by a step which gets
+    smaller as more frames are added. It needs a few tens of frames to
+    settle.
+
+:class:`LiveStack` keeps a stack up to date while a timelapse is being
+taken, working on the post-processing queue. It stacks frames scaled down
+to fit in LIVE_STACK_SIZE (JPEG frames are decoded at the smaller size),
+so that a full size frame and its 32 bit sums don't have to fit in the
+camera's memory next to everything else.
+"""
+import os
+import math
+import time
+import threading
+from snapcamera import runner
+from snapcamera.mode_option import IMAGE_DIR, STACK_MODES
+try:
+    import numpy
+    from PIL import Image
+except ImportError:
+    numpy = Image = None
+
+
+STACK_QUALITY = 95
+MEDIAN_FRACTION_BITS = 4  # the median estimate is in 1/16ths of a level
+MEDIAN_FIRST_STEP = 32  # levels the estimate moves for the second frame
+LIVE_STACK_SAVE_INTERVAL = 10  # seconds, most often a live stack is saved
+LIVE_STACK_SIZE = (1640, 1232)  # live stacks are scaled to fit in this
+
+
+def available():
+    """True if frames can be stacked (PIL and numpy)."""
+    return numpy is not None
+
+
+def stack_image_name(image_number, mode):
+    """For example: 12, max -> image0012-maxstack.jpg"""
+    return "image{:04}-{}stack.jpg".format(image_number, mode)
+
+
+class StackError(Exception):
+    pass
+
+
+class Stacker(object):
+    """A running stack of frames (PIL images or uint8 arrays) of the same
+    size.
+
+    :param mode: One of STACK_MODES.
+    :param box: Files are scaled down to fit in (width, height), None to
+        stack them full size.
+    """
+    def __init__(self, mode, box=None):
+        if mode not in STACK_MODES:
+            raise StackError("unknown stack mode: {}".format(mode))
+        self.mode = mode
+        self.box = box
+        self.frames = 0
+        self.shape = None
+        self.accumulator = None
+        self.scratch = None
+
+    def add(self, frame):
+        frame = numpy.asarray(frame, dtype=numpy.uint8)
+        if self.shape is None:
+            self._start(frame)
+        elif frame.shape != self.shape:
+            raise StackError("frame is {}, the stack is {}".format(
+                frame.shape, self.shape))
+        elif self.mode == 'mean':
+            self.accumulator += frame
+        elif self.mode == 'max':
+            numpy.maximum(self.accumulator, frame, out=self.accumulator)
+        else:
+            self._add_median(frame)
+        self.frames += 1
+
+    def add_file(self, path):
+        with Image.open(path) as picture:
+            if self.box is not None:
+                # lets JPEG decode straight to (at most twice) the size
+                picture.draft('RGB', self.box)
+            picture = picture.convert('RGB')
+            if self.box is not None:
+                picture.thumbnail(self.box)
+            self.add(picture)
+
+    def result(self):
+        """Returns the stack so far as a PIL image."""
+        if self.frames == 0:
+            raise StackError("nothing has been stacked")
+        if self.mode == 'mean':
+            pixels = (self.accumulator + self.frames // 2) // self.frames
+        elif self.mode == 'max':
+            pixels = self.accumulator
+        else:
+            half = 1 << (MEDIAN_FRACTION_BITS - 1)
+            pixels = (self.accumulator + half) >> MEDIAN_FRACTION_BITS
+        return Image.fromarray(pixels.astype(numpy.uint8))
+
+    def save(self, path, quality=STACK_QUALITY):
+        """Writes the stack so far to path (replacing it in one go)."""
+        directory, name = os.path.split(path)
+        tmp_path = os.path.join(directory, "." + name)
+        self.result().save(tmp_path, 'JPEG', quality=quality)
+        os.replace(tmp_path, path)
+
+    def _start(self, frame):
+        self.shape = frame.shape
+        if self.mode == 'mean':
+            self.accumulator = frame.astype(numpy.uint32)
+        elif self.mode == 'max':
+            self.accumulator = frame.copy()
+        else:
+            self.accumulator = frame.astype(numpy.int16)
+            self.accumulator <<= MEDIAN_FRACTION_BITS
+            self.scratch = numpy.empty(self.shape, dtype=numpy.int16)
+
+    def _add_median(self, frame):
+        # move each estimate towards the frame by step (in 1/16ths),
+        # decreasing like 1/sqrt(frames) but never below 1/16th of a level
+        step = max(1, round((MEDIAN_FIRST_STEP << MEDIAN_FRACTION_BITS) /
+                            math.sqrt(self.frames)))
+        scratch = self.scratch
+        numpy.left_shift(frame, MEDIAN_FRACTION_BITS, out=scratch,
+                         dtype=numpy.int16)
+        scratch -= self.accumulator
+        # don't step past the frame's value
+        numpy.clip(scratch, -step, step, out=scratch)
+        self.accumulator += scratch
+
+
+def stack_files(paths, mode, output):
+    """Stacks the frames in paths and writes the result to output. Returns
+    0 on success.
+    """
+    started, start = time.time(), time.monotonic()
+    stacker = Stacker(mode)
+    try:
+        for path in paths:
+            stacker.add_file(path)
+        stacker.save(output)
+    except (OSError, ValueError, StackError) as e:
+        runner.record(['stack', mode, output], started,
+                      time.monotonic() - start, 1, str(e).encode('utf-8'))
+        print("ERROR (stack {}):".format(output), e)
+        return 1
+    seconds = time.monotonic() - start
+    runner.record(['stack', mode, output], started, seconds, 0)
+    print("Stack {}: {} frames in {:.1f}s ({:.1f} frames/s).".format(
+        output, stacker.frames, seconds, stacker.frames / max(seconds, 1e-6)))
+    return 0
+
+
+class LiveStack(object):
+    """A stack of a timelapse that is being taken, saved as
+    image<number>-<mode>stack.jpg in image_dir.
+
+    Frames are added on queue (the camera's post-processing queue), all
+    the frames waiting in one job so that a slow card doesn't fill the
+    queue up. The stack is saved at most every LIVE_STACK_SAVE_INTERVAL
+    seconds, and by :meth:`finish`.
+
+    :param on_save: Called with the stack's file name when it is written.
+    """
+    def __init__(self, image_number, mode, queue, image_dir=IMAGE_DIR,
+                 on_save=None):
+        self.stacker = Stacker(mode, LIVE_STACK_SIZE)
+        self.name = stack_image_name(image_number, mode)
+        self.path = os.path.join(image_dir, self.name)
+        self.image_dir = image_dir
+        self.queue = queue
+        self.on_save = on_save
+        self.lock = threading.Lock()
+        self.work_lock = threading.Lock()  # one _work at a time
+        self.pending = []
+        self.scheduled = False
+        self.finishing = False
+        self.saved_frames = 0
+        self.last_save = 0
+
+    def add(self, image_names):
+        """Adds frames (names in image_dir) to the stack, in the
+        background.
+        """
+        with self.lock:
+            self.pending.extend(image_names)
+            self._schedule()
+
+    def finish(self):
+        """Saves the stack once every frame has been added."""
+        with self.lock:
+            self.finishing = True
+            self._schedule()
+            scheduled = self.scheduled
+        if not scheduled:
+            # the queue is full, the last save mustn't be lost
+            threading.Thread(target=self._work, name="stack").start()
+
+    def _schedule(self):
+        # called holding the lock
+        if not self.scheduled:
+            self.scheduled = self.queue.put(self._work, name="stack") \
+                is not None
+
+    def _work(self):
+        with self.work_lock:
+            self._add_pending()
+
+    def _add_pending(self):
+        with self.lock:
+            image_names, self.pending = self.pending, []
+            self.scheduled = False
+            finishing = self.finishing
+        for image_name in image_names:
+            try:
+                self.stacker.add_file(os.path.join(self.image_dir,
+                                                   image_name))
+            except (OSError, ValueError, StackError) as e:
+                print("ERROR (stack {}):".format(image_name), e)
+        if self.stacker.frames > self.saved_frames and (
+                finishing or
+                time.monotonic() - self.last_save >= LIVE_STACK_SAVE_INTERVAL):
+            self._save()
+
+    def _save(self):
+        started, start = time.time(), time.monotonic()
+        try:
+            self.stacker.save(self.path)
+        except (OSError, ValueError) as e:
+            print("ERROR (stack {}):".format(self.name), e)
+            return
+        runner.record(['stack', self.stacker.mode, self.name], started,
+                      time.monotonic() - start, 0)
+        self.saved_frames = self.stacker.frames
+        self.last_save = time.monotonic()
+        if self.on_save is not None:
+            self.on_save(self.name)
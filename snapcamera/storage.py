@@ -0,0 +1,170 @@
+"""Estimates how many more pictures (or videos, or timelapse frames) will
+fit on the card.
+
+File sizes depend a lot on what we are doing (effects, overlays, video
+length) so we keep rolling averages of the sizes of the files we actually
+write, per mode and per effect. Free space is cached and refreshed by a
+background thread (and adjusted as we write) so that updating the display
+doesn't need any system calls.
+"""
+import os
+import threading
+
+
+AVERAGE_IMAGE_SIZE = 2.4 * 1024 * 1024  # 2.4M is from `ls -l`
+FREESPACE_REFRESH_INTERVAL = 60  # seconds
+# how much a new sample moves the average once we have a few of them
+ROLLING_WEIGHT = 0.2
+SEED_SAMPLES = 20
+
+
+class SizeStatistic(object):
+    """Rolling average of a file size. Starts off as the plain mean and
+    becomes an exponential moving average after 1/ROLLING_WEIGHT samples.
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean = 0
+        self.last_weight = 0
+
+    def add(self, size):
+        self.count += 1
+        self.last_weight = max(1 / self.count, ROLLING_WEIGHT)
+        self.mean += self.last_weight * (size - self.mean)
+
+    def add_to_last(self, size):
+        """Adds size to the most recent sample (for example the overlay
+        image that goes with a picture).
+        """
+        self.mean += self.last_weight * size
+
+
+class StorageEstimator(object):
+    """Cached free space and rolling file size statistics for a directory.
+
+    Statistics are keyed by (mode name, effect); lookups fall back to the
+    mode on its own and then to ``default_size``.
+    """
+    def __init__(self, path, default_size=AVERAGE_IMAGE_SIZE):
+        self.path = path
+        self.default_size = default_size
+        self.statistics = {}
+        self.quality_statistics = {}  # full resolution stills by quality
+        self.lock = threading.Lock()
+        self.free_bytes = freespace(self.path)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts refreshing the free space in the background."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._refresh_periodically)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _refresh_periodically(self):
+        while not self._stop.wait(FREESPACE_REFRESH_INTERVAL):
+            self.refresh()
+
+    def refresh(self):
+        """Reads the free space from the file system."""
+        free_bytes = freespace(self.path)
+        with self.lock:
+            self.free_bytes = free_bytes
+
+    def seed(self, filenames):
+        """Sets the default size from existing files (we don't know which
+        mode they came from).
+        """
+        sizes = []
+        for filename in filenames[-SEED_SAMPLES:]:
+            try:
+                sizes.append(os.path.getsize(filename))
+            except OSError:
+                pass
+        if len(sizes) > 0:
+            self.default_size = sorted(sizes)[len(sizes) // 2]
+
+    def record(self, key, size, same_shot=False, written=None):
+        """Records that we have written a file of size bytes while in the
+        mode/effect described by key. If same_shot is True the size is added
+        to the previous sample rather than counted as a new one. written is
+        the number of bytes actually written, if that isn't size.
+        """
+        with self.lock:
+            for k in (key, key[:1]):
+                statistic = self.statistics.setdefault(k, SizeStatistic())
+                if same_shot and statistic.count > 0:
+                    statistic.add_to_last(size)
+                else:
+                    statistic.add(size)
+            # keep the cached figure roughly right until the next refresh
+            self.free_bytes = max(0, self.free_bytes -
+                                  (size if written is None else written))
+
+    def record_file(self, key, filename, same_shot=False, scale=1):
+        """Records the size of filename (divided by scale)."""
+        try:
+            size = os.path.getsize(filename)
+        except OSError:
+            return
+        self.record(key, size / scale, same_shot, written=size)
+
+    def record_quality(self, quality, filename, scale=1):
+        """Records the size of filename (divided by scale), a still taken
+        at JPEG quality (None for the camera's default), see
+        :meth:`quality_size`. The free space is left alone, the file is
+        expected to be recorded with :meth:`record_file` too.
+        """
+        try:
+            size = os.path.getsize(filename)
+        except OSError:
+            return
+        with self.lock:
+            statistic = self.quality_statistics.setdefault(quality,
+                                                           SizeStatistic())
+            statistic.add(size / scale)
+
+    def quality_size(self, quality):
+        """Returns how big stills at JPEG quality have been compared to
+        ones at the camera's default quality, or None until there have
+        been some of both.
+        """
+        with self.lock:
+            statistic = self.quality_statistics.get(quality)
+            default = self.quality_statistics.get(None)
+        if statistic is None or default is None or default.mean <= 0:
+            return None
+        return statistic.mean / default.mean
+
+    def average_size(self, key):
+        with self.lock:
+            for k in (key, key[:1]):
+                if k in self.statistics:
+                    return self.statistics[k].mean
+        return self.default_size
+
+    def remaining(self, key, units=1):
+        """Returns how many more files (each units times the average size)
+        fit in the free space.
+        """
+        size = self.average_size(key) * units
+        if size <= 0:
+            return 0
+        return int(self.free_bytes / size)
+
+    def time_remaining(self, key, interval):
+        """Returns how long (same units as interval) we can keep writing a
+        file every interval before we run out of space.
+        """
+        return self.remaining(key) * interval
+
+
+def freespace(path):
+    """Returns the number of bytes available at the given path."""
+    stats = os.statvfs(path)
+    return stats.f_bsize * stats.f_bavail  # block size * blocks available
@@ -0,0 +1,225 @@
+"""Synthetic (but valid) JPEG and H.264 data for the fake capture backend.
+
+Everything is deterministic: the same seed always gives the same bytes, so
+benchmarks on a machine without a camera are repeatable.
+
+JPEGs are padded to a realistic size with comment segments. If PIL is
+installed the picture is a full resolution test pattern (encoded once and
+cached), otherwise it is a tiny grey square.
+
+H.264 streams use I_PCM macroblocks (raw samples, so no encoder is needed)
+and filler data NAL units to reach a realistic bit rate.
+"""
+import io
+import struct
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+STILL_RESOLUTION = (2592, 1944)
+MAX_COMMENT_LENGTH = 65533
+
+# 8x8 grey baseline JPEG (every block is DC 0 with an immediate EOB)
+_TINY_JPEG_TABLES = (
+    b'\xff\xdb\x00\x43\x00' + b'\x01' * 64 +  # quantisation table
+    b'\xff\xc0\x00\x0b\x08\x00\x08\x00\x08\x01\x01\x11\x00' +  # 8x8, grey
+    b'\xff\xc4\x00\x14\x00\x01' + b'\x00' * 15 + b'\x00' +  # DC: one code
+    b'\xff\xc4\x00\x14\x10\x01' + b'\x00' * 15 + b'\x00' +  # AC: EOB only
+    b'\xff\xda\x00\x08\x01\x01\x00\x00\x3f\x00' +  # start of scan
+    b'\x3f'  # DC '0', EOB '0', padded with ones
+)
+_pattern_cache = {}
+_frame_cache = {}
+
+
+def jpeg_bytes(seed, size=0, resolution=STILL_RESOLUTION):
+    """Returns a JPEG of (at least) size bytes, different for every seed."""
+    body = _test_pattern(resolution)
+    comment = "snapcamera fake frame {}".format(seed).encode('utf-8')
+    data = bytearray(b'\xff\xd8')
+    data += _comment(comment)
+    padding = size - len(data) - len(body) - 2
+    block = bytes((seed + i) % 256 for i in range(256))
+    while padding > 4:
+        length = min(padding - 4, MAX_COMMENT_LENGTH)
+        data += _comment((block * (length // 256 + 1))[:length])
+        padding -= length + 4
+    data += body
+    data += b'\xff\xd9'
+    return bytes(data)
+
+
+def _comment(text):
+    return b'\xff\xfe' + struct.pack('>H', len(text) + 2) + text
+
+
+def _test_pattern(resolution):
+    """The JPEG between SOI and EOI (cached per resolution)."""
+    if Image is None:
+        return _TINY_JPEG_TABLES
+    if resolution not in _pattern_cache:
+        gradient = Image.linear_gradient('L')
+        pattern = Image.merge('RGB', (
+            gradient.resize(resolution),
+            gradient.rotate(90).resize(resolution),
+            Image.new('L', resolution, 128)))
+        encoded = io.BytesIO()
+        pattern.save(encoded, 'JPEG', quality=85)
+        # strip SOI and EOI
+        _pattern_cache[resolution] = encoded.getvalue()[2:-2]
+    return _pattern_cache[resolution]
+
+
+class BitWriter(object):
+    """Writes the bit fields of an H.264 RBSP."""
+    def __init__(self):
+        self.data = bytearray()
+        self.value = 0
+        self.count = 0
+
+    def u(self, value, n):
+        for i in reversed(range(n)):
+            self.value = (self.value << 1) | ((value >> i) & 1)
+            self.count += 1
+            if self.count == 8:
+                self.data.append(self.value)
+                self.value = self.count = 0
+
+    def ue(self, value):
+        value += 1
+        length = value.bit_length()
+        self.u(0, length - 1)
+        self.u(value, length)
+
+    def se(self, value):
+        self.ue(2 * value - 1 if value > 0 else -2 * value)
+
+    def align_zero(self):
+        if self.count > 0:
+            self.u(0, 8 - self.count)
+
+    def trailing(self):
+        self.u(1, 1)
+        self.align_zero()
+
+    def raw(self, data):
+        if self.count == 0:
+            self.data += data
+        else:
+            for byte in data:
+                self.u(byte, 8)
+
+    def to_bytes(self):
+        self.align_zero()
+        return bytes(self.data)
+
+
+def _nal(header, rbsp):
+    """Annex B NAL unit with emulation prevention."""
+    out = bytearray(b'\x00\x00\x00\x01')
+    out.append(header)
+    zeros = 0
+    for byte in rbsp:
+        if zeros >= 2 and byte <= 3:
+            out.append(3)
+            zeros = 0
+        out.append(byte)
+        zeros = zeros + 1 if byte == 0 else 0
+    return bytes(out)
+
+
+def _sps(width_mbs, height_mbs, framerate):
+    w = BitWriter()
+    w.u(66, 8)  # baseline profile
+    w.u(0, 8)  # constraint flags
+    w.u(30, 8)  # level 3
+    w.ue(0)  # seq_parameter_set_id
+    w.ue(0)  # log2_max_frame_num_minus4
+    w.ue(2)  # pic_order_cnt_type
+    w.ue(1)  # max_num_ref_frames
+    w.u(0, 1)  # gaps_in_frame_num_value_allowed_flag
+    w.ue(width_mbs - 1)
+    w.ue(height_mbs - 1)
+    w.u(1, 1)  # frame_mbs_only_flag
+    w.u(1, 1)  # direct_8x8_inference_flag
+    w.u(0, 1)  # frame_cropping_flag
+    w.u(1, 1)  # vui_parameters_present_flag
+    w.u(0, 4)  # aspect ratio, overscan, video signal, chroma location
+    w.u(1, 1)  # timing_info_present_flag
+    w.u(1, 32)  # num_units_in_tick
+    w.u(2 * framerate, 32)  # time_scale
+    w.u(1, 1)  # fixed_frame_rate_flag
+    w.u(0, 4)  # hrd, pic_struct, bitstream restriction
+    w.trailing()
+    return _nal(0x67, w.to_bytes())
+
+
+def _pps():
+    w = BitWriter()
+    w.ue(0)  # pic_parameter_set_id
+    w.ue(0)  # seq_parameter_set_id
+    w.u(0, 1)  # CAVLC
+    w.u(0, 1)  # bottom_field_pic_order_in_frame_present_flag
+    w.ue(0)  # num_slice_groups_minus1
+    w.ue(0)  # num_ref_idx_l0_default_active_minus1
+    w.ue(0)  # num_ref_idx_l1_default_active_minus1
+    w.u(0, 1)  # weighted_pred_flag
+    w.u(0, 2)  # weighted_bipred_idc
+    w.se(0)  # pic_init_qp_minus26
+    w.se(0)  # pic_init_qs_minus26
+    w.se(0)  # chroma_qp_index_offset
+    w.u(0, 1)  # deblocking_filter_control_present_flag
+    w.u(0, 1)  # constrained_intra_pred_flag
+    w.u(0, 1)  # redundant_pic_cnt_present_flag
+    w.trailing()
+    return _nal(0x68, w.to_bytes())
+
+
+def _idr_frame(width_mbs, height_mbs, frame):
+    w = BitWriter()
+    w.ue(0)  # first_mb_in_slice
+    w.ue(7)  # slice_type: I (all slices)
+    w.ue(0)  # pic_parameter_set_id
+    w.u(0, 4)  # frame_num
+    w.ue(frame % 2)  # idr_pic_id, differs between neighbouring IDRs
+    w.u(0, 1)  # no_output_of_prior_pics_flag
+    w.u(0, 1)  # long_term_reference_flag
+    w.se(0)  # slice_qp_delta
+    for mb in range(width_mbs * height_mbs):
+        w.ue(25)  # mb_type: I_PCM
+        w.align_zero()
+        # a diagonal stripe that moves one macroblock per frame
+        level = 200 if (mb + frame) % (width_mbs + 1) == 0 else 60
+        w.raw(bytes([level]) * 256)  # luma
+        w.raw(bytes([128]) * 128)  # chroma
+    w.trailing()
+    return _nal(0x65, w.to_bytes())
+
+
+def _filler(length):
+    # 0xff never needs emulation prevention
+    return b'\x00\x00\x00\x01\x0c' + b'\xff' * max(0, length) + b'\x80'
+
+
+def h264_frames(frames, seed=0, resolution=(64, 64), framerate=30,
+                bitrate=0):
+    """Yields an H.264 (Annex B) stream a frame at a time. Every frame is an
+    IDR picture; filler data brings the stream up to bitrate (bits per
+    second).
+    """
+    width_mbs, height_mbs = resolution[0] // 16, resolution[1] // 16
+    frame_bytes = bitrate // 8 // framerate
+    for i in range(frames):
+        data = b''
+        if i == 0:
+            data += _sps(width_mbs, height_mbs, framerate) + _pps()
+        # frames repeat every 2 * (width_mbs + 1)
+        key = (resolution, (seed + i) % (2 * (width_mbs + 1)))
+        if key not in _frame_cache:
+            _frame_cache[key] = _idr_frame(width_mbs, height_mbs, seed + i)
+        data += _frame_cache[key]
+        if len(data) + 6 < frame_bytes:
+            data += _filler(frame_bytes - len(data) - 6)
+        yield data
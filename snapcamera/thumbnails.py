@@ -0,0 +1,191 @@
+"""Small copies of pictures, so that nothing has to decode a full size
+JPEG just to show it on a small screen or send it over the network.
+
+Every picture gets a pyramid of renditions (see THUMBNAIL_SIZES), made
+after it has been taken on the post-processing queue. The picture is
+decoded with JPEG draft mode, which lets libjpeg scale it down by 1/2, 1/4
+or 1/8 while decoding, then each rendition is shrunk from the one above
+it. Renditions are kept in THUMBNAIL_DIR (one directory per rendition) and
+the least recently used ones are removed when a rendition's directory gets
+bigger than its share of THUMBNAIL_CACHE_BYTES. Each rendition has its own
+share so that the big previews can't push out the small thumbnails that the
+grid view needs for every picture.
+"""
+import os
+import time
+import tempfile
+import threading
+import collections
+from snapcamera import runner
+from snapcamera.mode_option import IMAGE_DIR, THUMBNAIL_DIR
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+# largest first, each one is made from the one before
+THUMBNAIL_SIZES = (
+    ('preview', (1024, 768)),
+    ('screen', (480, 320)),
+    ('thumbnail', (160, 120)),
+)
+THUMBNAIL_QUALITY = 85
+# bytes kept of each rendition, about 200 previews, 1000 screen sized
+# copies and 10000 thumbnails
+THUMBNAIL_CACHE_BYTES = {
+    'preview': 32 * 1024 * 1024,
+    'screen': 32 * 1024 * 1024,
+    'thumbnail': 64 * 1024 * 1024,
+}
+
+
+def available():
+    """True if renditions can be made (PIL is installed)."""
+    return Image is not None
+
+
+class ThumbnailCache(object):
+    """Renditions of the pictures in image_dir, kept in directory.
+
+    :param max_bytes: Rendition name -> bytes. The least recently used
+        copies of a rendition are removed when they take up more than this.
+    """
+    def __init__(self, directory=THUMBNAIL_DIR, image_dir=IMAGE_DIR,
+                 sizes=THUMBNAIL_SIZES, max_bytes=THUMBNAIL_CACHE_BYTES,
+                 quality=THUMBNAIL_QUALITY):
+        self.directory = directory
+        self.image_dir = image_dir
+        self.sizes = sizes
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self.lock = threading.RLock()
+        # rendition -> {path: size in bytes}, least recently used first
+        self.entries = {}
+        self.total_bytes = {}
+        for rendition, _ in self.sizes:
+            self.entries[rendition] = collections.OrderedDict()
+            self.total_bytes[rendition] = 0
+            os.makedirs(os.path.join(self.directory, rendition),
+                        exist_ok=True)
+        self._load()
+
+    def _load(self):
+        """Finds the renditions made last time (oldest first)."""
+        for rendition, _ in self.sizes:
+            found = []
+            rendition_dir = os.path.join(self.directory, rendition)
+            for name in os.listdir(rendition_dir):
+                path = os.path.join(rendition_dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if name.startswith("."):
+                    os.remove(path)  # half written
+                    continue
+                found.append((st.st_mtime_ns, path, st.st_size))
+            for _, path, size in sorted(found):
+                self.entries[rendition][path] = size
+                self.total_bytes[rendition] += size
+
+    def rendition_path(self, image_name, rendition):
+        return os.path.join(self.directory, rendition, image_name)
+
+    def path(self, image_name, rendition, generate=True):
+        """Returns the file name of a rendition of image_name (a name in
+        image_dir), making it if it's missing or older than the picture.
+        Returns None if there isn't one.
+        """
+        path = self.rendition_path(image_name, rendition)
+        with self.lock:
+            entries = self.entries[rendition]
+            if path in entries and self._is_fresh(path, image_name):
+                entries.move_to_end(path)
+                return path
+        if generate and self.generate(image_name) == 0:
+            return self.path(image_name, rendition, generate=False)
+        return None
+
+    def generate(self, image_name):
+        """Makes every rendition of image_name. Returns 0 on success."""
+        if not available():
+            return 1
+        started, start = time.time(), time.monotonic()
+        try:
+            with Image.open(os.path.join(self.image_dir, image_name)) as im:
+                largest = self.sizes[0][1]
+                im.draft('RGB', largest)
+                picture = im.convert('RGB')
+            picture.info = {}  # don't copy comments etc. into every copy
+            for rendition, size in self.sizes:
+                picture.thumbnail(size)
+                self._save(picture, image_name, rendition)
+        except (OSError, ValueError) as e:
+            runner.record(['thumbnails', image_name], started,
+                          time.monotonic() - start, 1, str(e).encode('utf-8'))
+            print("ERROR (thumbnails {}):".format(image_name), e)
+            return 1
+        runner.record(['thumbnails', image_name], started,
+                      time.monotonic() - start, 0)
+        return 0
+
+    def generate_all(self, image_names):
+        """Makes renditions of each picture (for the post-processing queue).
+        """
+        for image_name in image_names:
+            self.generate(image_name)
+
+    def remove(self, image_name):
+        """Removes the renditions of image_name."""
+        with self.lock:
+            for rendition, _ in self.sizes:
+                self._forget(self.rendition_path(image_name, rendition),
+                             rendition)
+
+    def _save(self, picture, image_name, rendition):
+        path = self.rendition_path(image_name, rendition)
+        # a name of our own, the viewer and the post-processing queue can
+        # be making the same rendition at once
+        fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=".jpg",
+                                        dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                picture.save(tmp_file, 'JPEG', quality=self.quality)
+            os.replace(tmp_path, path)
+        except (OSError, ValueError):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        size = os.path.getsize(path)
+        with self.lock:
+            entries = self.entries[rendition]
+            self.total_bytes[rendition] -= entries.pop(path, 0)
+            entries[path] = size
+            self.total_bytes[rendition] += size
+            self._evict(rendition)
+
+    def _evict(self, rendition):
+        entries = self.entries[rendition]
+        while self.total_bytes[rendition] > self.max_bytes[rendition] and \
+                len(entries) > 1:
+            self._forget(next(iter(entries)), rendition)
+
+    def _forget(self, path, rendition):
+        entries = self.entries[rendition]
+        if path not in entries:
+            return
+        self.total_bytes[rendition] -= entries.pop(path)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _is_fresh(self, path, image_name):
+        try:
+            return os.stat(path).st_mtime_ns >= os.stat(
+                os.path.join(self.image_dir, image_name)).st_mtime_ns
+        except OSError:
+            return False
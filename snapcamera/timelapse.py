@@ -1,6 +1,100 @@
-from snapcamera.mode_option import ModeOption
-from pifacecad.tools.question import LCDQuestion
+"""Timelapse mode: take a picture every interval for a period.
+
+Frames are taken by :class:`TimelapseRun` with the (warm) capture backend
+rather than by one long raspistill. Each frame is scheduled against a
+monotonic clock from the start of the run, so time spent taking a frame
+doesn't push the later ones back. If a frame is so late that its slot and
+later ones have passed, those slots are skipped rather than taken in a
+rush.
+
+The run is saved to TIMELAPSE_STATE_FILE after every frame. If the camera
+stops before the run has finished (power cut, reboot) the run is resumed
+the next time it starts, carrying on with the next frame number. How late
+each frame was taken (its jitter) is logged to a CSV file next to the state
+file.
+
+If a timelapse won't fit on the card, :func:`plan_timelapse` picks a lower
+JPEG quality or resolution (TIMELAPSE_QUALITY_STEPS) so that it does,
+rather than refusing to start. The camera plans again every
+TIMELAPSE_REPLAN_FRAMES frames, in case the frames are bigger than
+expected or something else is filling the card.
+"""
+import os
+import json
 import time
+import threading
+import collections
+from snapcamera.backend import (
+    CaptureSettings,
+    STILL_RESOLUTION,
+    still_size_fraction,
+    timelapse_frames,
+)
+from snapcamera.mode_option import ModeOption, TIMELAPSE_STATE_FILE
+
+
+TIMELAPSE_LOG_HEADER = "slot,frame,time,jitter_ms,capture_ms,status\n"
+# settings to fall back to when a timelapse won't fit, best first:
+# (JPEG quality, resolution), None is the camera's default
+TIMELAPSE_QUALITY_STEPS = [
+    (None, None),
+    (70, None),
+    (50, None),
+    (70, (1920, 1440)),
+    (50, (1920, 1440)),
+    (70, (1296, 972)),
+    (50, (1296, 972)),
+    (50, (640, 480)),
+]
+TIMELAPSE_SPARE_SPACE = 64 * 1024 * 1024  # bytes left free after a run
+TIMELAPSE_REPLAN_FRAMES = 10  # check that the rest fits this often
+
+
+class TimelapsePlan(collections.namedtuple(
+        'TimelapsePlan', ['frames', 'settings', 'frame_size', 'budget',
+                          'free_at_end'])):
+    """The settings chosen for the remaining frames, and the estimated
+    size of each frame and the space available for each one (budget), in
+    bytes.
+    """
+    @property
+    def fits(self):
+        return self.frame_size <= self.budget
+
+    def describe(self):
+        resolution = self.settings.resolution or STILL_RESOLUTION
+        text = "Timelapse: {} frames at quality {}, {}x{} (about {:.1f}MB " \
+               "each, {:.1f}MB budget), {:.0f}MB free at the end.".format(
+                   self.frames, self.settings.quality or "default",
+                   resolution[0], resolution[1], self.frame_size / 2**20,
+                   self.budget / 2**20, max(0, self.free_at_end) / 2**20)
+        if not self.fits:
+            text += " It won't fit."
+        return text
+
+
+def plan_timelapse(storage, key, frames, settings,
+                   spare=TIMELAPSE_SPARE_SPACE):
+    """Returns the :class:`TimelapsePlan` with the best of
+    TIMELAPSE_QUALITY_STEPS that fits frames more frames into the free
+    space, leaving spare bytes, or the smallest if none of them do.
+
+    :param key: Statistics key for the frames in storage (a
+        :class:`snapcamera.storage.StorageEstimator`). Frames are recorded
+        scaled to the default quality and full resolution, see
+        :func:`snapcamera.backend.still_size_fraction`.
+    """
+    free = storage.free_bytes
+    budget = max(0, free - spare) / max(1, frames)
+    full_size = storage.average_size(key)
+    for quality, resolution in TIMELAPSE_QUALITY_STEPS:
+        step = settings._replace(quality=quality, resolution=resolution)
+        frame_size = full_size * still_size_fraction(step, storage)
+        if frame_size <= budget:
+            break
+    return TimelapsePlan(frames, step, frame_size, budget,
+                         free - frames * frame_size)
+
 
 class TimelapseModeOption(ModeOption):
     def __init__(self, *args):
@@ -16,6 +110,15 @@ class TimelapseModeOption(ModeOption):
         self.timeNumbers = [1000,60000,3600000,86400000]
 
     def update_display_option_text(self):
+        run = self.camera.timelapse
+        if run is not None:
+            # frames taken/total, or the frames still to take if that
+            # doesn't fit
+            text = "{}/{}".format(run.frames_written, run.frames)
+            if len(text) > 8:
+                text = "-{}".format(run.remaining)
+            super().update_display_option_text(text)
+            return
         period_delay_seconds = int(self.camera.timeout / self.timeNumbers[self.periodIndex])
         interval_delay_seconds = int(self.camera.timelapse_interval / self.timeNumbers[self.intervalIndex])
         if self.selected == 'interval':
@@ -29,6 +132,7 @@ class TimelapseModeOption(ModeOption):
     def update_camera(self):
         self.camera.timeout = self.period
         self.camera.timelapse_interval = self.interval
+        self.camera.update_display_remaining()
 
     def enter(self):
         self._old_camera_timeout = self.camera.timeout
@@ -80,10 +184,202 @@ class TimelapseModeOption(ModeOption):
         self.update_display_option_text()
 
     def pre_picture(self):
-        pictures = self.period/self.interval
-        if pictures > self.camera.pictures_remaining:
-            self.camera.cad.lcd.home()
-            self.camera.print_status_attention()
-            time.sleep(3)
-        else: 
+        storage = self.camera.storage
+        storage.refresh()
+        plan = plan_timelapse(storage, self.camera.storage_key,
+                              timelapse_frames(self.period, self.interval),
+                              self.camera.settings)
+        if plan.fits:
             return True
+        # not even at the lowest quality, until the next display update
+        print(plan.describe())
+        self.camera.print_status_attention()
+        super().update_display_option_text("no space")
+        return False
+
+
+class TimelapseRun(object):
+    """Takes a picture every interval (milliseconds), frames times, named
+    image<image_number>_<frame>.jpg (frames from 1).
+
+    :param settings: The :class:`snapcamera.backend.CaptureSettings` to use
+        for every frame.
+    :param stack: Stack the frames as they are taken, in this mode (see
+        :mod:`snapcamera.stack`).
+    """
+    def __init__(self, image_number, frames, interval, settings, stack=None,
+                 state_file=TIMELAPSE_STATE_FILE):
+        self.image_number = image_number
+        self.frames = frames
+        self.interval = interval
+        self.settings = settings
+        self.stack = stack
+        self.state_file = state_file
+        self.next_slot = 0  # frames that have been (or were skipped)
+        self.frames_written = 0
+        self.skipped = 0
+        self.failed = 0
+        self.resumed = 0
+        # jitter: how many seconds after its slot each frame was taken
+        self.jitter_count = 0
+        self.jitter_total = 0
+        self.jitter_max = 0
+        self._stop = threading.Event()
+        self._keep_state = False
+
+    @property
+    def remaining(self):
+        """Frames still to take."""
+        return self.frames - self.next_slot
+
+    @property
+    def log_file(self):
+        return os.path.join(os.path.dirname(self.state_file),
+                            "image{:04}.jitter.csv".format(self.image_number))
+
+    def image_name(self, frame):
+        return "image{:04}_{:04}.jpg".format(self.image_number, frame)
+
+    def quality_text(self):
+        """For example "q70 1920" if the quality was lowered to make the
+        frames fit (see :func:`plan_timelapse`), otherwise None.
+        """
+        quality, resolution = self.settings.quality, self.settings.resolution
+        if quality is None and resolution is None:
+            return None
+        text = "q{}".format(quality) if quality is not None else ""
+        if resolution is not None:
+            text = "{} {}".format(text, resolution[0]).strip()
+        return text
+
+    def to_dict(self):
+        return {'image_number': self.image_number,
+                'frames': self.frames,
+                'interval': self.interval,
+                'settings': self.settings._asdict(),
+                'stack': self.stack,
+                'next_slot': self.next_slot,
+                'frames_written': self.frames_written,
+                'skipped': self.skipped,
+                'failed': self.failed,
+                'resumed': self.resumed,
+                'jitter_count': self.jitter_count,
+                'jitter_total': self.jitter_total,
+                'jitter_max': self.jitter_max}
+
+    @classmethod
+    def from_dict(cls, run_dict, state_file=TIMELAPSE_STATE_FILE):
+        settings = CaptureSettings(**run_dict['settings'])
+        if settings.resolution is not None:
+            # JSON has made it a list
+            settings = settings._replace(
+                resolution=tuple(settings.resolution))
+        run = cls(run_dict['image_number'], run_dict['frames'],
+                  run_dict['interval'], settings,
+                  stack=run_dict.get('stack'), state_file=state_file)
+        for name in ('next_slot', 'frames_written', 'skipped', 'failed',
+                     'resumed', 'jitter_count', 'jitter_total',
+                     'jitter_max'):
+            setattr(run, name, run_dict.get(name, 0))
+        return run
+
+    @classmethod
+    def load(cls, state_file=TIMELAPSE_STATE_FILE):
+        """Returns the unfinished run saved in state_file, or None."""
+        try:
+            with open(state_file, 'r') as f:
+                run = cls.from_dict(json.load(f), state_file)
+        except (IOError, ValueError, KeyError, TypeError):
+            return None
+        run.resumed += 1
+        return run if run.remaining > 0 else None
+
+    def save(self):
+        tmp_file = self.state_file + "~"
+        try:
+            with open(tmp_file, 'w') as state_file:
+                json.dump(self.to_dict(), state_file)
+            os.rename(tmp_file, self.state_file)
+        except IOError as e:
+            print("ERROR (timelapse state):", e)
+
+    def stop(self, keep_state=False):
+        """Stops the run after the frame being taken. With keep_state the
+        run is resumed the next time the camera starts.
+        """
+        self._keep_state = keep_state
+        self._stop.set()
+
+    def run(self, capture, on_frame=None):
+        """Takes the rest of the frames with capture(image_name), which
+        returns 0 on success, calling on_frame(image_name, status) after
+        each one. Returns 0 unless a frame failed.
+        """
+        interval = self.interval / 1000
+        # slots are due every interval from here (a resumed run carries on
+        # from now, with the next frame number)
+        start = time.monotonic() - self.next_slot * interval
+        self.save()
+        with open(self.log_file, 'a') as log:
+            if log.tell() == 0:
+                log.write(TIMELAPSE_LOG_HEADER)
+            while self.remaining > 0:
+                due = start + self.next_slot * interval
+                delay = due - time.monotonic()
+                if delay > 0 and self._stop.wait(delay):
+                    break
+                if self._stop.is_set():
+                    break
+                taken_at, taken_time = time.monotonic(), time.time()
+                if interval > 0 and taken_at - due >= interval:
+                    # taking the last frame overran, skip the slots that
+                    # have passed rather than bunching frames up
+                    missed = min(int((taken_at - due) / interval),
+                                 self.remaining - 1)
+                    self.next_slot += missed
+                    self.skipped += missed
+                    due += missed * interval
+                image_name = self.image_name(self.frames_written + 1)
+                status = capture(image_name)
+                finished_at = time.monotonic()
+                self._log(log, image_name, taken_time, taken_at - due,
+                          finished_at - taken_at, status)
+                if status == 0:
+                    self.frames_written += 1
+                else:
+                    self.failed += 1
+                self.next_slot += 1
+                self.save()
+                if on_frame is not None:
+                    on_frame(image_name, status)
+        if self._keep_state and self.remaining > 0:
+            print("Timelapse stopped, it will carry on from frame {} next "
+                  "time.".format(self.frames_written + 1))
+        else:
+            self._remove_state()
+        print(self.summary())
+        return 0 if self.failed == 0 else 1
+
+    def summary(self):
+        mean = self.jitter_total / max(1, self.jitter_count)
+        return "Timelapse image{:04}: {} of {} frames ({} skipped, {} " \
+               "failed), jitter mean {:.1f}ms, max {:.1f}ms.".format(
+                   self.image_number, self.frames_written, self.frames,
+                   self.skipped, self.failed, mean * 1000,
+                   self.jitter_max * 1000)
+
+    def _log(self, log, image_name, taken_time, jitter, capture_time,
+             status):
+        self.jitter_count += 1
+        self.jitter_total += jitter
+        self.jitter_max = max(self.jitter_max, jitter)
+        log.write("{},{},{:.3f},{:.1f},{:.1f},{}\n".format(
+            self.next_slot, image_name, taken_time, jitter * 1000,
+            capture_time * 1000, status))
+        log.flush()
+
+    def _remove_state(self):
+        try:
+            os.remove(self.state_file)
+        except OSError:
+            pass
@@ -1,6 +1,9 @@
-import re
 import os
-import subprocess
+import bisect
+import threading
+from snapcamera import framebuffer, runner
+from snapcamera.contact_sheet import ContactSheet, PLACEHOLDER
+from snapcamera.media_index import image_index
 from snapcamera.mode_option import ModeOption
 from snapcamera.mode_option import (
     IMAGE_DIR,
@@ -8,7 +11,14 @@ from snapcamera.mode_option import (
 )
 
 
+GRID_PAGE_JUMP = 10  # pages skipped by options 2 and 3 in the grid
+GRID_CACHE_PAGES = 6
+
+
 class ViewerModeOption(ModeOption):
+    # the preview would cover the image viewer
+    keep_camera_warm = False
+
     def __init__(self, *args):
         super().__init__(*args)
         # current image index is the number in the image name
@@ -18,10 +28,20 @@ class ViewerModeOption(ModeOption):
         # except IndexError:
         #     self.current_image_index = None
         self.current_image_index = 0 if len(self.images) > 0 else None
+        # used instead of fbi when we can draw on the framebuffer ourselves
+        self.framebuffer = None
+        self.frames = None
+        # grid of thumbnails (needs the framebuffer)
+        self.grid = False
+        self.sheet = None
+        self.pages = None
+        # thumbnails being made for the grid
+        self.generating = set()
+        self.generating_lock = threading.Lock()
 
     @property
     def images(self):
-        return sorted(os.listdir(IMAGE_DIR))
+        return self.camera.images
 
     @property
     def current_image(self):
@@ -41,7 +61,26 @@ class ViewerModeOption(ModeOption):
             self.update_display_option_text()
             self.start_image_viewer()
 
+    @property
+    def page(self):
+        return self.current_image_index // self.sheet.per_page
+
+    @property
+    def page_count(self):
+        return -(-len(self.images) // self.sheet.per_page)
+
+    def page_images(self, page):
+        """The names of the images on page (a tuple, used as a cache key).
+        """
+        page %= self.page_count
+        per_page = self.sheet.per_page
+        return tuple(self.images[page * per_page:(page + 1) * per_page])
+
     def update_display_option_text(self):
+        if self.grid and self.current_image is not None:
+            super().update_display_option_text(
+                "{}/{}".format(self.page + 1, self.page_count))
+            return
         if self.current_image is not None:
             image_number = image_index(self.current_image)
         else:
@@ -52,35 +91,219 @@ class ViewerModeOption(ModeOption):
         if len(self.images) > 0:
             self.current_image_index = len(self.images) - 1
 
+        self.open_framebuffer()
         self.kill_image_viewer()
         self.start_image_viewer()
 
     def exit(self):
         self.kill_image_viewer()
+        self.close_framebuffer()
+
+    def open_framebuffer(self):
+        if not framebuffer.available() or self.framebuffer is not None:
+            return
+        try:
+            self.framebuffer = framebuffer.Framebuffer()
+        except framebuffer.FramebufferError as e:
+            print("ERROR (viewer):", e, "(using fbi)")
+            return
+        self.frames = framebuffer.FrameCache(self.framebuffer,
+                                             self.load_picture)
+        self.sheet = ContactSheet(self.framebuffer.size)
+        self.pages = framebuffer.FrameCache(self.framebuffer, self.load_page,
+                                            GRID_CACHE_PAGES)
+
+    def close_framebuffer(self):
+        if self.framebuffer is None:
+            return
+        self.frames.stop()
+        self.pages.stop()
+        self.framebuffer.clear()
+        self.framebuffer.close()
+        self.framebuffer = self.frames = self.sheet = self.pages = None
+        self.grid = False
+
+    def load_picture(self, image_name):
+        """Opens the smallest copy of the picture that fills the screen."""
+        image_file = self.camera.thumbnails.path(image_name, 'screen',
+                                                 generate=False)
+        if image_file is None:
+            image_file = IMAGE_DIR + image_name
+        picture = framebuffer.Image.open(image_file)
+        # let libjpeg scale it down while decoding
+        picture.draft('RGB', self.framebuffer.size)
+        return picture
+
+    def load_page(self, image_names):
+        """Makes a page of thumbnails (see :class:`ContactSheet`). Pictures
+        without a thumbnail are drawn as placeholders until it has been made
+        in the background.
+        """
+        pictures = []
+        missing = []
+        for image_name in image_names:
+            image_file = self.camera.thumbnails.path(image_name, 'thumbnail',
+                                                     generate=False)
+            if image_file is None:
+                missing.append(image_name)
+                pictures.append(PLACEHOLDER)
+                continue
+            try:
+                pictures.append(framebuffer.Image.open(image_file))
+            except OSError as e:
+                print("ERROR (viewer {}):".format(image_name), e)
+                pictures.append(None)
+        if len(missing) > 0:
+            self.make_page_thumbnails(image_names, missing)
+        try:
+            return self.sheet.render(pictures)
+        finally:
+            for picture in pictures:
+                if picture is not None and picture is not PLACEHOLDER:
+                    picture.close()
+
+    def make_page_thumbnails(self, page_images, image_names):
+        """Makes the thumbnails of image_names on the post-processing queue,
+        then draws page_images again.
+        """
+        with self.generating_lock:
+            image_names = [n for n in image_names if n not in self.generating]
+            self.generating.update(image_names)
+        if len(image_names) == 0:
+            return
+
+        def generate():
+            self.camera.thumbnails.generate_all(image_names)
+            self.camera.events.post('viewer_thumbnails', self.thumbnails_made,
+                                    (page_images, image_names))
+
+        if self.camera.postprocess_queue.put(generate,
+                                             name="thumbnails") is None:
+            # the queue is full, try again when the page is next drawn
+            with self.generating_lock:
+                self.generating.difference_update(image_names)
+
+    def thumbnails_made(self, page_images, image_names):
+        with self.generating_lock:
+            self.generating.difference_update(image_names)
+        if self.pages is None:
+            return
+        self.pages.forget(page_images)
+        if self.grid and self.current_image is not None and \
+                self.page_images(self.page) == page_images:
+            self.show_page()
 
     def next(self):
+        if self.grid:
+            self.jump_pages(1)
+            return
         self.kill_image_viewer()
         self.increment_image_index()
         self.update_display_option_text()
         self.start_image_viewer()
 
     def previous(self):
+        if self.grid:
+            self.jump_pages(-1)
+            return
         self.kill_image_viewer()
         self.decrement_image_index()
         self.update_display_option_text()
         self.start_image_viewer()
 
+    def option1(self):
+        """Switches between one image and a grid of thumbnails."""
+        if self.pages is None:
+            return
+        self.grid = not self.grid
+        self.update_display_option_text()
+        self.start_image_viewer()
+
+    def option2(self):
+        """Goes back GRID_PAGE_JUMP pages in the grid, otherwise to the
+        first image.
+        """
+        if self.grid:
+            self.jump_pages(-GRID_PAGE_JUMP)
+        else:
+            self.jump_to_image(0)
+
+    def option3(self):
+        """Goes forward GRID_PAGE_JUMP pages in the grid, otherwise to the
+        last image taken.
+        """
+        if self.grid:
+            self.jump_pages(GRID_PAGE_JUMP)
+        else:
+            self.jump_to_image(self.camera.last_image_number)
+
+    def jump_pages(self, pages):
+        """Moves the grid forwards (or backwards) by pages, showing the
+        first image of the new page when we leave the grid.
+        """
+        if len(self.images) == 0:
+            return
+        page = (self.page + pages) % self.page_count
+        self.current_image_index = page * self.sheet.per_page
+        self.update_display_option_text()
+        self.start_image_viewer()
+
+    def jump_to_image(self, number):
+        """Shows image number (or the first one after it)."""
+        if len(self.images) == 0:
+            return
+        self.kill_image_viewer()
+        i = bisect.bisect_left(self.images, "image{:04}".format(number))
+        self.current_image_index = min(i, len(self.images) - 1)
+        self.update_display_option_text()
+        self.start_image_viewer()
+
     def kill_image_viewer(self):
-        subprocess.call(['sudo killall fbi'], shell=True)
+        if self.frames is None:
+            runner.call(['sudo', 'killall', '--quiet', 'fbi'])
 
     def start_image_viewer(self):
         if self.current_image is None:
             return
 
-        image_file = self.current_image
-        command = 'sudo fbi -autodown -T 1 {image}'.format(
-            image=IMAGE_DIR + image_file)
-        subprocess.call([command], shell=True)
+        if self.grid:
+            self.show_page()
+            return
+
+        if self.frames is not None:
+            self.show_frame()
+            return
+
+        # the screen sized copy is much quicker to decode
+        image_file = self.camera.thumbnails.path(self.current_image, 'screen')
+        if image_file is None:
+            image_file = IMAGE_DIR + self.current_image
+        runner.call(['sudo', 'fbi', '-autodown', '-T', '1', image_file],
+                    capture_stderr=False)
+
+    def show_frame(self):
+        try:
+            self.framebuffer.show(self.frames.get(self.current_image))
+        except (OSError, ValueError) as e:
+            print("ERROR (viewer):", e)
+            return
+        # get the pictures either side ready
+        neighbours = []
+        for offset in range(1, framebuffer.VIEWER_PREFETCH + 1):
+            for i in (self.current_image_index + offset,
+                      self.current_image_index - offset):
+                neighbours.append(self.images[i % len(self.images)])
+        self.frames.prefetch(neighbours)
+
+    def show_page(self):
+        try:
+            self.framebuffer.show(
+                self.pages.get(self.page_images(self.page)))
+        except (OSError, ValueError) as e:
+            print("ERROR (viewer):", e)
+            return
+        self.pages.prefetch([self.page_images(self.page + 1),
+                             self.page_images(self.page - 1)])
 
     def increment_image_index(self):
         if len(self.images) == 0:
@@ -99,17 +322,3 @@ class ViewerModeOption(ModeOption):
         else:
             self.current_image_index = \
                 (self.current_image_index - 1) % len(self.images)
-
-
-def image_index(image_string):
-    """Returns the index of the image given. For example: image0010.jpg -> 10
-    """
-    #return int(image_string.replace("image", "").replace(".jpg", ""))
-    return int(re.sub(r'image([0-9]{4}).*', r'\1', image_string))
-
-
-def video_index(video_string):
-    """Returns the index of the video given. For example: video0010.jpg -> 10
-    """
-    #return int(video_string.replace("video", "").replace(".jpg", ""))
-    return int(re.sub(r'video([0-9]{4}).*', r'\1', video_string))
@@ -0,0 +1,76 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from snapcamera import runner
+from snapcamera.burst import BurstCapture, JPEG_END
+
+# writes count JPEGs to stdout, each in two writes split inside the end
+# marker, like a camera whose frames arrive in pieces
+FAKE_CAMERA = """
+import sys, time
+for i in range({count}):
+    frame = b'\\xff\\xd8' + b'frame%d ' % i * 1000 + b'\\xff\\xd9'
+    sys.stdout.buffer.write(frame[:-1])
+    sys.stdout.buffer.flush()
+    time.sleep(0.005)
+    sys.stdout.buffer.write(frame[-1:])
+    sys.stdout.buffer.flush()
+"""
+
+
+def fake_camera(count):
+    return [sys.executable, '-c', FAKE_CAMERA.format(count=count)]
+
+
+class TestBurstCapture(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def filename_for(self, i):
+        return os.path.join(self.directory, "image{:04}.jpg".format(i + 1))
+
+    def frames(self):
+        frames = []
+        for name in sorted(os.listdir(self.directory)):
+            with open(os.path.join(self.directory, name), 'rb') as f:
+                frames.append(f.read())
+        return frames
+
+    def test_splits_the_stream_into_frames(self):
+        burst = BurstCapture(fake_camera(8), 5)
+        fps = burst.run(self.filename_for)
+        self.assertEqual(burst.frames_written, 5)
+        self.assertIsNotNone(fps)
+        frames = self.frames()
+        self.assertEqual(len(frames), 5)
+        for i, frame in enumerate(frames):
+            self.assertTrue(frame.startswith(b'\xff\xd8frame%d ' % i))
+            self.assertTrue(frame.endswith(JPEG_END))
+            self.assertEqual(frame.count(JPEG_END), 1)
+
+    def test_camera_stops_early(self):
+        burst = BurstCapture(fake_camera(3), 5)
+        burst.run(self.filename_for)
+        self.assertEqual(burst.frames_written, 3)
+        self.assertEqual(len(self.frames()), 3)
+
+    def test_one_frame_has_no_frame_rate(self):
+        burst = BurstCapture(fake_camera(1), 5)
+        self.assertIsNone(burst.run(self.filename_for))
+
+    def test_records_how_long_it_took(self):
+        burst = BurstCapture(fake_camera(8), 5)
+        burst.run(self.filename_for)
+        record = runner.history(sys.executable)[-1]
+        self.assertEqual(record.returncode, 0)
+        self.assertGreater(record.seconds, 0)
+        self.assertLess(record.seconds, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from snapcamera import capture
+from snapcamera.capture import WarmStillCapture
+
+# takes a "picture" for every line on stdin and stops on "x", numbering
+# frames from --framestart (0 if it isn't given) like raspistill
+FAKE_RASPISTILL = """
+import os, sys
+args = sys.argv[1:]
+frame = int(args[args.index('--framestart') + 1]) \\
+    if '--framestart' in args else 0
+output = args[args.index('--output') + 1]
+for line in sys.stdin:
+    if line.strip() == 'x':
+        break
+    filename = output % frame
+    with open(filename + '~', 'wb') as f:
+        f.write(b'picture %d' % frame)
+    os.rename(filename + '~', filename)
+    frame += 1
+"""
+
+
+class FakeWarmStillCapture(WarmStillCapture):
+    def build_command(self):
+        return [sys.executable, '-c', FAKE_RASPISTILL] + \
+            super().build_command()[1:]
+
+
+class TestWarmStillCapture(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.capture_dir = os.path.join(self.directory, "capture")
+        os.mkdir(self.capture_dir)
+        self.timeout = capture.WARM_CAPTURE_TIMEOUT
+        capture.WARM_CAPTURE_TIMEOUT = 2
+
+    def tearDown(self):
+        capture.WARM_CAPTURE_TIMEOUT = self.timeout
+        shutil.rmtree(self.directory)
+
+    def read(self, name):
+        with open(os.path.join(self.directory, name), 'rb') as f:
+            return f.read()
+
+    def test_captures(self):
+        warm = FakeWarmStillCapture(capture_dir=self.capture_dir)
+        try:
+            for name in ("a.jpg", "b.jpg", "c.jpg"):
+                self.assertEqual(
+                    warm.capture(os.path.join(self.directory, name)), 0)
+            self.assertTrue(warm.is_running)
+        finally:
+            warm.stop()
+        self.assertFalse(warm.is_running)
+        self.assertEqual([self.read(name) for name in
+                          ("a.jpg", "b.jpg", "c.jpg")],
+                         [b'picture 1', b'picture 2', b'picture 3'])
+        self.assertEqual(os.listdir(self.capture_dir), [])
+
+    def test_restarts_with_new_options(self):
+        warm = FakeWarmStillCapture(capture_dir=self.capture_dir)
+        try:
+            warm.capture(os.path.join(self.directory, "a.jpg"))
+            first = warm.process
+            self.assertEqual(
+                warm.capture(os.path.join(self.directory, "b.jpg"),
+                             options=['--ifx', 'sketch']), 0)
+            self.assertIsNot(warm.process, first)
+        finally:
+            warm.stop()
+        self.assertEqual(self.read("b.jpg"), b'picture 1')
+
+    def test_process_exits(self):
+        warm = FakeWarmStillCapture(capture_dir=self.capture_dir)
+        warm.start()
+        warm.process.stdin.write(b"x\n")
+        warm.process.stdin.flush()
+        warm.process.wait()
+        # started again by capture
+        self.assertEqual(
+            warm.capture(os.path.join(self.directory, "a.jpg")), 0)
+        warm.stop()
+
+    def test_process_fails(self):
+        class BrokenCapture(WarmStillCapture):
+            def build_command(self):
+                return [sys.executable, '-c', 'import sys; sys.exit(1)']
+        warm = BrokenCapture(capture_dir=self.capture_dir)
+        self.assertEqual(
+            warm.capture(os.path.join(self.directory, "a.jpg")), 1)
+        self.assertFalse(warm.is_running)
+        self.assertFalse(os.path.exists(os.path.join(self.directory,
+                                                     "a.jpg")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import threading
+import unittest
+from snapcamera.capture_queue import CaptureQueue
+
+
+class TestCaptureQueue(unittest.TestCase):
+    def setUp(self):
+        self.queue = CaptureQueue(max_pending=3)
+        self.ran = []
+
+    def tearDown(self):
+        self.queue.stop()
+
+    def test_runs_in_order(self):
+        for i in range(3):
+            self.queue.put(self.ran.append, (i,))
+        self.queue.start()
+        self.assertTrue(self.queue.join(5))
+        self.assertEqual(self.ran, [0, 1, 2])
+
+    def test_drops_when_full(self):
+        for i in range(3):
+            self.assertIsNotNone(self.queue.put(self.ran.append, (i,)))
+        self.assertIsNone(self.queue.put(self.ran.append, (3,)))
+        self.assertEqual(self.queue.dropped, 1)
+        self.queue.start()
+        self.queue.join(5)
+        self.assertEqual(self.ran, [0, 1, 2])
+
+    def test_coalesce(self):
+        first = self.queue.put(self.ran.append, ('video',), name='video',
+                               coalesce=True)
+        second = self.queue.put(self.ran.append, ('video',), name='video',
+                                coalesce=True)
+        self.assertIs(first, second)
+        self.assertEqual(self.queue.depth, 1)
+
+    def test_error_doesnt_stop_the_worker(self):
+        def fail():
+            raise ValueError("broken")
+        failed = self.queue.put(fail, name='broken')
+        self.queue.put(self.ran.append, (1,))
+        self.queue.start()
+        self.queue.join(5)
+        self.assertIsInstance(failed.error, ValueError)
+        self.assertEqual(self.ran, [1])
+
+    def test_depth_changes(self):
+        depths = []
+        queue = CaptureQueue(on_depth_change=depths.append)
+        queue.put(self.ran.append, (0,))
+        queue.put(self.ran.append, (1,))
+        queue.start()
+        queue.join(5)
+        queue.stop()
+        self.assertEqual(depths, [1, 2, 1, 0])
+
+    def test_summary(self):
+        release = threading.Event()
+        self.queue.put(release.wait, (5,))
+        self.queue.put(self.ran.append, (0,), name='other')
+        self.queue.start()
+        release.set()
+        self.queue.join(5)
+        summary = self.queue.summary()
+        self.assertEqual(summary['picture']['requests'], 1)
+        self.assertEqual(summary['other']['requests'], 1)
+        self.assertGreaterEqual(summary['other']['wait'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
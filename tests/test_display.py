@@ -0,0 +1,92 @@
+import unittest
+from snapcamera.display import ShadowDisplay, FakeLCD
+
+
+class TestShadowDisplay(unittest.TestCase):
+    def setUp(self):
+        self.lcd = FakeLCD()
+        self.display = ShadowDisplay(self.lcd)
+        self.display.clear()
+
+    def shows(self):
+        return ["".join(c if isinstance(c, str) else '#' for c in line)
+                for line in self.lcd.cells]
+
+    def sent(self):
+        """Commands and bytes sent since the last call."""
+        sent = (self.lcd.commands, self.lcd.bytes)
+        self.lcd.commands = self.lcd.bytes = 0
+        return sent
+
+    def test_only_changes_are_sent(self):
+        self.display.write(0, 0, "t:0001")
+        self.sent()
+        self.display.write(0, 0, "t:0002")
+        self.assertEqual(self.sent(), (1, 1))
+        self.assertEqual(self.shows()[0], "t:0002          ")
+
+    def test_unchanged_text_sends_nothing(self):
+        self.display.write(8, 1, "camera")
+        self.sent()
+        self.display.write(8, 1, "camera")
+        self.assertEqual(self.sent(), (0, 0))
+
+    def test_close_runs_are_joined(self):
+        self.display.write(0, 0, "abcd")
+        self.sent()
+        # b and d change, c in between is sent again rather than moving
+        # the cursor
+        self.display.write(0, 0, "aBcD")
+        self.assertEqual(self.sent(), (1, 3))
+        self.assertEqual(self.shows()[0][:4], "aBcD")
+
+    def test_cursor_continues_from_the_last_run(self):
+        self.display.write(0, 0, "ab")
+        self.assertEqual(self.sent(), (1, 2))
+        self.display.write(2, 0, "cd")
+        self.assertEqual(self.sent(), (0, 2))
+
+    def test_custom_bitmaps(self):
+        self.display.write_custom_bitmap(7, 0, 3)
+        self.assertEqual(self.lcd.cells[0][7], 3)
+        self.assertEqual(self.display.text.split("\n")[0][7], '#')
+
+    def test_clipped_at_the_edge(self):
+        self.display.write(14, 1, "long text")
+        self.assertEqual(self.shows()[1], " " * 14 + "lo")
+
+    def test_invalidate_redraws_everything(self):
+        self.display.write(0, 0, "x")
+        self.sent()
+        self.display.invalidate()
+        self.display.flush()
+        self.assertEqual(self.sent()[1], 32)
+
+    def test_paused_updates_are_drawn_on_resume(self):
+        self.display.pause()
+        self.display.write(0, 1, "paused")
+        self.assertEqual(self.shows()[1].strip(), "")
+        self.display.resume()
+        self.assertEqual(self.shows()[1].strip(), "paused")
+
+    def test_commands(self):
+        self.display.write(0, 0, "a")
+        self.sent()
+        self.display.command('backlight_on')
+        self.assertEqual(self.sent(), (1, 0))
+        self.assertEqual(self.display.commands_sent, 2)
+
+    def test_render_thread_draws_the_latest_state(self):
+        self.display.start()
+        try:
+            for i in range(20):
+                self.display.write(0, 0, "{:04}".format(i))
+            self.assertTrue(self.display.join(5))
+        finally:
+            self.display.stop()
+        self.assertEqual(self.shows()[0][:4], "0019")
+        self.assertLess(self.display.renders, 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
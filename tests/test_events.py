@@ -0,0 +1,103 @@
+import threading
+import unittest
+from snapcamera import events
+from snapcamera.events import (
+    EventDispatcher,
+    SHUTTER_PRIORITY,
+    OPTION_PRIORITY,
+    MODE_PRIORITY,
+)
+
+
+class TestEventDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.idle = True
+        self.dispatcher = EventDispatcher(is_idle=lambda: self.idle)
+        self.handled = []
+
+    def tearDown(self):
+        self.dispatcher.stop()
+
+    def post(self, name, priority=OPTION_PRIORITY, **kwargs):
+        return self.dispatcher.post(name, self.handled.append, (name,),
+                                    priority=priority, **kwargs)
+
+    def wait_for(self, count):
+        for i in range(500):
+            if len(self.handled) >= count:
+                return
+            threading.Event().wait(0.01)
+        self.fail("only {} of {} events handled".format(len(self.handled),
+                                                        count))
+
+    def test_most_important_first(self):
+        self.post('mode', MODE_PRIORITY)
+        self.post('option', OPTION_PRIORITY)
+        self.post('shutter', SHUTTER_PRIORITY)
+        self.post('option2', OPTION_PRIORITY)
+        self.dispatcher.start()
+        self.wait_for(4)
+        self.assertEqual(self.handled, ['shutter', 'option', 'option2',
+                                        'mode'])
+
+    def test_debounce(self):
+        self.assertIsNotNone(self.post('press', source='switch5',
+                                       debounce=10))
+        self.assertIsNone(self.post('press', source='switch5', debounce=10))
+        # other sources aren't affected
+        self.assertIsNotNone(self.post('press', source='switch6',
+                                       debounce=10))
+        self.assertEqual(self.dispatcher.debounced, 1)
+
+    def test_waits_for_idle(self):
+        self.idle = False
+        self.post('mode', MODE_PRIORITY, wait_for_idle=True)
+        self.post('shutter', SHUTTER_PRIORITY)
+        self.dispatcher.start()
+        self.wait_for(1)
+        self.assertEqual(self.handled, ['shutter'])
+        self.idle = True
+        self.wait_for(2)
+        self.assertEqual(self.handled, ['shutter', 'mode'])
+
+    def test_busy_for_too_long(self):
+        timeout, events.EVENT_IDLE_TIMEOUT = events.EVENT_IDLE_TIMEOUT, 0.1
+        try:
+            self.idle = False
+            self.post('mode', MODE_PRIORITY, wait_for_idle=True)
+            self.dispatcher.start()
+            for i in range(500):
+                if self.dispatcher.expired > 0:
+                    break
+                threading.Event().wait(0.01)
+        finally:
+            events.EVENT_IDLE_TIMEOUT = timeout
+        self.idle = True
+        self.post('option')
+        self.wait_for(1)
+        self.assertEqual(self.handled, ['option'])
+        self.assertEqual(self.dispatcher.expired, 1)
+
+    def test_error_doesnt_stop_the_dispatcher(self):
+        def fail():
+            raise ValueError("broken")
+        self.dispatcher.post('broken', fail)
+        self.post('after')
+        self.dispatcher.start()
+        self.wait_for(1)
+        self.assertEqual(self.handled, ['after'])
+
+    def test_summary(self):
+        self.post('shutter', SHUTTER_PRIORITY)
+        self.dispatcher.start()
+        self.wait_for(1)
+        # the history is added to just after the action
+        for i in range(500):
+            if self.dispatcher.summary():
+                break
+            threading.Event().wait(0.01)
+        self.assertEqual(self.dispatcher.summary()['shutter']['events'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
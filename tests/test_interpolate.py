@@ -0,0 +1,58 @@
+import unittest
+from snapcamera import interpolate
+from snapcamera.interpolate import WEIGHT_ONE, crossfade_weights
+
+
+class TestCrossfadeWeights(unittest.TestCase):
+    def test_evenly_spaced(self):
+        self.assertEqual(crossfade_weights(1), [WEIGHT_ONE // 2])
+        self.assertEqual(crossfade_weights(3), [64, 128, 192])
+
+    def test_strictly_between(self):
+        weights = crossfade_weights(10)
+        self.assertEqual(len(weights), 10)
+        self.assertEqual(weights, sorted(weights))
+        self.assertTrue(0 < weights[0] and weights[-1] < WEIGHT_ONE)
+
+    def test_none(self):
+        self.assertEqual(crossfade_weights(0), [])
+
+
+@unittest.skipUnless(interpolate.available(), "needs numpy")
+class TestCrossfader(unittest.TestCase):
+    def test_blend(self):
+        fader = interpolate.Crossfader(4)
+        fader.push(bytes([0, 0, 255, 100]))
+        fader.push(bytes([255, 0, 255, 200]))
+        self.assertEqual(fader.blend(0), bytes([0, 0, 255, 100]))
+        self.assertEqual(fader.blend(WEIGHT_ONE), bytes([255, 0, 255, 200]))
+        self.assertEqual(fader.blend(WEIGHT_ONE // 2),
+                         bytes([128, 0, 255, 150]))
+
+    def test_matches_floating_point(self):
+        fader = interpolate.Crossfader(256)
+        previous, following = bytes(range(256)), bytes(range(255, -1, -1))
+        fader.push(previous)
+        fader.push(following)
+        for weight in crossfade_weights(10):
+            expected = bytes(
+                int(a + (b - a) * weight / WEIGHT_ONE + 0.5)
+                for a, b in zip(previous, following))
+            blend = fader.blend(weight)
+            self.assertTrue(all(abs(x - y) <= 1
+                                for x, y in zip(blend, expected)))
+
+    def test_crossfade(self):
+        frames = [bytes([0]), bytes([90]), bytes([180])]
+        faded = list(interpolate.crossfade(frames, 2))
+        self.assertEqual(faded, [bytes([0]), bytes([30]), bytes([60]),
+                                 bytes([90]), bytes([120]), bytes([150]),
+                                 bytes([180])])
+
+    def test_crossfade_without_in_between_frames(self):
+        frames = [bytes([0]), bytes([90])]
+        self.assertEqual(list(interpolate.crossfade(frames, 0)), frames)
+
+
+if __name__ == '__main__':
+    unittest.main()
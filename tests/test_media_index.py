@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import unittest
+from snapcamera.media_index import MediaIndex, image_index, video_index
+
+
+class TestMediaIndex(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for name in ("image0002.jpg", "image0001.jpg", ".hidden",
+                     "image0003.jpg~"):
+            self.touch(name)
+        self.index = MediaIndex(self.directory, "image", image_index)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def touch(self, name):
+        open(os.path.join(self.directory, name), 'w').close()
+
+    def changed_elsewhere(self):
+        # make sure the mtime moves, however coarse the filesystem's is
+        stat = os.stat(self.directory)
+        os.utime(self.directory, ns=(stat.st_atime_ns,
+                                     stat.st_mtime_ns + 10**9))
+
+    def test_sorted_media_files(self):
+        self.assertEqual(list(self.index), ["image0001.jpg", "image0002.jpg"])
+        self.assertEqual(self.index.last_number, 2)
+        self.assertEqual(self.index.index("image0002.jpg"), 1)
+        self.assertRaises(ValueError, self.index.index, ".hidden")
+
+    def test_add_and_remove(self):
+        self.touch("image0003.jpg")
+        self.index.add("image0003.jpg")
+        self.assertEqual(self.index.last, "image0003.jpg")
+        self.assertEqual(self.index.last_number, 3)
+        os.remove(os.path.join(self.directory, "image0003.jpg"))
+        self.index.remove("image0003.jpg")
+        self.assertEqual(self.index.last_number, 2)
+        self.assertEqual(len(self.index), 2)
+
+    def test_refreshes_when_changed_elsewhere(self):
+        self.touch("image0010_0001.jpg")
+        os.remove(os.path.join(self.directory, "image0001.jpg"))
+        self.changed_elsewhere()
+        self.assertEqual(list(self.index),
+                         ["image0002.jpg", "image0010_0001.jpg"])
+        self.assertEqual(self.index.last_number, 10)
+
+    def test_doesnt_list_when_unchanged(self):
+        self.index.files.append("image9999.jpg")  # not on the card
+        self.assertEqual(self.index.last, "image9999.jpg")
+        self.index.refresh(force=True)
+        self.assertEqual(self.index.last, "image0002.jpg")
+
+    def test_no_numbered_files(self):
+        index = MediaIndex(self.directory, "video", video_index)
+        self.assertEqual(index.last_number, 0)
+
+
+class TestIndexes(unittest.TestCase):
+    def test_numbers(self):
+        self.assertEqual(image_index("image0010.jpg"), 10)
+        self.assertEqual(image_index("image0012_0003.jpg"), 12)
+        self.assertEqual(video_index("video0007.mp4"), 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
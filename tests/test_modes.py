@@ -0,0 +1,114 @@
+import sys
+import unittest
+from snapcamera import modes
+from snapcamera.mode_option import ModeOption
+from snapcamera.modes import ModeError, ModeList
+
+
+class PluginModeOption(ModeOption):
+    pass
+
+
+class FakeEntryPoint(object):
+    def __init__(self, name, value):
+        self.name, self.value = name, value
+
+
+class FakeMetadata(object):
+    """Stands in for importlib.metadata, counting the scans."""
+    def __init__(self, *entry_points):
+        self.found = list(entry_points)
+        self.scans = 0
+
+    def entry_points(self):
+        self.scans += 1
+        return {modes.MODE_ENTRY_POINT_GROUP: self.found}
+
+
+class TestModes(unittest.TestCase):
+    def setUp(self):
+        self.registered = dict(modes._modes)
+        self.metadata = modes.metadata
+        self.fake_metadata = FakeMetadata(
+            FakeEntryPoint('plugin', __name__ + ':PluginModeOption'))
+        modes.metadata = self.fake_metadata
+        modes._entry_points_loaded = False
+
+    def tearDown(self):
+        modes._modes.clear()
+        modes._modes.update(self.registered)
+        modes.metadata = self.metadata
+        modes._entry_points_loaded = False
+
+    def test_built_in_modes_first(self):
+        names = modes.names()
+        self.assertEqual(names[:2], ['camera', 'effects'])
+        self.assertIn('viewer', names)
+        self.assertEqual(modes.mode_info('ir').label, 'IR')
+
+    def test_register_mode(self):
+        modes.register_mode('plugin', PluginModeOption, label='plug')
+        self.assertEqual(modes.names()[-1], 'plugin')
+        self.assertIs(modes.mode_class('plugin'), PluginModeOption)
+        self.assertEqual(modes.mode_info('plugin').label, 'plug')
+
+    def test_imported_when_needed(self):
+        modes.register_mode('plugin', __name__ + ':PluginModeOption')
+        self.assertIs(modes.mode_class('plugin'), PluginModeOption)
+
+    def test_unknown_mode(self):
+        self.assertRaises(ModeError, modes.mode_info, 'nonexistent')
+        modes.register_mode('broken', 'snapcamera.nonexistent:Mode')
+        self.assertRaises(ModeError, modes.mode_class, 'broken')
+
+    def test_mode_list(self):
+        modes.register_mode('plugin', PluginModeOption, label='plug')
+        camera = object()
+        mode_list = ModeList(camera, ['camera', 'plugin'])
+        self.assertEqual(len(mode_list), 2)
+        self.assertEqual(mode_list.index('plugin'), 1)
+        self.assertRaises(ModeError, mode_list.index, 'viewer')
+        self.assertEqual(mode_list.loaded, [])
+        mode = mode_list[1]
+        self.assertEqual(mode['name'], 'plug')
+        self.assertIsInstance(mode['option'], PluginModeOption)
+        self.assertIs(mode['option'].camera, camera)
+        self.assertIs(mode_list[1], mode)
+        self.assertEqual(mode_list.loaded, ['plugin'])
+
+    def test_entry_points_only_scanned_when_needed(self):
+        self.assertNotIn('plugin', modes.names())
+        modes.mode_info('viewer')
+        mode_list = ModeList(object())
+        self.assertEqual(mode_list.step(0, 1), 1)
+        self.assertEqual(self.fake_metadata.scans, 0)
+        self.assertIs(modes.mode_class('plugin'), PluginModeOption)
+        self.assertEqual(self.fake_metadata.scans, 1)
+        self.assertEqual(modes.names()[-1], 'plugin')
+        self.assertRaises(ModeError, modes.mode_info, 'nonexistent')
+        self.assertEqual(self.fake_metadata.scans, 1)
+
+    def test_stepping_past_the_last_mode(self):
+        mode_list = ModeList(object())
+        last = len(mode_list) - 1
+        self.assertEqual(mode_list.step(last, 1), last + 1)
+        self.assertEqual(mode_list.names[-1], 'plugin')
+        self.assertEqual(mode_list.step(last + 1, 1), 0)
+        self.assertEqual(mode_list.step(0, -1), last + 1)
+        self.assertEqual(self.fake_metadata.scans, 1)
+
+    def test_starting_in_an_entry_point_mode(self):
+        mode_list = ModeList(object())
+        self.assertEqual(mode_list.names.index('viewer'),
+                         mode_list.index('viewer'))
+        self.assertEqual(mode_list.index('plugin'), len(mode_list) - 1)
+        self.assertRaises(ModeError, ModeList(object(), ['camera']).index,
+                          'plugin')
+
+    def test_modes_arent_imported_until_used(self):
+        ModeList(object())
+        self.assertNotIn('snapcamera.viewer', sys.modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
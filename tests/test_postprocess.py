@@ -0,0 +1,102 @@
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from snapcamera.postprocess import VideoJob, VideoJobQueue
+
+
+class TestVideoJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.state_file = os.path.join(self.directory, ".jobs.json")
+        self.converted = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def h264(self, name):
+        filename = os.path.join(self.directory, name + ".h264")
+        open(filename, 'wb').close()
+        return filename
+
+    def convert(self, job):
+        self.converted.append(job.h264filename)
+        return 0
+
+    def saved_jobs(self):
+        with open(self.state_file) as state_file:
+            return [job['h264filename'] for job in json.load(state_file)]
+
+    def wait_for(self, done, count):
+        for i in range(500):
+            if len(done) >= count:
+                return
+            threading.Event().wait(0.01)
+        self.fail("only {} of {} jobs finished".format(len(done), count))
+
+    def test_converts_in_order(self):
+        done = []
+        queue = VideoJobQueue(self.convert, on_done=done.append,
+                              state_file=self.state_file)
+        queue.start()
+        filenames = [self.h264("video{}".format(i)) for i in range(3)]
+        for filename in filenames:
+            queue.submit(filename, length=1000)
+        self.wait_for(done, 3)
+        queue.stop()
+        self.assertEqual(self.converted, filenames)
+        self.assertEqual([job.status for job in done], [0, 0, 0])
+        self.assertEqual(self.saved_jobs(), [])
+        self.assertFalse(queue.is_busy)
+
+    def test_jobs_submitted_before_start(self):
+        done = []
+        queue = VideoJobQueue(self.convert, on_done=done.append,
+                              state_file=self.state_file)
+        filename = self.h264("video0")
+        queue.submit(filename, effect='sketch')
+        queue.start()
+        self.wait_for(done, 1)
+        queue.stop()
+        # converted once, not once more from the state file
+        self.assertEqual(self.converted, [filename])
+        self.assertEqual(done[0].effect, 'sketch')
+
+    def test_resumes_unfinished_jobs(self):
+        filenames = [self.h264("video0"), self.h264("video1")]
+        queue = VideoJobQueue(self.convert, state_file=self.state_file)
+        for filename in filenames:
+            queue.submit(filename, length=2000)
+        self.assertEqual(self.saved_jobs(), filenames)
+        # the camera stopped before converting them, and video0.h264 was
+        # removed meanwhile
+        os.remove(filenames[0])
+        done = []
+        resumed = VideoJobQueue(self.convert, on_done=done.append,
+                                state_file=self.state_file)
+        resumed.start()
+        self.wait_for(done, 1)
+        resumed.stop()
+        self.assertEqual(self.converted, [filenames[1]])
+
+    def test_failures_are_counted(self):
+        done = []
+        queue = VideoJobQueue(lambda job: 1, on_done=done.append,
+                              state_file=self.state_file)
+        queue.start()
+        queue.submit(self.h264("video0"))
+        self.wait_for(done, 1)
+        queue.stop()
+        self.assertEqual(queue.failed, 1)
+
+    def test_job_round_trip(self):
+        job = VideoJob("/videos/video0001.h264", 3000, 'cartoon')
+        copy = VideoJob.from_dict(job.to_dict())
+        self.assertEqual(copy.mp4filename, "/videos/video0001.mp4")
+        self.assertEqual((copy.length, copy.effect), (3000, 'cartoon'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+import subprocess
+from snapcamera import runner
+
+
+def python(code):
+    return [sys.executable, '-c', code]
+
+
+class TestRunner(unittest.TestCase):
+    def test_call(self):
+        argv = python("import sys; sys.stderr.write('oops'); sys.exit(3)")
+        self.assertEqual(runner.call(argv), 3)
+        last = runner.history(sys.executable)[-1]
+        self.assertEqual(last.argv, argv)
+        self.assertEqual(last.returncode, 3)
+        self.assertEqual(last.stderr, 'oops')
+        self.assertGreaterEqual(last.seconds, 0)
+
+    def test_missing_program(self):
+        self.assertEqual(runner.call(['/nonexistent/program']), 127)
+        self.assertEqual(runner.history('/nonexistent/program')[-1]
+                         .returncode, 127)
+
+    def test_timeout(self):
+        self.assertNotEqual(runner.call(python("import time; time.sleep(10)"),
+                                        timeout=0.2), 0)
+
+    def test_stderr_is_trimmed(self):
+        runner.call(python("import sys; sys.stderr.write('x' * 10000)"))
+        self.assertEqual(len(runner.history(sys.executable)[-1].stderr),
+                         runner.STDERR_KEEP)
+
+    def test_check_output(self):
+        self.assertEqual(runner.check_output(python("print('hello')")),
+                         b'hello\n')
+        self.assertRaises(subprocess.CalledProcessError, runner.check_output,
+                          python("import sys; sys.exit(1)"))
+
+    def test_pipeline(self):
+        status = runner.call_pipeline([
+            python("print('hello')"),
+            python("import sys; sys.exit(sys.stdin.read() != 'hello\\n')")])
+        self.assertEqual(status, 0)
+
+    def test_background_child_doesnt_hold_up_call(self):
+        # like fbi -autodown, which leaves a child running with our stderr
+        argv = python("import subprocess, sys; subprocess.Popen("
+                      "[sys.executable, '-c', 'import time; time.sleep(5)'])")
+        start = time.monotonic()
+        self.assertEqual(runner.call(argv, capture_stderr=False), 0)
+        self.assertLess(time.monotonic() - start, 4)
+
+    def test_pipeline_with_a_lot_of_stderr(self):
+        # the first program fills its stderr pipe before it finishes
+        status = runner.call_pipeline([
+            python("import sys; sys.stderr.write('x' * 1000000); "
+                   "print('hello')"),
+            python("import sys; sys.stdin.read()")])
+        self.assertEqual(status, 0)
+        self.assertEqual(len(runner.history(sys.executable)[-1].stderr),
+                         runner.STDERR_KEEP)
+
+    def test_remove_file(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, "video0001.h264")
+            open(filename, 'w').close()
+            self.assertEqual(runner.remove_file(filename), 0)
+            self.assertFalse(os.path.exists(filename))
+            self.assertEqual(runner.remove_file(filename), 1)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_summary(self):
+        runner.call(python("import sys; sys.exit(1)"))
+        program = runner.summary()[sys.executable]
+        self.assertGreaterEqual(program['calls'], 1)
+        self.assertGreaterEqual(program['failures'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from snapcamera import stack
+from snapcamera.stack import StackError, Stacker
+try:
+    import numpy
+    from PIL import Image
+except ImportError:
+    numpy = Image = None
+
+
+def frame(*values):
+    """A 1x3 pixel RGB frame."""
+    return numpy.array([[[v, v, v] for v in values]], dtype=numpy.uint8)
+
+
+@unittest.skipUnless(stack.available(), "needs numpy and PIL")
+class TestStacker(unittest.TestCase):
+    def stack(self, mode, frames):
+        stacker = Stacker(mode)
+        for values in frames:
+            stacker.add(frame(*values))
+        return numpy.asarray(stacker.result())[0, :, 0].tolist()
+
+    def test_mean(self):
+        self.assertEqual(self.stack('mean', [(0, 10, 255), (1, 20, 255),
+                                             (2, 31, 255)]),
+                         [1, 20, 255])
+
+    def test_mean_doesnt_overflow(self):
+        self.assertEqual(self.stack('mean', [(255, 255, 0)] * 300),
+                         [255, 255, 0])
+
+    def test_max(self):
+        self.assertEqual(self.stack('max', [(0, 200, 5), (100, 20, 5),
+                                            (50, 10, 6)]),
+                         [100, 200, 6])
+
+    def test_median_ignores_outliers(self):
+        frames = [(100, 30, 200)] * 40
+        frames[10] = frames[25] = (255, 255, 0)
+        result = self.stack('median', frames)
+        for value, expected in zip(result, (100, 30, 200)):
+            self.assertLessEqual(abs(value - expected), 2)
+
+    def test_unknown_mode(self):
+        self.assertRaises(StackError, Stacker, 'sum')
+
+    def test_frames_must_match(self):
+        stacker = Stacker('max')
+        stacker.add(frame(1, 2, 3))
+        self.assertRaises(StackError, stacker.add, frame(1, 2))
+
+    def test_nothing_stacked(self):
+        self.assertRaises(StackError, Stacker('mean').result)
+
+
+@unittest.skipUnless(stack.available(), "needs numpy and PIL")
+class TestLiveStack(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for i in range(3):
+            Image.new('RGB', (64, 48), (i * 50, 0, 0)).save(
+                os.path.join(self.directory, "f{}.png".format(i)))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_saved_when_the_queue_is_full(self):
+        class FullQueue(object):
+            def put(self, action, args=tuple(), name=None):
+                return None
+        saved = threading.Event()
+        live_stack = stack.LiveStack(7, 'max', FullQueue(),
+                                     image_dir=self.directory,
+                                     on_save=lambda name: saved.set())
+        live_stack.add(["f0.png", "f1.png", "f2.png"])
+        live_stack.finish()
+        self.assertTrue(saved.wait(5))
+        with Image.open(os.path.join(self.directory,
+                                     "image0007-maxstack.jpg")) as result:
+            self.assertEqual(result.size, (64, 48))
+        self.assertEqual(live_stack.stacker.frames, 3)
+
+    def test_scaled_down(self):
+        stacker = Stacker('mean', box=(32, 32))
+        stacker.add_file(os.path.join(self.directory, "f1.png"))
+        self.assertEqual(stacker.shape, (24, 32, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+import os
+import shutil
+import tempfile
+import unittest
+from snapcamera.backend import CaptureSettings, still_size_fraction
+from snapcamera.storage import StorageEstimator
+from snapcamera.timelapse import (
+    TIMELAPSE_QUALITY_STEPS,
+    TimelapseRun,
+    plan_timelapse,
+)
+
+MB = 1024 * 1024
+KEY = ('timelapse', 'none')
+
+
+class TestPlanTimelapse(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.storage = StorageEstimator(self.directory, default_size=2 * MB)
+        self.settings = CaptureSettings('none', 'auto', False)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def plan(self, free, frames):
+        self.storage.free_bytes = free
+        return plan_timelapse(self.storage, KEY, frames, self.settings,
+                              spare=0)
+
+    def test_default_quality_if_it_fits(self):
+        plan = self.plan(1000 * MB, 100)
+        self.assertTrue(plan.fits)
+        self.assertEqual(plan.settings, self.settings)
+        self.assertEqual(plan.frame_size, 2 * MB)
+        self.assertEqual(plan.free_at_end, 800 * MB)
+
+    def test_lowers_the_quality_to_fit(self):
+        plan = self.plan(150 * MB, 100)
+        self.assertTrue(plan.fits)
+        self.assertEqual((plan.settings.quality, plan.settings.resolution),
+                         (70, None))
+        self.assertEqual(plan.settings.effect, 'none')
+
+    def test_lowers_the_resolution_after_the_quality(self):
+        plan = self.plan(50 * MB, 100)
+        self.assertTrue(plan.fits)
+        self.assertIsNotNone(plan.settings.resolution)
+
+    def test_smallest_if_nothing_fits(self):
+        plan = self.plan(1 * MB, 1000)
+        self.assertFalse(plan.fits)
+        quality, resolution = TIMELAPSE_QUALITY_STEPS[-1]
+        self.assertEqual(plan.settings.quality, quality)
+        self.assertEqual(plan.settings.resolution, resolution)
+        self.assertIn("won't fit", plan.describe())
+
+    def test_spare_space_is_left(self):
+        self.storage.free_bytes = 210 * MB
+        plan = plan_timelapse(self.storage, KEY, 100, self.settings,
+                              spare=20 * MB)
+        self.assertEqual(plan.settings.quality, 70)
+
+    def test_uses_measured_quality_sizes(self):
+        for quality, size in ((None, 2000000), (70, 1800000)):
+            filename = os.path.join(self.directory, "image.jpg")
+            with open(filename, 'wb') as image:
+                image.write(b'\0' * size)
+            self.storage.record_quality(quality, filename)
+        self.assertAlmostEqual(self.storage.quality_size(70), 0.9)
+        settings = self.settings._replace(quality=70)
+        self.assertAlmostEqual(still_size_fraction(settings, self.storage),
+                               0.9)
+        # at the guessed 0.62 quality 70 would fit, measured it doesn't
+        plan = self.plan(150 * MB, 100)
+        self.assertEqual(plan.settings.quality, 50)
+
+
+class TestTimelapseRun(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.state_file = os.path.join(self.directory, "timelapse.json")
+        self.settings = CaptureSettings('none', 'auto', False, 70,
+                                        (1920, 1440))
+        self.taken = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def timelapse(self, frames, interval=10):
+        return TimelapseRun(12, frames, interval, self.settings,
+                            state_file=self.state_file)
+
+    def capture(self, image_name):
+        self.taken.append(image_name)
+        return 0
+
+    def test_takes_every_frame(self):
+        run = self.timelapse(3)
+        self.assertEqual(run.run(self.capture), 0)
+        self.assertEqual(self.taken, ["image0012_0001.jpg",
+                                      "image0012_0002.jpg",
+                                      "image0012_0003.jpg"])
+        self.assertEqual(run.remaining, 0)
+        self.assertFalse(os.path.exists(self.state_file))
+        with open(run.log_file) as log:
+            self.assertEqual(len(log.readlines()), 4)  # and the header
+
+    def test_failed_frames(self):
+        run = self.timelapse(3)
+        statuses = [0, 1, 0]
+        self.assertEqual(run.run(lambda name: statuses.pop(0)), 1)
+        self.assertEqual((run.frames_written, run.failed), (2, 1))
+
+    def test_stopped_and_resumed(self):
+        run = self.timelapse(5)
+
+        def capture(image_name):
+            self.capture(image_name)
+            if len(self.taken) == 2:
+                run.stop(keep_state=True)
+            return 0
+        run.run(capture)
+        resumed = TimelapseRun.load(self.state_file)
+        self.assertEqual((resumed.frames_written, resumed.remaining,
+                          resumed.resumed), (2, 3, 1))
+        resumed.run(self.capture)
+        self.assertEqual(self.taken[2:], ["image0012_0003.jpg",
+                                          "image0012_0004.jpg",
+                                          "image0012_0005.jpg"])
+        self.assertIsNone(TimelapseRun.load(self.state_file))
+
+    def test_quality_text(self):
+        run = self.timelapse(10)
+        run.settings = self.settings._replace(quality=None, resolution=None)
+        self.assertIsNone(run.quality_text())
+        run.settings = self.settings._replace(resolution=None)
+        self.assertEqual(run.quality_text(), "q70")
+        run.settings = self.settings._replace(quality=50,
+                                              resolution=(1296, 972))
+        self.assertEqual(run.quality_text(), "q50 1296")
+
+    def test_state_round_trip(self):
+        run = TimelapseRun(12, 100, 5000, self.settings, stack='max',
+                           state_file=self.state_file)
+        run.next_slot, run.frames_written = 40, 38
+        copy = TimelapseRun.from_dict(run.to_dict())
+        self.assertEqual(copy.settings, self.settings)
+        self.assertEqual((copy.frames_written, copy.remaining), (38, 60))
+        self.assertEqual(copy.stack, 'max')
+        self.assertEqual(copy.image_name(39), "image0012_0039.jpg")
+
+
+if __name__ == '__main__':
+    unittest.main()